@@ -11,4 +11,8 @@ application = ProtocolTypeRouter({
     "websocket": AuthMiddlewareStack(
         URLRouter(websocket_urlpatterns)
     ),
-})
\ No newline at end of file
+})
+
+# Sends email left queued by an earlier process instead of waiting for a new one.
+from releases.outbox import email_sender  # noqa: E402
+email_sender.wake()
@@ -63,6 +63,15 @@ DATABASES = {
     )
 }
 
+# The default in-memory SQLite test database uses shared-cache mode, which
+# fails concurrent writers with "table is locked" instead of waiting on the
+# busy timeout; a throwaway file keeps the threaded canvas tests honest.
+if DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3":
+    DATABASES["default"]["TEST"] = {"NAME": BASE_DIR / "test_db.sqlite3"}
+    # SQLite ignores select_for_update(); taking the write lock when a transaction
+    # begins is what serializes the canvas's locked tile writes (releases/canvas.py).
+    DATABASES["default"].setdefault("OPTIONS", {})["transaction_mode"] = "IMMEDIATE"
+
 # === AWS S3 Config ===
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
@@ -95,6 +104,153 @@ CHANNEL_LAYERS = {
     }
 }
 
+# === Cache ===
+# Release pages, the catalog generation and image variant lookups are cached
+# here, and every worker must see the same entries for a save to retire them.
+# With REDIS_URL set they share the channel layer's Redis; without it the cache
+# is per-process, which only suits a single-process dev server or the tests.
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+            "KEY_PREFIX": "fliphouse",
+        }
+    }
+
+# === Releases ===
+# The release list is served in pages of RELEASES_PAGE_SIZE posts (releases/catalog.py).
+# Rendered pages are cached until a ReleasePost changes, or RELEASES_CACHE_TIMEOUT seconds.
+RELEASES_PAGE_SIZE = 12
+RELEASES_CACHE_TIMEOUT = 600
+
+# === Search ===
+# Site search (releases/search.py) returns SEARCH_PAGE_SIZE results per page,
+# up to SEARCH_MAX_PAGE pages deep.
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE = 50
+
+# === Image Derivatives ===
+# Uploaded album art, flyers, headshots and favicons get resized copies at these
+# widths and formats (releases/images.py), made by IMAGE_WORKERS background threads.
+# Formats this Pillow build can't encode (AVIF before Pillow 11.2) are skipped.
+IMAGE_DERIVATIVE_WIDTHS = [160, 320, 640, 1280]
+IMAGE_DERIVATIVE_FORMATS = ["avif", "webp", "jpeg"]
+IMAGE_DERIVATIVE_QUALITY = {"avif": 55, "webp": 80, "jpeg": 82}
+IMAGE_WORKERS = 2
+
+# === The Wall ===
+# The shared canvas is kept in memory per process and written to the database
+# in the background: every WALL_CANVAS_FLUSH_INTERVAL seconds, or sooner once
+# WALL_CANVAS_FLUSH_THRESHOLD changed pixels are waiting.
+WALL_CANVAS_FLUSH_INTERVAL = float(os.getenv("WALL_CANVAS_FLUSH_INTERVAL", "2.0"))
+WALL_CANVAS_FLUSH_THRESHOLD = int(os.getenv("WALL_CANVAS_FLUSH_THRESHOLD", "5000"))
+# Draws are merged and fanned out to sockets once per frame window (seconds).
+WALL_CANVAS_FRAME_WINDOW = 0.05
+# Recent frames kept per process so reconnecting clients can resume from a revision.
+WALL_CANVAS_HISTORY_FRAMES = 600
+# Browser/CDN freshness (seconds) for /wall/canvas.png|.webp before revalidating by ETag.
+WALL_CANVAS_IMAGE_MAX_AGE = 10
+# Tile writes are compare-and-swap on CanvasTile.version, retried after a jittered
+# backoff that starts at WALL_CANVAS_CAS_BACKOFF seconds and doubles. A tile that
+# loses WALL_CANVAS_CAS_RETRIES races in a row is written under a row lock instead.
+WALL_CANVAS_CAS_RETRIES = 6
+WALL_CANVAS_CAS_BACKOFF = 0.002
+# History snapshots for time-lapses: one every WALL_CANVAS_SNAPSHOT_INTERVAL seconds
+# while people are painting, plus one before every clear. Interval snapshots are
+# pruned past WALL_CANVAS_SNAPSHOT_KEEP or WALL_CANVAS_SNAPSHOT_MAX_AGE_DAYS.
+WALL_CANVAS_SNAPSHOT_INTERVAL = int(os.getenv("WALL_CANVAS_SNAPSHOT_INTERVAL", "900"))
+WALL_CANVAS_SNAPSHOT_KEEP = 2000
+WALL_CANVAS_SNAPSHOT_MAX_AGE_DAYS = 180
+# Proxies in front of the app that append to X-Forwarded-For (1 on Heroku's
+# router); socket client addresses are read from that header when this is set.
+WALL_TRUSTED_PROXY_COUNT = int(os.getenv("WALL_TRUSTED_PROXY_COUNT", "0"))
+# Socket abuse limits (releases/throttle.py). Rates are (tokens per second, burst);
+# a canvas draw costs one token per pixel, a chat message one token. "user" buckets
+# are shared per username (for canvas, per session when logged out; chat and wall
+# fall back to the client address). The canvas "address" bucket is shared by every
+# socket from one client address, so it is looser to allow for shared NATs.
+WALL_SOCKET_LIMITS = {
+    "canvas": {
+        "max_message_bytes": 256 * 1024,
+        "max_pixels": 4096,
+        "connection_rate": (20000, 250000),
+        "user_rate": (40000, 500000),
+        "address_rate": (120000, 1500000),
+        "clear_cost": 50000,
+    },
+    "chat": {
+        "max_message_bytes": 4096,
+        "connection_rate": (5, 20),
+        "user_rate": (8, 30),
+    },
+    # /ws/wall/ stream open/close frames; the streams keep their own limits.
+    "wall": {
+        "max_message_bytes": 512,
+        "connection_rate": (1, 10),
+        "user_rate": (2, 20),
+    },
+}
+
+# Chat lines are broadcast first and written in batches (releases/chat_journal.py):
+# every WALL_CHAT_FLUSH_INTERVAL seconds or once WALL_CHAT_FLUSH_BATCH are queued.
+WALL_CHAT_FLUSH_INTERVAL = 1.0
+WALL_CHAT_FLUSH_BATCH = 200
+# Lines kept queued while the database is unreachable before the oldest are dropped.
+WALL_CHAT_JOURNAL_MAX = 10000
+# Chat lines embedded in the wall page; older ones load in pages of up to WALL_CHAT_PAGE_MAX.
+WALL_CHAT_INITIAL_MESSAGES = 30
+WALL_CHAT_PAGE_MAX = 100
+# Newest chat lines each worker keeps in memory for page loads and reconnects
+# (releases/chat_recent.py); at most WALL_CHAT_PAGE_MAX.
+WALL_CHAT_RECENT_SIZE = 100
+# Chat presence is shared through the channel layer's Redis (releases/presence.py).
+# Workers refresh their sockets every WALL_PRESENCE_HEARTBEAT seconds; entries not
+# refreshed for WALL_PRESENCE_TTL seconds (e.g. a crashed worker's) expire.
+WALL_PRESENCE_TTL = 60
+WALL_PRESENCE_HEARTBEAT = 20
+# Opt in to have Wall pages open canvas and chat as streams of one /ws/wall/
+# socket instead of one socket each. The per-stream endpoints stay up either way.
+WALL_SOCKET_MULTIPLEX = os.getenv("WALL_SOCKET_MULTIPLEX", "False") == "True"
+# Wall account passwords (releases/passwords.py). New hashes use WALL_PASSWORD_HASHER
+# ("scrypt" or "pbkdf2_sha256") at its WALL_PASSWORD_COST; hashes made any other
+# way are replaced on the owner's next login. Hashing runs on WALL_PASSWORD_WORKERS
+# threads; check the cost with `manage.py wall_bench_passwords`.
+WALL_PASSWORD_HASHER = "scrypt"
+WALL_PASSWORD_COST = {
+    "scrypt": {"work_factor": 2 ** 14, "block_size": 8, "parallelism": 1},
+    "pbkdf2_sha256": {"iterations": 600000},
+}
+WALL_PASSWORD_WORKERS = 4
+# Verified login tokens are remembered per process (releases/tokens.py) for up to
+# WALL_TOKEN_CACHE_TTL seconds; the least recently used beyond WALL_TOKEN_CACHE_SIZE are dropped.
+WALL_TOKEN_CACHE_TTL = 300
+WALL_TOKEN_CACHE_SIZE = 10000
+# Outgoing wall email (releases/outbox.py) is queued in the database and sent by a
+# background thread through WALL_EMAIL_TRANSPORT: releases.outbox.ResendTransport,
+# MemoryTransport, or FileTransport (JSON files in WALL_EMAIL_FILE_PATH). Up to
+# WALL_EMAIL_BATCH go per call; failures retry after WALL_EMAIL_RETRY_BASE seconds,
+# doubling up to WALL_EMAIL_RETRY_MAX, and give up after WALL_EMAIL_MAX_ATTEMPTS.
+WALL_EMAIL_TRANSPORT = os.getenv("WALL_EMAIL_TRANSPORT", "releases.outbox.ResendTransport")
+WALL_EMAIL_FROM = "Flip House Records <noreply@fliphouserecords.com>"
+WALL_EMAIL_FILE_PATH = BASE_DIR / "sent_emails"
+WALL_EMAIL_BATCH = 50
+WALL_EMAIL_MAX_ATTEMPTS = 6
+WALL_EMAIL_RETRY_BASE = 30
+WALL_EMAIL_RETRY_MAX = 3600
+WALL_EMAIL_POLL_INTERVAL = 30
+# A claimed batch that isn't finished within this many seconds (e.g. its worker died) is retried.
+WALL_EMAIL_LEASE = 300
+# Avatar uploads (releases/avatars.py) are checked in the request, then shrunk to
+# WALL_AVATAR_SIZE px and stored by WALL_AVATAR_WORKERS background threads, with at
+# most WALL_AVATAR_QUEUE_LIMIT waiting. WALL_AVATAR_MAX_PIXELS caps the decoded size
+# (JPEGs decode at a reduced scale, so larger photos still fit).
+WALL_AVATAR_SIZE = 120
+WALL_AVATAR_MAX_BYTES = 10 * 1024 * 1024
+WALL_AVATAR_MAX_PIXELS = 16_000_000
+WALL_AVATAR_WORKERS = 2
+WALL_AVATAR_QUEUE_LIMIT = 16
+
 # === Authentication & Passwords ===
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from releases.views import homepage, artists, contact, merch, events, links, wall, password_reset_confirm, update_profile, get_profile
+from releases.views import homepage, artists, contact, merch, events, search, search_json, links, wall, wall_canvas_image, wall_chat_history, wall_metrics, password_reset_confirm, update_profile, get_profile
 
 urlpatterns = [
     path('', homepage, name='home'),
@@ -12,8 +12,15 @@ urlpatterns = [
     path('contact/', contact, name='contact'),
     path('merch/', merch, name='merch'),
     path('events/', events, name='events'),
+    path('events/tag/<str:tag>/', events, name='events_by_tag'),
+    path('search/', search, name='search'),
+    path('search.json', search_json, name='search_json'),
     path('links/', links, name='links'),
     path('wall/', wall, name='wall'),
+    path('wall/canvas.png', wall_canvas_image, {'fmt': 'png'}, name='wall_canvas_png'),
+    path('wall/canvas.webp', wall_canvas_image, {'fmt': 'webp'}, name='wall_canvas_webp'),
+    path('wall/chat/history.json', wall_chat_history, name='wall_chat_history'),
+    path('wall/metrics.json', wall_metrics, name='wall_metrics'),
     path('wall/reset-password/<str:token>/', password_reset_confirm, name='password_reset_confirm'),
     
     # REMOVED the 'views.' prefix since we imported them directly above
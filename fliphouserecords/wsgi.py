@@ -15,3 +15,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fliphouserecords.settings')
 
 application = get_wsgi_application()
 application = WhiteNoise(application, root=os.path.join(os.path.dirname(__file__), 'staticfiles'))
+
+# Sends email left queued by an earlier process instead of waiting for a new one.
+from releases.outbox import email_sender  # noqa: E402
+email_sender.wake()
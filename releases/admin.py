@@ -2,7 +2,7 @@
 # (or replace the whole file with this if you don't have one)
 
 from django.contrib import admin
-from .models import ReleasePost, Artist, Event, AffiliateLink, ChatMessage, ChatUsername, WallCanvas
+from .models import ReleasePost, Artist, Event, AffiliateLink, ChatMessage, ChatUsername, CanvasTile, CanvasSnapshot, OutboundEmail, Tag, ImageVariantSet
 
 
 @admin.register(ReleasePost)
@@ -32,6 +32,13 @@ class AffiliateLinkAdmin(admin.ModelAdmin):
     search_fields = ['name', 'description']
 
 
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ['name', 'slug', 'release_count', 'event_count']
+    search_fields = ['name', 'slug']
+    readonly_fields = ['release_count', 'event_count']
+
+
 @admin.register(ChatMessage)
 class ChatMessageAdmin(admin.ModelAdmin):
     list_display = ['username', 'message', 'timestamp']
@@ -45,7 +52,34 @@ class ChatUsernameAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at']
 
 
-@admin.register(WallCanvas)
-class WallCanvasAdmin(admin.ModelAdmin):
-    list_display = ['pk', 'updated_at']
-    readonly_fields = ['updated_at']
\ No newline at end of file
+@admin.register(CanvasTile)
+class CanvasTileAdmin(admin.ModelAdmin):
+    list_display = ['tx', 'ty', 'updated_at']
+    readonly_fields = ['tx', 'ty', 'updated_at']
+    exclude = ['data']
+
+
+@admin.register(CanvasSnapshot)
+class CanvasSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'reason']
+    list_filter = ['reason']
+    readonly_fields = ['created_at', 'reason']
+    exclude = ['image']
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'to', 'status', 'attempts', 'created_at', 'sent_at']
+    list_filter = ['status']
+    search_fields = ['to', 'subject']
+    readonly_fields = ['created_at', 'sent_at', 'attempts', 'last_error']
+    # Reset emails carry a live reset link; staff don't need to read them.
+    exclude = ['html']
+
+
+@admin.register(ImageVariantSet)
+class ImageVariantSetAdmin(admin.ModelAdmin):
+    list_display = ['original', 'status', 'width', 'height', 'updated_at']
+    list_filter = ['status']
+    search_fields = ['original']
+    readonly_fields = ['variants', 'error', 'created_at', 'updated_at']
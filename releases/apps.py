@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class ReleasesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'releases'
+
+    def ready(self):
+        from django.db.models import CharField
+        from django.db.models.functions import Lower
+        # Enables username__lower=..., which matches the LOWER(username) index.
+        CharField.register_lookup(Lower)
+        from releases import signals  # noqa: F401  (connects the receivers)
@@ -0,0 +1,148 @@
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from PIL import Image, ImageOps
+
+from releases import metrics
+
+
+# ─── Wall Avatars ─────────────────────────────────────────────────────────────
+#
+# update_profile only checks an uploaded avatar: its size, its format, and
+# the pixel count read from the image header. Decoding, resizing and the
+# upload to storage happen on a small pool (WALL_AVATAR_WORKERS threads), and the
+# finished avatar's URL is pushed to the owner's chat sockets as
+# "avatar_ready". At most WALL_AVATAR_QUEUE_LIMIT avatars wait or run at once;
+# beyond that uploads are turned away until the pool catches up.
+#
+# JPEGs are decoded at a reduced scale (draft), so WALL_AVATAR_MAX_PIXELS bounds
+# the pixels actually decoded rather than the nominal size.
+
+FORMATS = ("JPEG", "PNG", "GIF", "WEBP")
+
+
+class AvatarError(Exception):
+    """An upload that won't be processed; the message is shown to the user."""
+
+
+class AvatarBusy(AvatarError):
+    pass
+
+
+def avatar_size():
+    return getattr(settings, "WALL_AVATAR_SIZE", 120)
+
+
+def open_avatar(data):
+    """
+    Opens avatar bytes without decoding them and checks the format and pixel
+    count. JPEGs are set to decode at the smallest scale that still covers
+    the avatar size.
+    """
+    if len(data) > getattr(settings, "WALL_AVATAR_MAX_BYTES", 10 * 1024 * 1024):
+        raise AvatarError("Image file is too large.")
+    try:
+        image = Image.open(io.BytesIO(data), formats=FORMATS)
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        raise AvatarError("Invalid image file.")
+    if image.format == "JPEG":
+        image.draft("RGB", (avatar_size(), avatar_size()))
+    if image.width * image.height > getattr(settings, "WALL_AVATAR_MAX_PIXELS", 16_000_000):
+        raise AvatarError("Image dimensions are too large.")
+    return image
+
+
+def render_avatar(data):
+    """PNG bytes of the avatar: oriented, shrunk to fit WALL_AVATAR_SIZE, alpha kept."""
+    image = open_avatar(data)
+    image = ImageOps.exif_transpose(image)
+    # reducing_gap lets thumbnail() shrink by whole factors with reduce() before resampling.
+    image.thumbnail((avatar_size(), avatar_size()), reducing_gap=2.0)
+    out = io.BytesIO()
+    image.convert("RGBA").save(out, format="PNG", optimize=True)
+    return out.getvalue()
+
+
+def process(pk, data):
+    """Renders and stores the avatar of ChatUsername `pk`, then tells their sockets."""
+    from releases.consumers import private_group_name
+    from releases.models import ChatUsername
+    entry = ChatUsername.objects.filter(pk=pk).first()
+    if entry is None:
+        return
+    started = time.monotonic()
+    avatar_url = error = None
+    try:
+        png = render_avatar(data)
+        name = entry.avatar.storage.save(
+            entry.avatar.field.generate_filename(entry, f"{entry.username}_avatar.png"), ContentFile(png),
+        )
+        ChatUsername.objects.filter(pk=pk).update(avatar=name)
+        avatar_url = entry.avatar.storage.url(name)
+        metrics.observe("avatars.process", time.monotonic() - started)
+    except AvatarError as e:
+        error = str(e)
+    except Exception as e:
+        print(f"Error processing avatar for {entry.username}: {e}")
+        error = "Couldn't process that image."
+    if error:
+        metrics.increment("avatars.failed")
+    async_to_sync(get_channel_layer().group_send)(private_group_name(entry.username), {
+        "type": "avatar_ready",
+        "avatar_url": avatar_url,
+        "error": error,
+    })
+
+
+_executor = None
+_slots = None
+_lock = threading.Lock()
+
+
+def executor():
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "WALL_AVATAR_WORKERS", 2),
+                thread_name_prefix="wall-avatar",
+            )
+            _slots = threading.BoundedSemaphore(getattr(settings, "WALL_AVATAR_QUEUE_LIMIT", 16))
+    return _executor
+
+
+def run_job(pk, data):
+    close_old_connections()
+    try:
+        process(pk, data)
+    except Exception as e:
+        print(f"Error in avatar job for {pk}: {e}")
+    finally:
+        _slots.release()
+        close_old_connections()
+
+
+def submit(entry, upload):
+    """Checks an uploaded avatar and queues it. Raises AvatarError if it's rejected or the queue is full."""
+    if upload.size > getattr(settings, "WALL_AVATAR_MAX_BYTES", 10 * 1024 * 1024):
+        raise AvatarError("Image file is too large.")
+    data = upload.read()
+    open_avatar(data)
+    pool = executor()
+    if not _slots.acquire(blocking=False):
+        metrics.increment("avatars.rejected_busy")
+        raise AvatarBusy("Avatar uploads are busy; try again in a moment.")
+    try:
+        pool.submit(run_job, entry.pk, data)
+    except Exception:
+        # e.g. the pool is shutting down; run_job won't run to give the slot back.
+        _slots.release()
+        raise
+    metrics.increment("avatars.queued")
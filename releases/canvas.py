@@ -0,0 +1,645 @@
+import asyncio
+import atexit
+import hashlib
+import io
+import json
+import random
+import re
+import secrets
+import struct
+import time
+import uuid
+import zlib
+from collections import deque
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image
+
+from releases import metrics
+
+
+# ─── Canvas Geometry ──────────────────────────────────────────────────────────
+
+CANVAS_WIDTH = 640
+CANVAS_HEIGHT = 360
+TILE_SIZE = 64
+
+TILES_X = (CANVAS_WIDTH + TILE_SIZE - 1) // TILE_SIZE
+TILES_Y = (CANVAS_HEIGHT + TILE_SIZE - 1) // TILE_SIZE
+
+# Each tile is a TILE_SIZE×TILE_SIZE RGBA byte array. Alpha 0 means "never
+# painted / erased", which is how the client tells a pixel apart from the
+# dark canvas background.
+BYTES_PER_PIXEL = 4
+TILE_BYTES = TILE_SIZE * TILE_SIZE * BYTES_PER_PIXEL
+TRANSPARENT = b"\x00\x00\x00\x00"
+
+_HEX_COLOR = re.compile(r'^#[0-9a-fA-F]{6}$')
+
+
+# ─── Pixel Codec ──────────────────────────────────────────────────────────────
+
+def parse_color(color):
+    """Turns a client colour ('#rrggbb' or 'erase') into 4 RGBA bytes, or None if invalid."""
+    if color == "erase":
+        return TRANSPARENT
+    if not isinstance(color, str) or not _HEX_COLOR.match(color):
+        return None
+    return bytes.fromhex(color[1:]) + b"\xff"
+
+
+def format_color(rgba):
+    return "#" + bytes(rgba[:3]).hex()
+
+
+def pixel_ops(pixels):
+    """
+    Validates a client 'draw' batch and returns {(x, y): rgba}.
+    Out-of-bounds or malformed entries are dropped; later entries win.
+    """
+    ops = {}
+    for p in pixels:
+        try:
+            x, y = int(p["x"]), int(p["y"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if not (0 <= x < CANVAS_WIDTH and 0 <= y < CANVAS_HEIGHT):
+            continue
+        rgba = parse_color(p.get("color"))
+        if rgba is not None:
+            ops[(x, y)] = rgba
+    return ops
+
+
+def group_by_tile(ops):
+    """Splits {(x, y): rgba} into {(tx, ty): {byte_offset: rgba}}."""
+    tiles = {}
+    for (x, y), rgba in ops.items():
+        key = (x // TILE_SIZE, y // TILE_SIZE)
+        offset = ((y % TILE_SIZE) * TILE_SIZE + (x % TILE_SIZE)) * BYTES_PER_PIXEL
+        tiles.setdefault(key, {})[offset] = rgba
+    return tiles
+
+
+def decode_tile(blob):
+    if not blob:
+        return bytearray(TILE_BYTES)
+    raw = zlib.decompress(bytes(blob))
+    if len(raw) != TILE_BYTES:
+        return bytearray(TILE_BYTES)
+    return bytearray(raw)
+
+
+def encode_tile(buf):
+    """Compresses a tile, or returns None when it holds no painted pixels."""
+    if bytes(buf[3::BYTES_PER_PIXEL]).count(0) == TILE_SIZE * TILE_SIZE:
+        return None
+    return zlib.compress(bytes(buf), 6)
+
+
+def patch_tile(buf, offsets):
+    for offset, rgba in offsets.items():
+        buf[offset:offset + BYTES_PER_PIXEL] = rgba
+    return buf
+
+
+def tile_pixels(tx, ty, buf):
+    """Yields (x, y, rgba) for every painted pixel in a decoded tile."""
+    for row in range(TILE_SIZE):
+        y = ty * TILE_SIZE + row
+        if y >= CANVAS_HEIGHT:
+            break
+        base = row * TILE_SIZE * BYTES_PER_PIXEL
+        for col in range(TILE_SIZE):
+            offset = base + col * BYTES_PER_PIXEL
+            if buf[offset + 3]:
+                x = tx * TILE_SIZE + col
+                if x < CANVAS_WIDTH:
+                    yield x, y, buf[offset:offset + BYTES_PER_PIXEL]
+
+
+def tiles_from_json_map(data):
+    """Converts the legacy {'x,y': '#rrggbb'} canvas blob into {(tx, ty): compressed bytes}."""
+    ops = {}
+    for key, color in data.items():
+        try:
+            x, y = (int(v) for v in key.split(","))
+        except (AttributeError, ValueError):
+            continue
+        ops.update(pixel_ops([{"x": x, "y": y, "color": color}]))
+    tiles = {}
+    for key, offsets in group_by_tile(ops).items():
+        blob = encode_tile(patch_tile(bytearray(TILE_BYTES), offsets))
+        if blob is not None:
+            tiles[key] = blob
+    return tiles
+
+
+def canvas_to_json_map(pixels):
+    """Converts a full-canvas RGBA buffer into the client-facing {'x,y': '#rrggbb'} map."""
+    data = {}
+    for i, alpha in enumerate(pixels[3::BYTES_PER_PIXEL]):
+        if alpha:
+            offset = i * BYTES_PER_PIXEL
+            data[f"{i % CANVAS_WIDTH},{i // CANVAS_WIDTH}"] = "#" + pixels[offset:offset + 3].hex()
+    return data
+
+
+def ops_to_pixels(ops):
+    """Inverse of pixel_ops(): the validated batch in the client 'draw' format."""
+    return [
+        {"x": x, "y": y, "color": format_color(rgba) if rgba[3] else "erase"}
+        for (x, y), rgba in ops.items()
+    ]
+
+
+def apply_ops(pixels, ops):
+    """Writes {(x, y): rgba} into a full-canvas RGBA buffer."""
+    for (x, y), rgba in ops.items():
+        offset = (y * CANVAS_WIDTH + x) * BYTES_PER_PIXEL
+        pixels[offset:offset + BYTES_PER_PIXEL] = rgba
+
+
+# ─── Binary Frames ────────────────────────────────────────────────────────────
+#
+# Sockets that connect with ?format=binary get these instead of JSON:
+#   canvas_init  [0x01][width u16][height u16][rev u32][epoch 8 bytes][zlib(RGBA, row-major)]
+#   draw         [0x02][rev u32] then one 7-byte record per pixel:
+#                [x u16][y u16][r g b]; bit 15 of y set means "erase"
+#   clear        [0x03][rev u32]
+# All integers are big-endian. Clients send draws as [0x02] + records, with no
+# revision; the server assigns those.
+
+FRAME_INIT = 0x01
+FRAME_DRAW = 0x02
+FRAME_CLEAR = 0x03
+ERASE_FLAG = 0x8000
+
+_INIT_HEADER = struct.Struct(">BHHI8s")
+_FRAME_HEADER = struct.Struct(">BI")
+_DRAW_RECORD = struct.Struct(">HH3s")
+
+
+def encode_init_frame(pixels, epoch, rev):
+    header = _INIT_HEADER.pack(FRAME_INIT, CANVAS_WIDTH, CANVAS_HEIGHT, rev, bytes.fromhex(epoch))
+    return header + zlib.compress(bytes(pixels), 6)
+
+
+def encode_draw_records(ops):
+    records = bytearray()
+    for (x, y), rgba in ops.items():
+        records += _DRAW_RECORD.pack(x, y if rgba[3] else y | ERASE_FLAG, bytes(rgba[:3]))
+    return bytes(records)
+
+
+def decode_draw_records(records):
+    """Parses packed draw records into validated {(x, y): rgba}; malformed input yields {}."""
+    if len(records) % _DRAW_RECORD.size:
+        return {}
+    ops = {}
+    for x, y, rgb in _DRAW_RECORD.iter_unpack(records):
+        erase = y & ERASE_FLAG
+        y &= ~ERASE_FLAG
+        if x < CANVAS_WIDTH and y < CANVAS_HEIGHT:
+            ops[(x, y)] = TRANSPARENT if erase else rgb + b"\xff"
+    return ops
+
+
+def client_draw_count(frame):
+    """Number of pixel records in a client draw frame, without decoding it."""
+    return max(0, (len(frame) - 1) // _DRAW_RECORD.size)
+
+
+def decode_client_draw(frame):
+    if not frame or frame[0] != FRAME_DRAW:
+        return {}
+    return decode_draw_records(memoryview(frame)[1:])
+
+
+# ─── Tile Store (database) ────────────────────────────────────────────────────
+
+def load_canvas_pixels():
+    """Assembles every stored tile into one row-major CANVAS_WIDTH×CANVAS_HEIGHT RGBA buffer."""
+    from releases.models import CanvasTile
+    pixels = bytearray(CANVAS_WIDTH * CANVAS_HEIGHT * BYTES_PER_PIXEL)
+    for tile in CanvasTile.objects.all():
+        buf = decode_tile(tile.data)
+        x0 = tile.tx * TILE_SIZE
+        width = min(TILE_SIZE, CANVAS_WIDTH - x0) * BYTES_PER_PIXEL
+        if width <= 0:
+            continue
+        for row in range(TILE_SIZE):
+            y = tile.ty * TILE_SIZE + row
+            if y >= CANVAS_HEIGHT:
+                break
+            src = row * TILE_SIZE * BYTES_PER_PIXEL
+            dst = (y * CANVAS_WIDTH + x0) * BYTES_PER_PIXEL
+            pixels[dst:dst + width] = buf[src:src + width]
+    return pixels
+
+
+def _cas_backoff(attempt):
+    """Sleeps a random slice of an exponentially growing window, so racing writers spread out."""
+    base = getattr(settings, "WALL_CANVAS_CAS_BACKOFF", 0.002)
+    time.sleep(random.uniform(0, min(0.1, base * 2 ** attempt)))
+
+
+def _write_tile(tx, ty, offsets):
+    """One optimistic attempt at a tile; False if another writer changed it first."""
+    from releases.models import CanvasTile
+    tile = CanvasTile.objects.filter(tx=tx, ty=ty).only("data", "version").first()
+    blob = encode_tile(patch_tile(decode_tile(tile.data if tile else None), offsets))
+    if tile is None:
+        if blob is None:
+            return True
+        try:
+            with transaction.atomic():
+                CanvasTile.objects.create(tx=tx, ty=ty, data=blob)
+            return True
+        except IntegrityError:
+            return False
+    current = CanvasTile.objects.filter(pk=tile.pk, version=tile.version)
+    if blob is None:
+        return bool(current.delete()[0])
+    return bool(current.update(data=blob, version=F("version") + 1, updated_at=timezone.now()))
+
+
+def _write_tile_locked(tx, ty, offsets):
+    """Writes a tile under a row lock, which always lands; used once the optimistic path keeps losing."""
+    from releases.models import CanvasTile
+    while True:
+        try:
+            with transaction.atomic():
+                tile = CanvasTile.objects.select_for_update().filter(tx=tx, ty=ty).only("data", "version").first()
+                blob = encode_tile(patch_tile(decode_tile(tile.data if tile else None), offsets))
+                if tile is None:
+                    if blob is not None:
+                        CanvasTile.objects.create(tx=tx, ty=ty, data=blob)
+                elif blob is None:
+                    tile.delete()
+                else:
+                    CanvasTile.objects.filter(pk=tile.pk).update(
+                        data=blob, version=F("version") + 1, updated_at=timezone.now(),
+                    )
+            return
+        except IntegrityError:
+            # The tile was created since we looked; lock the new row instead.
+            continue
+
+
+def write_pixels(ops):
+    """
+    Persists {(x, y): rgba}, reading and rewriting only the tiles it touches.
+
+    Tiles are updated optimistically: each write is conditional on the
+    version that was read, and is retried against the fresh row, after a
+    jittered backoff, if another worker got there first. Pixels from
+    concurrent batches on the same tile are merged, not overwritten. A
+    tile that loses WALL_CANVAS_CAS_RETRIES races in a row is written
+    under a row lock instead, so no batch is ever dropped.
+    """
+    retries = getattr(settings, "WALL_CANVAS_CAS_RETRIES", 6)
+    for (tx, ty), offsets in group_by_tile(ops).items():
+        for attempt in range(retries):
+            if _write_tile(tx, ty, offsets):
+                break
+            metrics.increment("canvas.cas.conflicts")
+            if attempt + 1 < retries:
+                _cas_backoff(attempt)
+        else:
+            metrics.increment("canvas.cas.locked")
+            _write_tile_locked(tx, ty, offsets)
+
+
+def clear_canvas():
+    from releases.models import CanvasTile
+    CanvasTile.objects.all().delete()
+
+
+def stored_canvas_fingerprint():
+    """Changes whenever any stored tile is written, created or deleted."""
+    from releases.models import CanvasTile
+    rows = list(CanvasTile.objects.order_by("pk").values_list("pk", "version"))
+    return hashlib.sha1(repr(rows).encode()).hexdigest()[:20]
+
+
+# ─── Image Rendering ──────────────────────────────────────────────────────────
+
+CANVAS_BACKGROUND = (17, 17, 17)  # matches the #111 the client paints under the pixels
+
+IMAGE_FORMATS = {
+    "png": ("PNG", "image/png", {"optimize": True}),
+    "webp": ("WEBP", "image/webp", {"lossless": True}),
+}
+
+
+def render_canvas_image(pixels, fmt="png"):
+    """Flattens a full-canvas RGBA buffer onto the background and encodes it as PNG or WebP."""
+    pil_format, _, options = IMAGE_FORMATS[fmt]
+    layer = Image.frombytes("RGBA", (CANVAS_WIDTH, CANVAS_HEIGHT), bytes(pixels))
+    image = Image.new("RGB", layer.size, CANVAS_BACKGROUND)
+    image.paste(layer, mask=layer.getchannel("A"))
+    out = io.BytesIO()
+    image.save(out, format=pil_format, **options)
+    return out.getvalue()
+
+
+# ─── In-Memory Canvas (write-behind) ──────────────────────────────────────────
+
+# Identifies this process in group messages so each worker can tell its own
+# draws apart from ones it needs to mirror from other workers.
+PROCESS_ID = uuid.uuid4().hex
+
+
+class CanvasBuffer:
+    """
+    The authoritative canvas for this process. Draw batches are applied to an
+    in-memory RGBA buffer right away; the changed pixels are coalesced and
+    written to the tile store every WALL_CANVAS_FLUSH_INTERVAL seconds, as soon
+    as WALL_CANVAS_FLUSH_THRESHOLD pixels are pending, when the last socket
+    disconnects, and at interpreter shutdown.
+    """
+
+    def __init__(self):
+        self.pixels = None
+        self.pending = {}
+        self.clear_pending = False
+        self.connections = 0
+        self._loading = None
+        self._flush_handle = None
+        self._flushing = False
+        self._flush_again = False
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, "WALL_CANVAS_FLUSH_INTERVAL", 2.0)
+
+    @property
+    def flush_threshold(self):
+        return getattr(settings, "WALL_CANVAS_FLUSH_THRESHOLD", 5000)
+
+    async def ensure_loaded(self):
+        while self.pixels is None:
+            loop = asyncio.get_running_loop()
+            if self._loading is None or self._loading.get_loop() is not loop:
+                self._loading = loop.create_task(database_sync_to_async(load_canvas_pixels)())
+            pixels = await asyncio.shield(self._loading)
+            if self.pixels is None:
+                self.pixels = pixels
+                self._loading = None
+
+    async def attach(self):
+        self.connections += 1
+        await self.ensure_loaded()
+
+    async def detach(self):
+        self.connections = max(0, self.connections - 1)
+        if self.connections:
+            return
+        await self.flush()
+        # Nobody left to keep the mirror of other workers' draws current, so
+        # the next socket reloads from the database instead.
+        if not self.connections and not self.pending and not self.clear_pending:
+            self.pixels = None
+
+    async def snapshot(self):
+        await self.ensure_loaded()
+        return await sync_to_async(canvas_to_json_map, thread_sensitive=False)(bytes(self.pixels))
+
+    async def snapshot_frame(self, epoch, rev):
+        await self.ensure_loaded()
+        return await sync_to_async(encode_init_frame, thread_sensitive=False)(bytes(self.pixels), epoch, rev)
+
+    async def apply(self, ops):
+        """Applies validated {(x, y): rgba} ops locally and queues them for persistence."""
+        if not ops:
+            return ops
+        await self.ensure_loaded()
+        apply_ops(self.pixels, ops)
+        self.pending.update(ops)
+        self._schedule(0 if len(self.pending) >= self.flush_threshold else self.flush_interval)
+        return ops
+
+    async def clear(self):
+        if self.pixels is not None:
+            if any(self.pixels[3::4]):
+                from releases.canvas_history import schedule_snapshot
+                from releases.models import CanvasSnapshot
+                schedule_snapshot(self.pixels, CanvasSnapshot.CLEAR)
+            self.pixels = bytearray(len(self.pixels))
+        self.pending = {}
+        self.clear_pending = True
+        self._schedule(0)
+
+    def apply_remote(self, ops):
+        """Mirrors a batch another worker has already queued for persistence."""
+        if self.pixels is None:
+            return
+        apply_ops(self.pixels, ops)
+        for key in ops:
+            self.pending.pop(key, None)
+
+    def clear_remote(self):
+        if self.pixels is not None:
+            self.pixels = bytearray(len(self.pixels))
+        self.pending = {}
+
+    def _schedule(self, delay):
+        loop = asyncio.get_running_loop()
+        if self._flush_handle is not None:
+            if delay or self._flush_handle.when() <= loop.time():
+                return
+            self._flush_handle.cancel()
+        self._flush_handle = loop.call_later(delay, lambda: loop.create_task(self.flush()))
+
+    async def flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._flushing:
+            self._flush_again = True
+            return
+        self._flushing = True
+        try:
+            while self.pending or self.clear_pending:
+                ops, clear = self.pending, self.clear_pending
+                self.pending, self.clear_pending = {}, False
+                try:
+                    if clear:
+                        await database_sync_to_async(clear_canvas)()
+                        clear = False
+                    await database_sync_to_async(write_pixels)(ops)
+                except Exception as e:
+                    print(f"Error flushing canvas: {e}")
+                    for key, rgba in ops.items():
+                        self.pending.setdefault(key, rgba)
+                    self.clear_pending = self.clear_pending or clear
+                    self._schedule(self.flush_interval)
+                    return
+                if ops and self.pixels is not None:
+                    from releases.canvas_history import maybe_snapshot
+                    maybe_snapshot(self.pixels)
+                if not self._flush_again:
+                    break
+                self._flush_again = False
+        finally:
+            self._flushing = False
+
+    def flush_sync(self):
+        """Last-chance flush for interpreter shutdown, when no event loop is running."""
+        if not self.pending and not self.clear_pending:
+            return
+        ops, clear = self.pending, self.clear_pending
+        self.pending, self.clear_pending = {}, False
+        if clear:
+            clear_canvas()
+        write_pixels(ops)
+
+
+canvas_buffer = CanvasBuffer()
+atexit.register(canvas_buffer.flush_sync)
+
+
+# ─── Fan-out ──────────────────────────────────────────────────────────────────
+
+class CanvasBroadcaster:
+    """
+    Delivers canvas changes to this process's sockets. Local draws are merged
+    for WALL_CANVAS_FRAME_WINDOW seconds (a pixel painted twice in one window
+    is sent once), encoded once per frame in both wire formats, written to
+    every local socket and published once to the channel layer. A single
+    listener per process picks up frames published by other workers.
+
+    Every frame sent to sockets gets the next revision number, and the last
+    WALL_CANVAS_HISTORY_FRAMES of them are kept so a reconnecting client can
+    catch up with deltas instead of a full snapshot. Revisions only mean
+    something within one epoch, which starts whenever this process's first
+    canvas socket arrives.
+    """
+    GROUP = "wall_canvas"
+
+    def __init__(self):
+        self.sockets = set()
+        self.frame = {}
+        self.epoch = secrets.token_hex(8)
+        self.revision = 0
+        self.history = deque(maxlen=getattr(settings, "WALL_CANVAS_HISTORY_FRAMES", 600))
+        self._frame_handle = None
+        self._listener = None
+
+    @property
+    def frame_window(self):
+        return getattr(settings, "WALL_CANVAS_FRAME_WINDOW", 0.05)
+
+    def add(self, socket):
+        self.sockets.add(socket)
+        if self._listener is None:
+            # Whatever other workers drew while nobody was listening is
+            # missing from the history, so old revisions can't be trusted.
+            self.epoch = secrets.token_hex(8)
+            self.revision = 0
+            self.history.clear()
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+
+    async def remove(self, socket):
+        self.sockets.discard(socket)
+        if self.sockets:
+            return
+        await self.emit()
+        if self._listener is not None and not self.sockets:
+            listener, self._listener = self._listener, None
+            listener.cancel()
+            await asyncio.gather(listener, return_exceptions=True)
+
+    def frames_since(self, epoch, rev):
+        """The frames after `rev`, or None if the client has to start over from a snapshot."""
+        if epoch != self.epoch or not 0 <= rev <= self.revision:
+            return None
+        if rev == self.revision:
+            return []
+        if not self.history or self.history[0]["rev"] > rev + 1:
+            return None
+        return [frame for frame in self.history if frame["rev"] > rev]
+
+    def publish(self, ops):
+        self.frame.update(ops)
+        if self._frame_handle is None:
+            loop = asyncio.get_running_loop()
+            self._frame_handle = loop.call_later(self.frame_window, lambda: loop.create_task(self.emit()))
+
+    async def emit(self):
+        if self._frame_handle is not None:
+            self._frame_handle.cancel()
+            self._frame_handle = None
+        if not self.frame:
+            return
+        ops, self.frame = self.frame, {}
+        await self._send_everywhere({
+            "type": "canvas.draw",
+            "origin": PROCESS_ID,
+            "records": encode_draw_records(ops),
+            "pixels": json.dumps(ops_to_pixels(ops)),
+        })
+
+    async def clear(self):
+        # Draws still waiting in the window happened before the clear.
+        await self.emit()
+        await self._send_everywhere({"type": "canvas.clear", "origin": PROCESS_ID})
+
+    async def _send_everywhere(self, message):
+        await self._deliver(message)
+        await get_channel_layer().group_send(self.GROUP, message)
+
+    def _stamp(self, message):
+        """Turns a group message into a numbered frame, encoded for both kinds of socket."""
+        self.revision += 1
+        rev = self.revision
+        if message["type"] == "canvas.draw":
+            frame = {
+                "rev": rev,
+                "frame": _FRAME_HEADER.pack(FRAME_DRAW, rev) + message["records"],
+                "text": f'{{"type": "draw", "rev": {rev}, "pixels": {message["pixels"]}}}',
+            }
+        else:
+            frame = {
+                "rev": rev,
+                "frame": _FRAME_HEADER.pack(FRAME_CLEAR, rev),
+                "text": json.dumps({"type": "clear", "rev": rev}),
+            }
+        self.history.append(frame)
+        return frame
+
+    async def _deliver(self, message):
+        frame = self._stamp(message)
+        results = await asyncio.gather(
+            *(socket.deliver(frame) for socket in list(self.sockets)),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"Error sending canvas frame: {result}")
+
+    async def _listen(self):
+        layer = get_channel_layer()
+        channel = await layer.new_channel()
+        await layer.group_add(self.GROUP, channel)
+        try:
+            while True:
+                message = await layer.receive(channel)
+                if message.get("origin") == PROCESS_ID:
+                    continue
+                if message["type"] == "canvas.draw":
+                    canvas_buffer.apply_remote(decode_draw_records(message["records"]))
+                elif message["type"] == "canvas.clear":
+                    canvas_buffer.clear_remote()
+                await self._deliver(message)
+        finally:
+            await layer.group_discard(self.GROUP, channel)
+
+
+canvas_broadcaster = CanvasBroadcaster()
@@ -0,0 +1,166 @@
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from PIL import GifImagePlugin
+
+from releases.canvas import CANVAS_BACKGROUND, render_canvas_image
+
+
+# ─── Snapshot Pipeline ────────────────────────────────────────────────────────
+#
+# Snapshots are encoded and written on a single background thread so painting
+# never waits on Pillow or the database. Callers hand over an immutable copy
+# of the canvas bytes.
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="canvas-snapshot")
+_pending = set()
+_last_interval_snapshot = 0.0
+_lock = threading.Lock()
+
+
+def snapshot_interval():
+    return getattr(settings, "WALL_CANVAS_SNAPSHOT_INTERVAL", 15 * 60)
+
+
+def schedule_snapshot(pixels, reason):
+    future = _executor.submit(_save_snapshot, bytes(pixels), reason)
+    with _lock:
+        _pending.add(future)
+    future.add_done_callback(_forget)
+
+
+def _forget(future):
+    with _lock:
+        _pending.discard(future)
+
+
+def wait(timeout=None):
+    """Blocks until every snapshot queued so far is written, e.g. before a test database goes away."""
+    with _lock:
+        futures = list(_pending)
+    wait_futures(futures, timeout)
+
+
+def maybe_snapshot(pixels):
+    """Called after the canvas changed; queues an interval snapshot if one is due."""
+    global _last_interval_snapshot
+    from releases.models import CanvasSnapshot
+    now = time.monotonic()
+    with _lock:
+        if now - _last_interval_snapshot < snapshot_interval():
+            return
+        _last_interval_snapshot = now
+    schedule_snapshot(pixels, CanvasSnapshot.INTERVAL)
+
+
+def _save_snapshot(pixels, reason):
+    from releases.models import CanvasSnapshot
+    close_old_connections()
+    try:
+        if reason == CanvasSnapshot.INTERVAL:
+            # Every worker runs this timer; only one of them needs to record the interval.
+            recent = timezone.now() - timedelta(seconds=snapshot_interval() * 0.9)
+            if CanvasSnapshot.objects.filter(reason=reason, created_at__gte=recent).exists():
+                return
+        CanvasSnapshot.objects.create(image=render_canvas_image(pixels, "webp"), reason=reason)
+        prune_snapshots()
+    except Exception as e:
+        print(f"Error saving canvas snapshot: {e}")
+    finally:
+        close_old_connections()
+
+
+def prune_snapshots():
+    """
+    Evicts interval snapshots older than WALL_CANVAS_SNAPSHOT_MAX_AGE_DAYS and
+    beyond the newest WALL_CANVAS_SNAPSHOT_KEEP. Before-clear snapshots are
+    the only record of a wiped canvas and are never evicted automatically.
+    """
+    from releases.models import CanvasSnapshot
+    interval = CanvasSnapshot.objects.filter(reason=CanvasSnapshot.INTERVAL)
+    max_age = getattr(settings, "WALL_CANVAS_SNAPSHOT_MAX_AGE_DAYS", 180)
+    interval.filter(created_at__lt=timezone.now() - timedelta(days=max_age)).delete()
+    keep = getattr(settings, "WALL_CANVAS_SNAPSHOT_KEEP", 2000)
+    stale = list(interval.order_by("-created_at").values_list("pk", flat=True)[keep:])
+    if stale:
+        CanvasSnapshot.objects.filter(pk__in=stale).delete()
+
+
+# ─── Time-lapse Writers ───────────────────────────────────────────────────────
+#
+# Pillow's animated encoders collect every frame before writing. These write
+# one frame at a time, so a time-lapse of thousands of snapshots only ever
+# holds a single decoded frame.
+
+def _u24(value):
+    return value.to_bytes(3, "little")
+
+
+def _chunk(fourcc, payload):
+    return fourcc + struct.pack("<I", len(payload)) + payload + (b"\x00" if len(payload) % 2 else b"")
+
+
+def webp_bitstream_chunks(blob):
+    """The ALPH/VP8/VP8L chunks of a still WebP file, ready to embed in an ANMF frame."""
+    blob = bytes(blob)
+    if blob[:4] != b"RIFF" or blob[8:12] != b"WEBP":
+        raise ValueError("not a WebP file")
+    chunks, offset = [], 12
+    while offset + 8 <= len(blob):
+        fourcc = blob[offset:offset + 4]
+        size = struct.unpack("<I", blob[offset + 4:offset + 8])[0]
+        end = offset + 8 + size + (size % 2)
+        if fourcc in (b"ALPH", b"VP8 ", b"VP8L"):
+            chunks.append(blob[offset:end])
+        offset = end
+    return b"".join(chunks)
+
+
+class AnimatedWebPWriter:
+    """Appends still WebP images as frames of an animated WebP on a seekable file."""
+
+    def __init__(self, fp, width, height, loop=0):
+        self.fp = fp
+        self.start = fp.tell()
+        fp.write(b"RIFF\x00\x00\x00\x00WEBP")
+        fp.write(_chunk(b"VP8X", bytes([0x02, 0, 0, 0]) + _u24(width - 1) + _u24(height - 1)))
+        r, g, b = CANVAS_BACKGROUND
+        fp.write(_chunk(b"ANIM", bytes([b, g, r, 0xff]) + struct.pack("<H", loop)))
+        self.width, self.height = width, height
+
+    def add(self, webp_blob, duration_ms):
+        header = _u24(0) + _u24(0) + _u24(self.width - 1) + _u24(self.height - 1) + _u24(duration_ms)
+        # Flag bit 1: don't alpha-blend; every snapshot is a full opaque frame.
+        self.fp.write(_chunk(b"ANMF", header + bytes([0x02]) + webp_bitstream_chunks(webp_blob)))
+
+    def close(self):
+        end = self.fp.tell()
+        self.fp.seek(self.start + 4)
+        self.fp.write(struct.pack("<I", end - self.start - 8))
+        self.fp.seek(end)
+
+
+class AnimatedGifWriter:
+    """Appends images as frames of a looping GIF, each with its own 256-colour palette."""
+
+    def __init__(self, fp, loop=0):
+        self.fp = fp
+        self.loop = loop
+        self.started = False
+
+    def add(self, image, duration_ms):
+        frame = image.convert("RGB").quantize(256)
+        if not self.started:
+            header, _ = GifImagePlugin.getheader(frame, info={"loop": self.loop, "duration": duration_ms})
+            self.fp.write(b"".join(header))
+            self.started = True
+        self.fp.write(b"".join(GifImagePlugin.getdata(frame, duration=duration_ms, include_color_table=True)))
+
+    def close(self):
+        self.fp.write(b";")
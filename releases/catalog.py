@@ -0,0 +1,108 @@
+import hashlib
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+
+from releases.tags import normalize
+
+
+# ─── Release Catalog Pages ────────────────────────────────────────────────────
+#
+# The release list is read in keyset pages, newest first, ordered by
+# (release_datetime, id). A cursor names the last post a reader has, so
+# every page is one range scan of releasepost_recent_idx however deep they
+# scroll; there are no OFFSETs.
+#
+# Each rendered page is cached under the current catalog generation. Saving
+# or deleting a ReleasePost starts a new generation (releases/signals.py),
+# which retires every cached page at once. Both live in the default cache,
+# shared by all workers through Redis in production (settings.CACHES).
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+GENERATION_KEY = "releases:catalog:generation"
+
+
+def page_size():
+    return getattr(settings, "RELEASES_PAGE_SIZE", 12)
+
+
+def encode_cursor(post):
+    if post.release_datetime is None:
+        return f"none.{post.pk}"
+    micros = (post.release_datetime - _EPOCH) // timedelta(microseconds=1)
+    return f"{micros}.{post.pk}"
+
+
+def decode_cursor(cursor):
+    """(release_datetime or None, id) from a cursor, or None if it is malformed."""
+    try:
+        micros, pk = str(cursor).split(".", 1)
+        when = None if micros == "none" else _EPOCH + timedelta(microseconds=int(micros))
+        return when, int(pk)
+    except (ValueError, OverflowError):
+        return None
+
+
+def catalog_queryset(tag=None, after=None):
+    """Posts (optionally tagged `tag`) that come after a decoded cursor, in list order."""
+    from releases.models import ReleasePost
+    posts = ReleasePost.objects.order_by("-release_datetime", "-id")
+    if tag:
+        posts = posts.filter(tag_set__slug=normalize(tag))
+    if after is None:
+        return posts
+    when, pk = after
+    # Undated posts sort first on Postgres and last on SQLite; follow the backend.
+    nulls_first = connection.features.nulls_order_largest
+    undated = Q(release_datetime__isnull=True)
+    if when is None:
+        after_cursor = undated & Q(id__lt=pk)
+        if nulls_first:
+            after_cursor |= Q(release_datetime__isnull=False)
+    else:
+        # The `<=` gives the index a range bound, as in chat history pages.
+        after_cursor = Q(release_datetime__lte=when) & (Q(release_datetime__lt=when) | Q(id__lt=pk))
+        if not nulls_first:
+            after_cursor |= undated
+    return posts.filter(after_cursor)
+
+
+def catalog_page(tag=None, after=None, limit=None):
+    """Up to `limit` posts after the `after` cursor and the cursor for the next page (None at the end)."""
+    limit = limit or page_size()
+    posts = list(catalog_queryset(tag, after).prefetch_related("tag_set")[:limit + 1])
+    page = posts[:limit]
+    return page, (encode_cursor(page[-1]) if len(posts) > limit else None)
+
+
+def generation():
+    current = cache.get(GENERATION_KEY)
+    if current is None:
+        # Also covers an evicted key: a fresh generation can't collide with old pages.
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+        current = cache.get(GENERATION_KEY)
+    return current
+
+
+def invalidate():
+    cache.set(GENERATION_KEY, time.time_ns(), None)
+
+
+def cached_page(tag, cursor, render):
+    """
+    The cached render of one catalog page, made by `render(tag, after)` on a
+    miss. Pages are kept for RELEASES_CACHE_TIMEOUT seconds at most.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    tag_key = hashlib.md5(normalize(tag).encode()).hexdigest() if tag else ""
+    key = f"releases:catalog:{generation()}:{tag_key}:{cursor if after else ''}"
+    page = cache.get(key)
+    if page is None:
+        page = render(tag, after)
+        cache.set(key, page, getattr(settings, "RELEASES_CACHE_TIMEOUT", 600))
+    return page
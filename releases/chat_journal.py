@@ -0,0 +1,190 @@
+import asyncio
+import atexit
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from releases import metrics
+
+
+# ─── Chat Journal ─────────────────────────────────────────────────────────────
+#
+# Wall chat lines are broadcast as soon as they arrive and written to the
+# database afterwards, in batches. Each line gets its uid and timestamp up
+# front, so a retried batch can't duplicate rows (bulk_create skips uids that
+# already made it) and clients can match the saved row to what they saw.
+
+def write_messages(entries):
+    from releases.models import ChatMessage
+    ChatMessage.objects.bulk_create(
+        [ChatMessage(**entry) for entry in entries],
+        ignore_conflicts=True,
+    )
+
+
+class ChatJournal:
+    """
+    Per-process write-behind queue for ChatMessage rows. Flushes every
+    WALL_CHAT_FLUSH_INTERVAL seconds, or as soon as WALL_CHAT_FLUSH_BATCH
+    lines are waiting; a failed flush keeps its lines queued and retries.
+    Whatever is still queued at interpreter exit is written synchronously.
+    """
+
+    def __init__(self):
+        self.pending = []
+        self._flush_handle = None
+        self._flushing = False
+        self._in_flight = 0
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, "WALL_CHAT_FLUSH_INTERVAL", 1.0)
+
+    @property
+    def flush_batch(self):
+        return getattr(settings, "WALL_CHAT_FLUSH_BATCH", 200)
+
+    @property
+    def max_pending(self):
+        return getattr(settings, "WALL_CHAT_JOURNAL_MAX", 10000)
+
+    def append(self, username, message):
+        """Queues one chat line and returns its row fields (uid, timestamp, ...)."""
+        entry = {
+            "uid": uuid.uuid4(),
+            "username": username,
+            "message": message,
+            "timestamp": timezone.now(),
+        }
+        self.pending.append(entry)
+        if len(self.pending) > self.max_pending:
+            # The database has been unreachable for a long time; keep the newest lines.
+            dropped = len(self.pending) - self.max_pending
+            del self.pending[:dropped]
+            self._in_flight = max(0, self._in_flight - dropped)
+            metrics.increment("chat.journal.dropped", dropped)
+        metrics.set_gauge("chat.journal.depth", len(self.pending))
+        self._schedule(0 if len(self.pending) >= self.flush_batch else self.flush_interval)
+        return entry
+
+    def recent(self):
+        """Lines not yet written, oldest first."""
+        return list(self.pending)
+
+    def _schedule(self, delay):
+        loop = asyncio.get_running_loop()
+        if self._flush_handle is not None:
+            if delay or self._flush_handle.when() <= loop.time():
+                return
+            self._flush_handle.cancel()
+        self._flush_handle = loop.call_later(delay, lambda: loop.create_task(self.flush()))
+
+    async def flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._flushing:
+            return
+        self._flushing = True
+        try:
+            while self.pending:
+                batch = self.pending[:self.flush_batch]
+                self._in_flight = len(batch)
+                started = time.monotonic()
+                try:
+                    await database_sync_to_async(write_messages)(batch)
+                except Exception as e:
+                    print(f"Error flushing chat journal: {e}")
+                    metrics.increment("chat.journal.flush_errors")
+                    self._schedule(self.flush_interval)
+                    return
+                finally:
+                    in_flight, self._in_flight = self._in_flight, 0
+                metrics.observe("chat.journal.flush", time.monotonic() - started)
+                metrics.increment("chat.journal.written", len(batch))
+                # Lines appended during the write stay queued behind this batch.
+                del self.pending[:in_flight]
+                metrics.set_gauge("chat.journal.depth", len(self.pending))
+        finally:
+            self._flushing = False
+
+    def flush_sync(self):
+        """Last-chance flush for interpreter shutdown, when no event loop is running."""
+        while self.pending:
+            batch = self.pending[:self.flush_batch]
+            write_messages(batch)
+            del self.pending[:len(batch)]
+
+
+chat_journal = ChatJournal()
+atexit.register(chat_journal.flush_sync)
+
+
+# ─── History Pages ────────────────────────────────────────────────────────────
+#
+# Older chat is read in keyset pages, newest first, ordered by (timestamp,
+# uid). A cursor names the oldest line a client already has, so each page is
+# an index range scan however far back it goes; there are no OFFSETs.
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def encode_cursor(entry):
+    micros = (entry["timestamp"] - _EPOCH) // timedelta(microseconds=1)
+    return f"{micros}-{entry['uid'].hex}"
+
+
+def decode_cursor(cursor):
+    """(timestamp, uid) from a cursor, or None if it is malformed."""
+    try:
+        micros, uid = str(cursor).split("-", 1)
+        return _EPOCH + timedelta(microseconds=int(micros)), uuid.UUID(hex=uid)
+    except (ValueError, OverflowError):
+        return None
+
+
+def serialize_message(entry):
+    return {
+        "id": str(entry["uid"]),
+        "username": entry["username"],
+        "message": entry["message"],
+        "timestamp": entry["timestamp"].strftime("%H:%M"),
+    }
+
+
+def history_queryset(before=None):
+    """Saved chat lines older than a decoded `before` cursor, newest first."""
+    from django.db.models import Q
+    from releases.models import ChatMessage
+    rows = ChatMessage.objects.order_by("-timestamp", "-uid")
+    if before is not None:
+        timestamp, uid = before
+        # The leading `<=` gives the index a range bound; a bare OR wouldn't on Postgres.
+        rows = rows.filter(Q(timestamp__lt=timestamp) | Q(uid__lt=uid), timestamp__lte=timestamp)
+    return rows
+
+
+def history_page(before=None, limit=None):
+    """
+    Up to `limit` chat lines older than the `before` cursor (or the newest
+    ones), oldest first, and the cursor for the page before them (None at
+    the start of history). The newest page includes lines this worker's
+    journal hasn't written yet.
+    """
+    max_limit = getattr(settings, "WALL_CHAT_PAGE_MAX", 100)
+    limit = max(1, min(limit or max_limit, max_limit))
+    unsaved = chat_journal.recent() if before is None else []
+    entries = list(history_queryset(before).values("uid", "username", "message", "timestamp")[:limit + 1])
+    if unsaved:
+        saved = {entry["uid"] for entry in entries}
+        entries += [entry for entry in unsaved if entry["uid"] not in saved]
+        entries.sort(key=lambda entry: (entry["timestamp"], entry["uid"].hex), reverse=True)
+
+    page = entries[:limit]
+    page.reverse()
+    more = len(entries) > limit
+    return page, (encode_cursor(page[0]) if more else None)
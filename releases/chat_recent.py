@@ -0,0 +1,107 @@
+import threading
+from collections import deque
+
+from django.conf import settings
+
+from releases.chat_journal import encode_cursor, history_page, serialize_message
+
+
+# ─── Recent Chat ──────────────────────────────────────────────────────────────
+#
+# The last WALL_CHAT_RECENT_SIZE public chat lines, kept in memory so the
+# wall page and reconnecting sockets don't query the database for them.
+#
+# The buffer is fed by the chat group's broadcasts, which only reach a worker
+# while it has chat sockets. So it is only trusted while at least one is
+# attached: it loads from the database on the first read after the first
+# socket arrives, and is dropped when the last one leaves. A worker with no
+# sockets reads straight from the database.
+
+def recent_entry(entry):
+    """A journal/ChatMessage row as stored in the buffer: the client fields plus its cursor."""
+    return {**serialize_message(entry), "cursor": encode_cursor(entry)}
+
+
+def _public(entry):
+    return {key: value for key, value in entry.items() if key != "cursor"}
+
+
+class RecentChat:
+
+    def __init__(self):
+        self.entries = None
+        self.ids = set()
+        self.early = deque(maxlen=self.size)
+        self.early_ids = set()
+        self.has_older = False
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        return getattr(settings, "WALL_CHAT_RECENT_SIZE", 100)
+
+    def attach(self):
+        self.connections += 1
+
+    def detach(self):
+        self.connections -= 1
+        if self.connections <= 0:
+            self.connections = 0
+            with self._lock:
+                self.entries, self.ids = None, set()
+                self.early.clear()
+                self.early_ids.clear()
+
+    def add(self, entry):
+        """Records a broadcast line; repeats of the same id (one per local socket) are ignored."""
+        with self._lock:
+            if entry["id"] in self.ids:
+                return
+            if self.entries is None:
+                if self.connections and entry["id"] not in self.early_ids:
+                    # Loading (or about to); merged in when the load lands.
+                    if len(self.early) == self.early.maxlen:
+                        self.early_ids.discard(self.early[0]["id"])
+                    self.early.append(entry)
+                    self.early_ids.add(entry["id"])
+                return
+            self._append(entry)
+
+    def _append(self, entry):
+        if len(self.entries) == self.entries.maxlen:
+            self.ids.discard(self.entries[0]["id"])
+            self.has_older = True
+        self.entries.append(entry)
+        self.ids.add(entry["id"])
+
+    def latest(self, limit):
+        """The newest `limit` lines, oldest first, and the history cursor before them (or None)."""
+        limit = max(1, min(limit, self.size))
+        if not self.connections:
+            rows, next_cursor = history_page(limit=limit)
+            return [serialize_message(row) for row in rows], next_cursor
+        if self.entries is None:
+            self._load()
+        with self._lock:
+            entries = list(self.entries)[-limit:]
+            older = self.has_older or len(self.entries) > len(entries)
+        next_cursor = entries[0]["cursor"] if entries and older else None
+        return [_public(entry) for entry in entries], next_cursor
+
+    def _load(self):
+        rows, next_cursor = history_page(limit=self.size)
+        with self._lock:
+            if self.entries is not None:
+                return
+            self.entries = deque(maxlen=self.size)
+            self.ids = set()
+            self.has_older = next_cursor is not None
+            for entry in [recent_entry(row) for row in rows] + list(self.early):
+                if entry["id"] not in self.ids:
+                    self._append(entry)
+            self.early.clear()
+            self.early_ids.clear()
+
+
+recent_chat = RecentChat()
@@ -1,12 +1,21 @@
 import json
-import hashlib
 import secrets
 import random
 import re
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.consumer import get_handler_name
 from channels.db import database_sync_to_async
 from django.utils import timezone
-from django.core import signing
+from django.conf import settings
+from django.db import IntegrityError
+from releases import canvas, passwords
+from releases.canvas import canvas_broadcaster, canvas_buffer
+from releases.chat_journal import chat_journal, decode_cursor, encode_cursor, history_page, serialize_message
+from releases.chat_recent import recent_chat
+from releases.presence import presence
+from releases.throttle import SocketThrottle, client_address
+from releases.tokens import cached_account, make_token, read_token, token_cache
 
 
 # ─── Adjective + Noun random username generator ──────────────────────────────
@@ -32,123 +41,174 @@ def generate_random_username():
     return f"{random.choice(ADJECTIVES)}-{random.choice(NOUNS)}-{random.randint(10, 99)}"
 
 
-def hash_password(password: str) -> str:
-    salt = secrets.token_hex(16)
-    hashed = hashlib.sha256((salt + password).encode()).hexdigest()
-    return f"{salt}:{hashed}"
-
-
-def verify_password(password: str, stored_hash: str) -> bool:
-    try:
-        salt, hashed = stored_hash.split(":", 1)
-        return hashlib.sha256((salt + password).encode()).hexdigest() == hashed
-    except Exception:
-        return False
+# ─── Canvas Consumer ──────────────────────────────────────────────────────────
 
+def canvas_painter(scope):
+    """
+    Key for the canvas per-user bucket: the logged-in username, else the
+    session. None for a socket with neither, which then only has its
+    connection bucket and the per-address one.
+    """
+    user = scope.get("user")
+    if user is not None and user.is_authenticated:
+        return f"user:{user.get_username()}"
+    session = scope.get("session")
+    if session is not None and session.session_key:
+        return f"session:{session.session_key}"
+    return None
 
-# ─── Canvas Consumer ──────────────────────────────────────────────────────────
 
 class CanvasConsumer(AsyncWebsocketConsumer):
-    GROUP = "wall_canvas"
+    """
+    Shared canvas socket. Speaks JSON by default; clients that connect with
+    ?format=binary get the packed frames described in releases/canvas.py.
+    Outgoing draws are fanned out by canvas_broadcaster, not per-socket
+    group messages.
+    """
 
     async def connect(self):
-        await self.channel_layer.group_add(self.GROUP, self.channel_name)
+        self.attached = False
+        self.throttle = SocketThrottle("canvas")
+        self.client = client_address(self.scope)
+        self.painter = canvas_painter(self.scope)
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        self.binary = query.get("format", [""])[0] == "binary"
         await self.accept()
-        canvas_data = await self.load_canvas()
-        await self.send(text_data=json.dumps({
-            "type": "canvas_init",
-            "data": canvas_data,
-        }))
+        await canvas_buffer.attach()
+        self.attached = True
+        # Frames fanned out while the snapshot is encoded are held back and
+        # sent after it, so the client never applies a draw the init would
+        # then paint over.
+        self.backlog = []
+        canvas_broadcaster.add(self)
+        epoch, rev = canvas_broadcaster.epoch, canvas_broadcaster.revision
+        missed = self.frames_missed(query)
+        if missed is not None:
+            self.backlog[:0] = missed
+        elif self.binary:
+            await self.send(bytes_data=await canvas_buffer.snapshot_frame(epoch, rev))
+        else:
+            canvas_data = await canvas_buffer.snapshot()
+            await self.send(text_data=json.dumps({
+                "type": "canvas_init",
+                "epoch": epoch,
+                "rev": rev,
+                "data": canvas_data,
+            }))
+        while self.backlog:
+            await self.send_frame(self.backlog.pop(0))
+        self.backlog = None
+
+    def frames_missed(self, query):
+        """Deltas for a client reconnecting with ?epoch=..&since=<rev>, or None if it needs a snapshot."""
+        try:
+            since = int(query["since"][0])
+        except (KeyError, ValueError):
+            return None
+        return canvas_broadcaster.frames_since(query.get("epoch", [""])[0], since)
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.GROUP, self.channel_name)
+        if getattr(self, "attached", False):
+            self.attached = False
+            await canvas_broadcaster.remove(self)
+            await canvas_buffer.detach()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        size = len(bytes_data) if bytes_data is not None else len(text_data.encode())
+        if not self.throttle.fits(size):
+            await self.close(code=1009)
+            return
+
+        if bytes_data is not None:
+            if await self.admit(canvas.client_draw_count(bytes_data)):
+                await self.draw(canvas.decode_client_draw(bytes_data))
+            return
 
-    async def receive(self, text_data):
         msg = json.loads(text_data)
         action = msg.get("type")
 
         if action == "draw":
             pixels = msg.get("pixels", [])
-            await self.save_pixels(pixels)
-            await self.channel_layer.group_send(self.GROUP, {
-                "type": "canvas_draw",
-                "pixels": pixels,
-            })
+            if isinstance(pixels, list) and await self.admit(len(pixels)):
+                await self.draw(canvas.pixel_ops(pixels))
 
         elif action == "clear":
-            await self.clear_canvas()
-            await self.channel_layer.group_send(self.GROUP, {
-                "type": "canvas_clear",
-            })
+            if await self.admit(0, cost=self.throttle.limits["clear_cost"]):
+                await canvas_buffer.clear()
+                await canvas_broadcaster.clear()
+
+    async def admit(self, pixels, cost=None):
+        """Pixel cap and token buckets (one token per pixel), checked before any work."""
+        if not self.throttle.fits_pixels(pixels):
+            await self.notify_throttled(None)
+            return False
+        wait = self.throttle.take(pixels if cost is None else cost, user=self.painter, address=self.client)
+        if wait:
+            await self.notify_throttled(wait)
+            return False
+        return True
 
-    async def canvas_draw(self, event):
-        await self.send(text_data=json.dumps({
-            "type": "draw",
-            "pixels": event["pixels"],
-        }))
+    async def notify_throttled(self, retry_after):
+        if self.throttle.should_notify():
+            await self.send(text_data=json.dumps({
+                "type": "throttled",
+                "retry_after": None if retry_after in (None, float("inf")) else round(retry_after, 2),
+                "max_pixels": self.throttle.limits["max_pixels"],
+            }))
 
-    async def canvas_clear(self, event):
-        await self.send(text_data=json.dumps({"type": "clear"}))
+    async def draw(self, ops):
+        ops = await canvas_buffer.apply(ops)
+        if ops:
+            canvas_broadcaster.publish(ops)
 
-    @database_sync_to_async
-    def load_canvas(self):
-        from releases.models import WallCanvas
-        instance = WallCanvas.get_instance()
-        try:
-            return json.loads(instance.canvas_data)
-        except Exception:
-            return {}
+    async def deliver(self, message):
+        """Called by canvas_broadcaster with a frame already encoded both ways."""
+        if self.backlog is not None:
+            self.backlog.append(message)
+        else:
+            await self.send_frame(message)
 
-    @database_sync_to_async
-    def save_pixels(self, pixels):
-        from releases.models import WallCanvas
-        instance = WallCanvas.get_instance()
-        try:
-            data = json.loads(instance.canvas_data)
-        except Exception:
-            data = {}
-        for p in pixels:
-            key = f"{p['x']},{p['y']}"
-            if p.get("color") == "erase":
-                data.pop(key, None)
-            else:
-                data[key] = p["color"]
-        instance.canvas_data = json.dumps(data)
-        instance.save()
-
-    @database_sync_to_async
-    def clear_canvas(self):
-        from releases.models import WallCanvas
-        instance = WallCanvas.get_instance()
-        instance.canvas_data = '{}'
-        instance.save()
+    async def send_frame(self, message):
+        if self.binary:
+            await self.send(bytes_data=message["frame"])
+        else:
+            await self.send(text_data=message["text"])
 
 
 # ─── Chat Consumer ────────────────────────────────────────────────────────────
 
+def private_group_name(username):
+    """The group every chat socket logged in as `username` joins."""
+    safe = re.sub(r'[^a-zA-Z0-9\-\._]', '_', username)
+    return f"private_{safe}"[:100]
+
+
 class ChatConsumer(AsyncWebsocketConsumer):
-    GROUP = "wall_chat"
-    active_users = {}
+    GROUP = presence.group
 
     async def connect(self):
         self.username = None
         self.private_group = None
+        self.throttle = SocketThrottle("chat")
+        self.client = client_address(self.scope)
         await self.channel_layer.group_add(self.GROUP, self.channel_name)
+        recent_chat.attach()
+        self.attached = True
         await self.accept()
         await self.send_presence_to_self()
 
     async def disconnect(self, close_code):
         await self.channel_layer.group_discard(self.GROUP, self.channel_name)
+        if getattr(self, "attached", False):
+            self.attached = False
+            recent_chat.detach()
         if self.private_group:
             await self.channel_layer.group_discard(self.private_group, self.channel_name)
-        if self.channel_name in ChatConsumer.active_users:
-            del ChatConsumer.active_users[self.channel_name]
-            await self.broadcast_presence()
+        await presence.broadcast(*await presence.discard(self.channel_name))
 
     async def set_username(self, username):
         """Helper to bind this specific socket connection to a private user group safely"""
-        safe = re.sub(r'[^a-zA-Z0-9\-\._]', '_', username)
-        new_group = f"private_{safe}"[:100]
+        new_group = private_group_name(username)
         
         if self.private_group:
             await self.channel_layer.group_discard(self.private_group, self.channel_name)
@@ -158,6 +218,15 @@ class ChatConsumer(AsyncWebsocketConsumer):
         await self.channel_layer.group_add(self.private_group, self.channel_name)
 
     async def receive(self, text_data):
+        if not self.throttle.fits(len(text_data.encode())):
+            await self.close(code=1009)
+            return
+        wait = self.throttle.take(user=self.username or self.client)
+        if wait:
+            if self.throttle.should_notify():
+                await self.send(text_data=json.dumps({"type": "throttled", "retry_after": round(wait, 2)}))
+            return
+
         msg = json.loads(text_data)
         action = msg.get("type")
 
@@ -165,15 +234,13 @@ class ChatConsumer(AsyncWebsocketConsumer):
             username = msg.get("username", "").strip()[:50]
             message = msg.get("message", "").strip()[:500]
             if not message: return
-            
-            success = await self.save_message(username, message)
-            if success:
-                await self.channel_layer.group_send(self.GROUP, {
-                    "type": "chat_broadcast",
-                    "username": username,
-                    "message": message,
-                    "timestamp": timezone.now().strftime("%H:%M"),
-                })
+
+            entry = chat_journal.append(username, message)
+            await self.channel_layer.group_send(self.GROUP, {
+                "type": "chat_broadcast",
+                **serialize_message(entry),
+                "cursor": encode_cursor(entry),
+            })
             
         elif action == "private_message":
             if not self.username: return
@@ -195,8 +262,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 return
 
             ts = timezone.now().strftime("%H:%M")
-            safe_target = re.sub(r'[^a-zA-Z0-9\-\._]', '_', target)
-            target_group = f"private_{safe_target}"[:100]
+            target_group = private_group_name(target)
 
             # Route to the recipient's private group
             await self.channel_layer.group_send(target_group, {
@@ -217,6 +283,28 @@ class ChatConsumer(AsyncWebsocketConsumer):
                     "timestamp": ts,
                 })
 
+        elif action == "get_recent":
+            limit = msg.get("limit") if isinstance(msg.get("limit"), int) else settings.WALL_CHAT_INITIAL_MESSAGES
+            messages, next_cursor = await database_sync_to_async(recent_chat.latest)(limit)
+            await self.send(text_data=json.dumps({
+                "type": "recent_messages",
+                "messages": messages,
+                "next": next_cursor,
+            }))
+
+        elif action == "get_history":
+            before = msg.get("before")
+            cursor = decode_cursor(before) if before else None
+            if before and cursor is None: return
+            limit = msg.get("limit") if isinstance(msg.get("limit"), int) else None
+            messages, next_cursor = await database_sync_to_async(history_page)(cursor, limit)
+            await self.send(text_data=json.dumps({
+                "type": "chat_history",
+                "before": before,
+                "messages": [serialize_message(m) for m in messages],
+                "next": next_cursor,
+            }))
+
         elif action == "get_private_history":
             if not self.username: return
             target = msg.get("with_user")
@@ -231,29 +319,32 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 "messages": history
             }))
 
+        elif action == "mark_read":
+            if not self.username: return
+            other = msg.get("with_user", "")
+            if other:
+                await self.mark_read(self.username, other)
+
         elif action == "presence_update":
             username = msg.get("username", "").strip()[:50]
             offline = bool(msg.get("offline", False))
             if username:
                 await self.set_username(username)
-                ChatConsumer.active_users[self.channel_name] = {
-                    "username": username,
-                    "offline": offline
-                }
-                await self.broadcast_presence()
+                await presence.broadcast(*await presence.update(self.channel_name, username, not offline))
 
         elif action == "token_login":
             token = msg.get("token", "")
             try:
-                username = signing.loads(token, max_age=60*60*24*30)
-                exists = await self.stamp_token_login(username)
-                if exists:
+                account = await self.token_account(token)
+                if account:
+                    username = account[1]
                     await self.set_username(username)
                     await self.send(text_data=json.dumps({
                         "type": "token_login_result",
                         "success": True,
                         "username": username
                     }))
+                    await self.send_inbox()
                 else:
                     await self.send(text_data=json.dumps({"type": "token_login_result", "success": False}))
             except Exception:
@@ -289,6 +380,8 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 "type": "auth_result",
                 **result,
             }))
+            if result.get("success"):
+                await self.send_inbox()
 
         elif action == "save_email":
             username = msg.get("username", "").strip()[:50]
@@ -309,8 +402,10 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
     # ─── Group Handlers ───
     async def chat_broadcast(self, event):
+        recent_chat.add({key: event[key] for key in ("id", "username", "message", "timestamp", "cursor")})
         await self.send(text_data=json.dumps({
             "type": "message",
+            "id": event["id"],
             "username": event["username"],
             "message": event["message"],
             "timestamp": event["timestamp"],
@@ -325,122 +420,183 @@ class ChatConsumer(AsyncWebsocketConsumer):
             "timestamp": event["timestamp"]
         }))
         
-    async def presence_list(self, event):
+    async def avatar_ready(self, event):
         await self.send(text_data=json.dumps({
-            "type": "presence_list",
-            "users": event["users"],
+            "type": "avatar_ready",
+            "avatar_url": event["avatar_url"],
+            "error": event["error"],
+        }))
+
+    async def presence_diff(self, event):
+        await self.send(text_data=json.dumps({
+            "type": "presence_diff",
+            "joined": event["joined"],
+            "left": event["left"],
         }))
 
     # ─── Presence Helpers ───
-    async def broadcast_presence(self):
-        visible_users = list(set([
-            data["username"] for data in ChatConsumer.active_users.values() if not data.get("offline")
-        ]))
-        visible_users.sort(key=str.lower)
-        await self.channel_layer.group_send(self.GROUP, {
-            "type": "presence_list",
-            "users": visible_users,
-        })
-        
     async def send_presence_to_self(self):
-        visible_users = list(set([
-            data["username"] for data in ChatConsumer.active_users.values() if not data.get("offline")
-        ]))
-        visible_users.sort(key=str.lower)
+        """Full list once on connect; after that the socket only gets presence_diff."""
         await self.send(text_data=json.dumps({
             "type": "presence_list",
-            "users": visible_users,
+            "users": await presence.members(),
         }))
 
+    async def send_inbox(self):
+        """One payload with every conversation's last message and unread count."""
+        inbox = await self.fetch_inbox(self.username)
+        if inbox is not None:
+            await self.send(text_data=json.dumps({"type": "inbox", **inbox}))
+
     # ─── DB Helpers ───
     @database_sync_to_async
-    def save_message(self, username, message):
-        from releases.models import ChatMessage
+    def save_private_message(self, sender, recipient, message):
+        from releases.models import InboxEntry, PrivateMessage
+        from django.db import transaction
         try:
-            ChatMessage.objects.create(username=username, message=message)
+            with transaction.atomic():
+                pm = PrivateMessage.objects.create(sender=sender, recipient=recipient, message=message)
+                InboxEntry.record(pm)
             return True
-        except Exception:
+        except Exception as e:
+            print(f"Error saving PM: {e}")
             return False
 
     @database_sync_to_async
-    def save_private_message(self, sender, recipient, message):
-        from releases.models import PrivateMessage
+    def fetch_inbox(self, owner):
+        from releases.models import InboxEntry
         try:
-            PrivateMessage.objects.create(sender=sender, recipient=recipient, message=message)
-            return True
+            entries, unread_total = InboxEntry.inbox(owner)
         except Exception as e:
-            print(f"Error saving PM: {e}")
-            return False
+            print(f"Error fetching inbox: {e}")
+            return None
+        return {
+            "unread_total": unread_total,
+            "conversations": [
+                {
+                    "with_user": e.other,
+                    "last_sender": e.last_sender,
+                    "last_message": e.last_message,
+                    "timestamp": e.last_timestamp.strftime("%H:%M"),
+                    "unread": e.unread,
+                }
+                for e in entries
+            ],
+        }
+
+    @database_sync_to_async
+    def mark_read(self, owner, other):
+        from releases.models import InboxEntry
+        InboxEntry.objects.filter(owner=owner, other=other, unread__gt=0).update(unread=0)
 
     @database_sync_to_async
     def fetch_private_history(self, user1, user2):
         from releases.models import PrivateMessage
-        from django.db.models import Q
         try:
-            msgs = PrivateMessage.objects.filter(
-                Q(sender=user1, recipient=user2) | Q(sender=user2, recipient=user1)
-            ).order_by('-timestamp')[:50]
-            msgs = list(msgs)
+            msgs = list(PrivateMessage.between(user1, user2)[:50])
             msgs.reverse()
             return [{"sender": m.sender, "message": m.message, "timestamp": m.timestamp.strftime("%H:%M")} for m in msgs]
         except Exception as e:
             print(f"Error fetching PM history: {e}")
             return None
 
+    async def token_account(self, token):
+        """(pk, username) for a login token, or None. Reconnects with the same token hit token_cache."""
+        if not isinstance(token, str):
+            return None
+        account = await database_sync_to_async(cached_account)(token)
+        if account is not None:
+            return account
+        signed = read_token(token)
+        if signed is None:
+            return None
+        username, generation, expires = signed
+        pk = await self.stamp_token_login(username, generation)
+        if pk is None:
+            return None
+        token_cache.put(token, pk, username, generation, expires)
+        return pk, username
+
     @database_sync_to_async
-    def stamp_token_login(self, username):
+    def stamp_token_login(self, username, generation):
+        """Records the login and returns the account's pk, or None if it no longer exists or the token was revoked."""
         from releases.models import ChatUsername
         try:
-            entry = ChatUsername.objects.get(username__iexact=username)
+            entry = ChatUsername.matching(username).filter(token_generation=generation).get()
             entry.last_login = timezone.now()
             entry.save(update_fields=['last_login'])
-            return True
+            return entry.pk
         except ChatUsername.DoesNotExist:
-            return False
+            return None
 
     @database_sync_to_async
     def check_username(self, username):
         from releases.models import ChatUsername
         try:
-            entry = ChatUsername.objects.get(username__iexact=username)
+            entry = ChatUsername.matching(username).get()
             return {"taken": True, "password_protected": True, "has_email": bool(entry.email)}
         except ChatUsername.DoesNotExist:
             return {"taken": False, "password_protected": False, "has_email": False}
 
-    @database_sync_to_async
-    def reserve_username(self, username, password):
-        from releases.models import ChatUsername
-        if ChatUsername.objects.filter(username__iexact=username).exists():
+    async def reserve_username(self, username, password):
+        # Password hashing runs on its own pool, between the database calls.
+        if (await self.check_username(username))["taken"]:
             return {"success": False, "error": "Username already reserved."}
         if len(password) < 4:
             return {"success": False, "error": "Password must be at least 4 characters."}
-        ChatUsername.objects.create(
-            username=username,
-            password_hash=hash_password(password),
-            last_login=timezone.now()
-        )
-        return {"success": True, "token": signing.dumps(username)}
+        return await self.create_username(username, await passwords.hash_password_async(password))
 
     @database_sync_to_async
-    def auth_username(self, username, password):
+    def create_username(self, username, password_hash):
         from releases.models import ChatUsername
         try:
-            entry = ChatUsername.objects.get(username__iexact=username)
-            if verify_password(password, entry.password_hash):
-                entry.last_login = timezone.now()
-                entry.save(update_fields=['last_login'])
-                return {"success": True, "has_email": bool(entry.email), "token": signing.dumps(username)}
-            return {"success": False, "error": "Wrong password."}
-        except ChatUsername.DoesNotExist:
+            entry = ChatUsername.objects.create(
+                username=username,
+                password_hash=password_hash,
+                last_login=timezone.now()
+            )
+        except IntegrityError:
+            # Someone reserved the same name (in any case) since the check above.
+            return {"success": False, "error": "Username already reserved."}
+        return {"success": True, "token": make_token(entry.username, entry.token_generation)}
+
+    async def auth_username(self, username, password):
+        login = await self.fetch_login(username)
+        if login is None:
             return {"success": False, "error": "Username not found."}
+        stored, generation = login
+        if not await passwords.verify_password_async(password, stored):
+            return {"success": False, "error": "Wrong password."}
+        # Hashes from an older algorithm or cost are upgraded while we have the password.
+        new_hash = await passwords.hash_password_async(password) if passwords.needs_rehash(stored) else None
+        has_email = await self.record_login(username, stored, new_hash)
+        # The generation read with the verified hash, so a reset since then still revokes this token.
+        return {"success": True, "has_email": has_email, "token": make_token(username, generation)}
+
+    @database_sync_to_async
+    def fetch_login(self, username):
+        """(password_hash, token_generation) for a reserved name, or None."""
+        from releases.models import ChatUsername
+        return ChatUsername.matching(username).values_list("password_hash", "token_generation").first()
+
+    @database_sync_to_async
+    def record_login(self, username, verified_hash, new_hash=None):
+        from releases.models import ChatUsername
+        entry = ChatUsername.matching(username)
+        entry.update(last_login=timezone.now())
+        if new_hash:
+            # Only replaces the hash that was verified, never a password reset since.
+            entry.filter(password_hash=verified_hash).update(password_hash=new_hash)
+        return bool(entry.values_list("email", flat=True).first())
 
     @database_sync_to_async
     def send_reset_email(self, username):
         from releases.models import ChatUsername, PasswordResetToken
-        import secrets, os, resend
+        from releases.outbox import enqueue
+        import secrets, os
         generic = {"success": True, "message": "If that username has an email on file, a reset link has been sent."}
         try:
-            entry = ChatUsername.objects.get(username__iexact=username)
+            entry = ChatUsername.matching(username).get()
         except ChatUsername.DoesNotExist:
             return generic
         if not entry.email:
@@ -450,7 +606,6 @@ class ChatConsumer(AsyncWebsocketConsumer):
         PasswordResetToken.objects.create(username=entry, token=token)
         base_url = os.environ.get("SITE_URL", "https://fliphouserecords.com")
         reset_url = f"{base_url}/wall/reset-password/{token}/"
-        resend.api_key = os.environ.get("RESEND_API_KEY", "")
         email_html = (
             "<div style='background:#000;color:#fff;font-family:Courier New,monospace;"
             "padding:40px;max-width:520px;margin:0 auto;border:1px solid rgba(255,255,255,0.2);border-radius:12px;'>"
@@ -467,15 +622,8 @@ class ChatConsumer(AsyncWebsocketConsumer):
             f"If you didn't request this, ignore this email - your password won't change.<br>"
             f"Link: {reset_url}</p></div>"
         ).format(entry.username)
-        try:
-            resend.Emails.send({
-                "from": "Flip House Records <noreply@fliphouserecords.com>",
-                "to": entry.email,
-                "subject": "Reset your Wall password",
-                "html": email_html,
-            })
-        except Exception:
-            return {"success": False, "error": "Failed to send email. Try again later."}
+        # Sent in the background (releases/outbox.py); the provider is never waited on here.
+        enqueue(entry.email, "Reset your Wall password", email_html)
         return generic
 
     @database_sync_to_async
@@ -485,9 +633,110 @@ class ChatConsumer(AsyncWebsocketConsumer):
         if email and not re.match(r'^[^@]+@[^@]+\.[^@]+$', email):
             return {"success": False, "error": "Invalid email address."}
         try:
-            entry = ChatUsername.objects.get(username__iexact=username)
+            entry = ChatUsername.matching(username).get()
             entry.email = email if email else None
             entry.save(update_fields=['email'])
             return {"success": True}
         except ChatUsername.DoesNotExist:
-            return {"success": False, "error": "Username not found."}
\ No newline at end of file
+            return {"success": False, "error": "Username not found."}
+
+# ─── Wall Consumer ────────────────────────────────────────────────────────────
+
+class WallConsumer(AsyncWebsocketConsumer):
+    """
+    Canvas and chat over one socket. Each stream is a CanvasConsumer or
+    ChatConsumer running inside this one, with its frames tagged on the wire:
+
+        text    "<stream>:<payload>"       e.g. 'chat:{"type": "get_recent"}'
+        binary  <stream byte><payload>     1 = canvas
+
+    Clients start and stop streams with "open:<stream>?<query>" (the query
+    the stream's own endpoint would get) and "close:<stream>". A stream the
+    server closes, e.g. for an oversized message, is reported as
+    "closed:<stream>:<code>"; the socket itself stays up.
+    """
+
+    STREAMS = {"canvas": CanvasConsumer, "chat": ChatConsumer}
+    BINARY_TAGS = {"canvas": 1}
+    BINARY_STREAMS = {tag: name for name, tag in BINARY_TAGS.items()}
+
+    async def connect(self):
+        self.streams = {}
+        self.closing = {}
+        self.throttle = SocketThrottle("wall")
+        self.client = client_address(self.scope)
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        for name in list(self.streams):
+            await self.close_stream(name, close_code, notify=False)
+
+    async def dispatch(self, message):
+        # Group messages (chat_broadcast, presence_diff, ...) reach this
+        # socket's channel; hand them to the stream that handles them.
+        if message["type"].startswith("websocket."):
+            return await super().dispatch(message)
+        handler = get_handler_name(message)
+        for stream in list(self.streams.values()):
+            if getattr(stream, handler, None) is not None:
+                return await stream.dispatch(message)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        if bytes_data is not None:
+            name = self.BINARY_STREAMS.get(bytes_data[:1][0]) if bytes_data else None
+            if name in self.streams:
+                await self.run_stream(name, self.streams[name].receive(bytes_data=bytes_data[1:]))
+            return
+
+        name, _, payload = text_data.partition(":")
+        if name in self.streams:
+            await self.run_stream(name, self.streams[name].receive(text_data=payload))
+        elif name in ("open", "close"):
+            if not self.throttle.fits(len(text_data.encode())) or self.throttle.take(user=self.client):
+                return
+            stream, _, query = payload.partition("?")
+            if stream not in self.STREAMS:
+                return
+            if stream in self.streams:
+                await self.close_stream(stream, 1000, notify=False)
+            if name == "open":
+                await self.open_stream(stream, query)
+
+    async def open_stream(self, name, query):
+        stream = self.STREAMS[name]()
+        stream.scope = {**self.scope, "path": f"/ws/{name}/", "query_string": query.encode()}
+        stream.channel_layer = self.channel_layer
+        stream.channel_name = self.channel_name
+        stream.base_send = self.stream_sender(name)
+        self.streams[name] = stream
+        await self.run_stream(name, stream.connect())
+
+    async def run_stream(self, name, call):
+        """Awaits a stream's handler, then tears the stream down if it closed itself."""
+        await call
+        if name in self.closing:
+            await self.close_stream(name, self.closing[name])
+
+    async def close_stream(self, name, code, notify=True):
+        stream = self.streams.pop(name, None)
+        self.closing.pop(name, None)
+        if stream is None:
+            return
+        await stream.disconnect(code)
+        if notify:
+            await self.send(text_data=f"closed:{name}:{code or 1000}")
+
+    def stream_sender(self, name):
+        tag = bytes([self.BINARY_TAGS.get(name, 0)])
+
+        async def send(message):
+            if message["type"] == "websocket.accept" or name in self.closing:
+                return
+            if message["type"] == "websocket.close":
+                self.closing[name] = message.get("code", 1000)
+            elif message.get("bytes") is not None:
+                await self.send(bytes_data=tag + message["bytes"])
+            else:
+                await self.send(text_data=f"{name}:{message['text']}")
+
+        return send
@@ -0,0 +1,196 @@
+import hashlib
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from releases import metrics
+
+
+# ─── Image Derivatives ────────────────────────────────────────────────────────
+#
+# Album art, flyers, headshots and link favicons are uploaded at whatever size
+# the uploader had. After an upload commits, a small worker pool
+# (IMAGE_WORKERS threads) writes resized copies next to the original: one per
+# IMAGE_DERIVATIVE_WIDTHS width narrower than it (plus one at its own width,
+# capped at the widest), in each IMAGE_DERIVATIVE_FORMATS format this Pillow
+# can encode. "album_art/cover.png" gets "album_art/cover.w640.webp" and so
+# on. The {% picture %} tag (releases/templatetags/images.py) serves them
+# through srcset, and serves the original until they exist. Finished sets are
+# looked up through the default cache, which every worker shares.
+#
+# `manage.py images_backfill` makes derivatives for media uploaded earlier.
+
+# model name → image fields with derivatives
+FIELDS = {
+    "ReleasePost": ("album_art",),
+    "Event": ("flyer",),
+    "Artist": ("headshot",),
+    "AffiliateLink": ("favicon",),
+}
+
+# format → (Pillow format, MIME type, file extension)
+FORMATS = {
+    "avif": ("AVIF", "image/avif", "avif"),
+    "webp": ("WEBP", "image/webp", "webp"),
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+}
+
+DEFAULT_QUALITY = {"avif": 55, "webp": 80, "jpeg": 82}
+
+
+def widths():
+    return sorted(getattr(settings, "IMAGE_DERIVATIVE_WIDTHS", [320, 640, 1280]))
+
+
+def formats():
+    """The configured formats Pillow has an encoder for (AVIF needs Pillow 11.2+)."""
+    Image.init()
+    return [fmt for fmt in getattr(settings, "IMAGE_DERIVATIVE_FORMATS", ["avif", "webp", "jpeg"]) if FORMATS[fmt][0] in Image.SAVE]
+
+
+def target_widths(width):
+    largest = widths()[-1]
+    return sorted({w for w in widths() if w < width} | {min(width, largest)})
+
+
+def derivative_name(original, width, fmt):
+    return f"{os.path.splitext(original)[0]}.w{width}.{FORMATS[fmt][2]}"
+
+
+def encode(image, fmt):
+    quality = getattr(settings, "IMAGE_DERIVATIVE_QUALITY", {}).get(fmt, DEFAULT_QUALITY[fmt])
+    out = io.BytesIO()
+    if fmt == "jpeg":
+        if image.mode == "RGBA":
+            # JPEG has no alpha; flatten onto the site's black background.
+            flat = Image.new("RGB", image.size, (0, 0, 0))
+            flat.paste(image, mask=image.getchannel("A"))
+            image = flat
+        image.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(out, FORMATS[fmt][0], quality=quality)
+    return out.getvalue()
+
+
+def generate(original, storage):
+    """
+    Writes the derivatives of `original` to `storage`. Returns (width, height,
+    variants); animated images get no variants, as they'd lose their motion.
+    """
+    with storage.open(original, "rb") as f:
+        image = Image.open(f)
+        if getattr(image, "is_animated", False):
+            return image.width, image.height, {}
+        if image.format == "JPEG":
+            # Let libjpeg decode at a reduced scale that still covers the widest copy.
+            largest = widths()[-1]
+            image.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+    image = image.convert("RGBA" if has_alpha else "RGB")
+
+    variants = {}
+    for width in target_widths(image.width):
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+        for fmt in formats():
+            name = storage.save(derivative_name(original, width, fmt), ContentFile(encode(resized, fmt)))
+            variants.setdefault(fmt, []).append([width, name])
+    return image.width, image.height, variants
+
+
+# ─── Variant Lookups ──────────────────────────────────────────────────────────
+
+def cache_key(original):
+    return f"images:variants:{hashlib.md5(original.encode()).hexdigest()}"
+
+
+def variants_for(original):
+    """The format → [[width, name], ...] map for `original`, or {} until its derivatives are ready."""
+    from releases.models import ImageVariantSet
+    key = cache_key(original)
+    variants = cache.get(key)
+    if variants is None:
+        variants = ImageVariantSet.objects.filter(original=original, status=ImageVariantSet.READY).values_list("variants", flat=True).first()
+        # A miss is only remembered briefly; finishing a set overwrites it anyway.
+        cache.set(key, variants or {}, None if variants is not None else 60)
+    return variants or {}
+
+
+# ─── Jobs ─────────────────────────────────────────────────────────────────────
+
+def build(model_name, field_name, original):
+    """Makes (or remakes) the derivatives of one original. Returns True on success."""
+    from releases import catalog
+    from releases.models import ImageVariantSet
+    storage = apps.get_model("releases", model_name)._meta.get_field(field_name).storage
+    previous = ImageVariantSet.objects.filter(original=original).values_list("variants", flat=True).first() or {}
+    for pairs in previous.values():
+        for _, name in pairs:
+            storage.delete(name)
+
+    started = time.monotonic()
+    try:
+        width, height, variants = generate(original, storage)
+    except Exception as e:
+        print(f"Error generating derivatives of {original}: {e}")
+        ImageVariantSet.objects.update_or_create(
+            original=original, defaults={"status": ImageVariantSet.FAILED, "variants": {}, "error": str(e)[:1000]},
+        )
+        metrics.increment("images.failed")
+        return False
+    ImageVariantSet.objects.update_or_create(original=original, defaults={
+        "status": ImageVariantSet.READY, "width": width, "height": height, "variants": variants, "error": "",
+    })
+    cache.set(cache_key(original), variants, None)
+    metrics.observe("images.generate", time.monotonic() - started)
+    if model_name == "ReleasePost":
+        # Cached release pages were rendered without the new srcset.
+        catalog.invalidate()
+    return True
+
+
+def run_job(model_name, field_name, original):
+    close_old_connections()
+    try:
+        build(model_name, field_name, original)
+    except Exception as e:
+        print(f"Error in image job for {original}: {e}")
+    finally:
+        close_old_connections()
+
+
+_executor = None
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "IMAGE_WORKERS", 2),
+            thread_name_prefix="image-derivatives",
+        )
+    return _executor
+
+
+def schedule(instance):
+    """Queues derivatives for each newly uploaded image on `instance`, once the save commits."""
+    from releases.models import ImageVariantSet
+    model_name = type(instance).__name__
+    for field_name in FIELDS.get(model_name, ()):
+        file = getattr(instance, field_name)
+        if not file:
+            continue
+        _, created = ImageVariantSet.objects.get_or_create(original=file.name)
+        if created:
+            metrics.increment("images.queued")
+            transaction.on_commit(partial(executor().submit, run_job, model_name, field_name, file.name))
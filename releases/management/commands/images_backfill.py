@@ -0,0 +1,37 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from releases import images
+from releases.models import ImageVariantSet
+
+
+class Command(BaseCommand):
+    help = "Make resized derivatives for uploaded images that don't have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Remake derivatives that already exist.")
+        parser.add_argument("--retry-failed", action="store_true", help="Try images whose derivatives failed before.")
+
+    def handle(self, *args, **options):
+        done = ImageVariantSet.objects.filter(status=ImageVariantSet.READY)
+        if not options["retry_failed"]:
+            done = done | ImageVariantSet.objects.filter(status=ImageVariantSet.FAILED)
+        skip = set() if options["force"] else set(done.values_list("original", flat=True))
+
+        built = failed = 0
+        for model_name, field_names in images.FIELDS.items():
+            Model = apps.get_model("releases", model_name)
+            for field_name in field_names:
+                originals = (
+                    Model.objects.exclude(**{field_name: ""}).exclude(**{f"{field_name}__isnull": True})
+                    .values_list(field_name, flat=True).distinct()
+                )
+                for original in originals:
+                    if original in skip:
+                        continue
+                    if images.build(model_name, field_name, original):
+                        built += 1
+                        self.stdout.write(f"  {original}")
+                    else:
+                        failed += 1
+        self.stdout.write(f"Made derivatives for {built} images; {failed} failed.")
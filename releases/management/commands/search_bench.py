@@ -0,0 +1,132 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from releases import search
+from releases.models import Artist, Event, ReleasePost
+
+
+class Rollback(Exception):
+    pass
+
+
+SYLLABLES = ["ba", "ko", "ri", "su", "ten", "mor", "vel", "dra", "lo", "qui", "zen", "fa", "gro", "mi", "sta", "ph"]
+GENRE_WORDS = ["boom", "bap", "lofi", "chill", "trap", "soul", "jazz", "funk", "drill", "ambient", "dub", "house"]
+
+
+class Command(BaseCommand):
+    help = "Time site search against icontains scans on a generated catalog (rolled back afterwards)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=100_000)
+        parser.add_argument("--queries", type=int, default=100)
+        parser.add_argument("--scan-queries", type=int, default=10, help="How many queries to time as icontains scans.")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed for the generated catalog.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        # A few thousand made-up words with a long-tailed frequency, like real text.
+        vocabulary = GENRE_WORDS + sorted({
+            "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(5000)
+        })
+        weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+        try:
+            with transaction.atomic():
+                self.seed(rng, vocabulary, weights, options["items"])
+                self.run(rng, vocabulary, weights, options["queries"], options["scan_queries"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def text(self, rng, vocabulary, weights, low, high):
+        return " ".join(rng.choices(vocabulary, weights, k=rng.randint(low, high)))
+
+    def seed(self, rng, vocabulary, weights, count):
+        started = time.monotonic()
+        now = timezone.now()
+        releases, artists, events = count * 6 // 10, count // 10, count - count * 6 // 10 - count // 10
+        ReleasePost.objects.bulk_create(
+            [
+                ReleasePost(
+                    title=self.text(rng, vocabulary, weights, 2, 5)[:100], slug=f"search-bench-{i}",
+                    body=self.text(rng, vocabulary, weights, 30, 120), tags=", ".join(rng.sample(GENRE_WORDS, 3)),
+                    release_datetime=now - timedelta(hours=i),
+                )
+                for i in range(releases)
+            ],
+            batch_size=1000,
+        )
+        Artist.objects.bulk_create(
+            [
+                Artist(name=self.text(rng, vocabulary, weights, 1, 3), genre=rng.choice(GENRE_WORDS),
+                       bio=self.text(rng, vocabulary, weights, 40, 150))
+                for _ in range(artists)
+            ],
+            batch_size=1000,
+        )
+        Event.objects.bulk_create(
+            [
+                Event(title=self.text(rng, vocabulary, weights, 2, 6), venue=self.text(rng, vocabulary, weights, 1, 2),
+                      description=self.text(rng, vocabulary, weights, 20, 80), event_date=now + timedelta(days=i % 365))
+                for i in range(events)
+            ],
+            batch_size=1000,
+        )
+        self.stdout.write(f"Generated {count} items in {time.monotonic() - started:.1f}s")
+
+        started = time.monotonic()
+        written = search.rebuild()
+        self.stdout.write(f"Indexed {written} documents in {time.monotonic() - started:.1f}s ({connection.vendor})")
+
+    def run(self, rng, vocabulary, weights, iterations, scan_iterations):
+        queries = []
+        for _ in range(iterations):
+            words = rng.choices(vocabulary, weights, k=rng.randint(1, 3))
+            if rng.random() < 0.3:
+                # Someone still typing: the last word is a prefix.
+                words[-1] = words[-1][:max(3, len(words[-1]) - 2)]
+            queries.append(" ".join(words))
+
+        indexed = self.time_queries(queries, lambda q: search.search(q, 1))
+        deep = self.time_queries(queries, lambda q: search.search(q, 5))
+        scans = self.time_queries(queries[:scan_iterations], self.scan)
+        self.report("search p1", indexed)
+        self.report("search p5", deep)
+        self.report("icontains", scans)
+        self.stdout.write(f"speedup (median, page 1): {statistics.median(scans) / statistics.median(indexed):.1f}x")
+
+    def scan(self, query):
+        # What a public search without the index would do: icontains over the three text columns.
+        terms = search.parse_terms(query)
+        results = []
+        for model, fields in ((ReleasePost, ["title", "body"]), (Artist, ["name", "bio"]), (Event, ["title", "description"])):
+            matches = model.objects.all()
+            for term in terms:
+                condition = Q()
+                for field in fields:
+                    condition |= Q(**{f"{field}__icontains": term})
+                matches = matches.filter(condition)
+            results.extend(matches.values_list("pk", flat=True)[:search.page_size()])
+        return results
+
+    def time_queries(self, queries, run):
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            run(query)
+            timings.append(time.perf_counter() - started)
+        return timings
+
+    def report(self, label, timings):
+        timings = sorted(timings)
+        p95 = timings[max(int(len(timings) * 0.95) - 1, 0)]
+        self.stdout.write(
+            f"{label:>10}: median {statistics.median(timings) * 1000:.2f} ms, "
+            f"p95 {p95 * 1000:.2f} ms, mean {statistics.mean(timings) * 1000:.2f} ms"
+        )
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from releases import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the site search index from every release, artist and event."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        # One transaction, so searches keep seeing the old index until the new one is complete.
+        with transaction.atomic():
+            written = search.rebuild(options["batch_size"])
+        self.stdout.write(f"Indexed {written} documents in {time.monotonic() - started:.1f}s.")
@@ -0,0 +1,70 @@
+import asyncio
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from releases import passwords
+
+
+class Command(BaseCommand):
+    help = (
+        "Time Wall logins at the configured password cost: concurrent verifications "
+        "on the password pool, and how long the event loop stalls meanwhile."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--logins", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=50, help="Logins in flight at once.")
+        parser.add_argument("--hasher", choices=sorted(passwords.HASHERS), help="Defaults to WALL_PASSWORD_HASHER.")
+
+    def handle(self, *args, **options):
+        hasher = options["hasher"] or settings.WALL_PASSWORD_HASHER
+        with override_settings(WALL_PASSWORD_HASHER=hasher):
+            encoded = passwords.hash_password("correct horse battery staple")
+            started = time.perf_counter()
+            passwords.verify_password("correct horse battery staple", encoded)
+            single = time.perf_counter() - started
+            self.stdout.write(
+                f"{hasher} {settings.WALL_PASSWORD_COST.get(hasher, {})}, "
+                f"{settings.WALL_PASSWORD_WORKERS} workers: one verify {single * 1000:.1f} ms"
+            )
+            latencies, elapsed, stall = asyncio.run(self.run(encoded, options["logins"], options["concurrency"]))
+
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        self.stdout.write(
+            f"{options['logins']} logins, {options['concurrency']} concurrent: "
+            f"{options['logins'] / elapsed:.1f} logins/s, median {statistics.median(latencies) * 1000:.1f} ms, "
+            f"p95 {p95 * 1000:.1f} ms"
+        )
+        self.stdout.write(f"longest event loop stall: {stall * 1000:.1f} ms")
+
+    async def run(self, encoded, logins, concurrency):
+        gate = asyncio.Semaphore(concurrency)
+        done = asyncio.Event()
+        stall = 0.0
+
+        async def ticker():
+            # A stand-in for every other socket on the loop: how late does it wake?
+            nonlocal stall
+            while not done.is_set():
+                started = time.perf_counter()
+                await asyncio.sleep(0.005)
+                stall = max(stall, time.perf_counter() - started - 0.005)
+
+        async def login():
+            async with gate:
+                started = time.perf_counter()
+                assert await passwords.verify_password_async("correct horse battery staple", encoded)
+                return time.perf_counter() - started
+
+        tick = asyncio.create_task(ticker())
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(login() for _ in range(logins)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await tick
+        return list(latencies), elapsed, stall
@@ -0,0 +1,91 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from django.utils import timezone
+
+from releases.chat_recent import recent_chat
+from releases.models import ChatMessage
+from releases.views import wall
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Time the wall page with chat history read from the database vs. the in-memory recent buffer."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument(
+            "--seed", type=int, default=0,
+            help="Insert this many extra chat messages for the run (rolled back afterwards).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                if options["seed"]:
+                    self.seed(options["seed"])
+                self.run(options["iterations"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, count):
+        now = timezone.now()
+        ChatMessage.objects.bulk_create(
+            [
+                ChatMessage(username=f"bench{i % 50}", message=f"benchmark line {i}", timestamp=now - timedelta(seconds=i))
+                for i in range(count)
+            ],
+            batch_size=1000,
+        )
+
+    def run(self, iterations):
+        host = next((h.lstrip(".") for h in settings.ALLOWED_HOSTS if h != "*"), "localhost")
+        request = RequestFactory().get("/wall/", HTTP_HOST=host, secure=True)
+        self.stdout.write(
+            f"{ChatMessage.objects.count()} chat messages, {iterations} renders each, "
+            f"{settings.WALL_CHAT_INITIAL_MESSAGES} lines per page"
+        )
+
+        saved = recent_chat.connections
+        try:
+            recent_chat.connections = 0
+            cold = self.time_renders(request, iterations)
+            # Pretend a chat socket is attached, as in a worker serving the Wall.
+            recent_chat.connections = 1
+            recent_chat.entries = None
+            wall(request)
+            warm = self.time_renders(request, iterations)
+        finally:
+            recent_chat.connections = saved
+            recent_chat.entries = None
+            recent_chat.ids = set()
+
+        self.report("database", cold)
+        self.report("recent buffer", warm)
+        self.stdout.write(f"speedup (median): {statistics.median(cold) / statistics.median(warm):.2f}x")
+
+    def time_renders(self, request, iterations):
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            response = wall(request)
+            timings.append(time.perf_counter() - started)
+            assert response.status_code == 200
+        return timings
+
+    def report(self, label, timings):
+        timings = sorted(timings)
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        self.stdout.write(
+            f"{label:>14}: median {statistics.median(timings) * 1000:.2f} ms, "
+            f"p95 {p95 * 1000:.2f} ms, mean {statistics.mean(timings) * 1000:.2f} ms"
+        )
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from releases.models import OutboundEmail
+from releases.outbox import email_sender, send_due
+
+
+class Command(BaseCommand):
+    help = "Send queued wall email that is due, or keep sending as a dedicated outbox worker."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--watch", action="store_true", help="Keep running and send emails as they come due.")
+        parser.add_argument(
+            "--retry-failed", action="store_true",
+            help="Queue emails that ran out of attempts again before sending.",
+        )
+
+    def handle(self, *args, **options):
+        if options["retry_failed"]:
+            count = OutboundEmail.objects.filter(status=OutboundEmail.FAILED).update(
+                status=OutboundEmail.PENDING, attempts=0,
+            )
+            self.stdout.write(f"Requeued {count} failed emails.")
+        if options["watch"]:
+            self.stdout.write("Sending queued email as it comes due (Ctrl-C to stop).")
+            email_sender.run()
+            return
+        claimed = 0
+        while True:
+            batch = send_due()
+            if not batch:
+                break
+            claimed += batch
+        self.stdout.write(f"Attempted {claimed} emails; {email_sender.pending()} still pending.")
@@ -0,0 +1,72 @@
+import io
+import os
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from PIL import Image
+
+from releases.canvas import CANVAS_HEIGHT, CANVAS_WIDTH
+from releases.canvas_history import AnimatedGifWriter, AnimatedWebPWriter
+from releases.models import CanvasSnapshot
+
+
+def parse_moment(value):
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Invalid date: {value!r} (expected ISO format, e.g. 2025-06-01 or 2025-06-01T18:00)")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Command(BaseCommand):
+    help = "Stream the Wall canvas snapshots into an animated WebP or GIF time-lapse."
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Output file; the format follows the extension (.webp or .gif).")
+        parser.add_argument("--fps", type=float, default=12, help="Frames per second (default 12).")
+        parser.add_argument("--since", help="Only snapshots taken at or after this ISO date/time.")
+        parser.add_argument("--until", help="Only snapshots taken before this ISO date/time.")
+        parser.add_argument("--interval-only", action="store_true", help="Skip the before-clear snapshots.")
+
+    def handle(self, *args, **options):
+        fmt = os.path.splitext(options["output"])[1].lower().lstrip(".")
+        if fmt not in ("webp", "gif"):
+            raise CommandError("Output must end in .webp or .gif")
+        if options["fps"] <= 0:
+            raise CommandError("--fps must be positive")
+        duration = max(1, round(1000 / options["fps"]))
+        if fmt == "gif":
+            # GIF delays are in hundredths of a second.
+            duration = max(20, round(duration / 10) * 10)
+
+        snapshots = CanvasSnapshot.objects.order_by("created_at", "pk")
+        if options["since"]:
+            snapshots = snapshots.filter(created_at__gte=parse_moment(options["since"]))
+        if options["until"]:
+            snapshots = snapshots.filter(created_at__lt=parse_moment(options["until"]))
+        if options["interval_only"]:
+            snapshots = snapshots.filter(reason=CanvasSnapshot.INTERVAL)
+        if not snapshots.exists():
+            raise CommandError("No snapshots in that range")
+
+        frames = 0
+        with open(options["output"], "wb") as fp:
+            if fmt == "webp":
+                writer = AnimatedWebPWriter(fp, CANVAS_WIDTH, CANVAS_HEIGHT)
+            else:
+                writer = AnimatedGifWriter(fp)
+            # iterator() keeps Django from caching the whole queryset; at most
+            # one fetch of 50 snapshot blobs (a few MB) is held at a time.
+            for blob in snapshots.values_list("image", flat=True).iterator(chunk_size=50):
+                if fmt == "webp":
+                    writer.add(blob, duration)
+                else:
+                    with Image.open(io.BytesIO(blob)) as image:
+                        writer.add(image, duration)
+                frames += 1
+            writer.close()
+
+        self.stdout.write(self.style.SUCCESS(f"Wrote {frames} frames to {options['output']}"))
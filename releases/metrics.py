@@ -0,0 +1,64 @@
+import threading
+import time
+from collections import defaultdict
+
+
+# ─── Process Metrics ──────────────────────────────────────────────────────────
+#
+# Plain in-process counters, gauges and timings, read by the staff-only
+# /wall/metrics.json view. Each worker process keeps its own numbers; they
+# reset on restart.
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_gauges = {}
+_timings = {}
+_started = time.time()
+
+
+def increment(name, amount=1):
+    with _lock:
+        _counters[name] += amount
+
+
+def set_gauge(name, value):
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name, seconds):
+    """Records one duration; the snapshot reports count, mean, max and last (in ms)."""
+    with _lock:
+        timing = _timings.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0, "last": 0.0})
+        timing["count"] += 1
+        timing["total"] += seconds
+        timing["max"] = max(timing["max"], seconds)
+        timing["last"] = seconds
+
+
+def snapshot():
+    with _lock:
+        counters = dict(sorted(_counters.items()))
+        gauges = dict(sorted(_gauges.items()))
+        timings = {
+            name: {
+                "count": t["count"],
+                "mean_ms": round(t["total"] / t["count"] * 1000, 2),
+                "max_ms": round(t["max"] * 1000, 2),
+                "last_ms": round(t["last"] * 1000, 2),
+            }
+            for name, t in sorted(_timings.items())
+        }
+    return {
+        "uptime_seconds": round(time.time() - _started, 1),
+        "counters": counters,
+        "gauges": gauges,
+        "timings": timings,
+    }
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _timings.clear()
@@ -2,6 +2,30 @@ from django.db import migrations
 from django.utils.text import slugify
 
 
+def add_slug_column(apps, schema_editor):
+    db = schema_editor.connection
+    if db.vendor == 'postgresql':
+        schema_editor.execute("ALTER TABLE releases_releasepost ADD COLUMN IF NOT EXISTS slug VARCHAR(120) NOT NULL DEFAULT ''")
+        return
+    with db.cursor() as cursor:
+        columns = [c.name for c in db.introspection.get_table_description(cursor, 'releases_releasepost')]
+    if 'slug' not in columns:
+        schema_editor.execute("ALTER TABLE releases_releasepost ADD COLUMN slug VARCHAR(120) NOT NULL DEFAULT ''")
+
+
+def drop_slug_column(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("ALTER TABLE releases_releasepost DROP COLUMN IF EXISTS slug")
+    else:
+        schema_editor.execute("ALTER TABLE releases_releasepost DROP COLUMN slug")
+
+
+def drop_slug_default(apps, schema_editor):
+    # SQLite can't alter column defaults; the empty-string default is harmless there.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("ALTER TABLE releases_releasepost ALTER COLUMN slug DROP DEFAULT")
+
+
 def populate_slugs(apps, schema_editor):
     db = schema_editor.connection
     with db.cursor() as cursor:
@@ -29,15 +53,9 @@ class Migration(migrations.Migration):
     ]
 
     operations = [
-        migrations.RunSQL(
-            "ALTER TABLE releases_releasepost ADD COLUMN IF NOT EXISTS slug VARCHAR(120) NOT NULL DEFAULT ''",
-            "ALTER TABLE releases_releasepost DROP COLUMN IF EXISTS slug",
-        ),
+        migrations.RunPython(add_slug_column, drop_slug_column),
         migrations.RunPython(populate_slugs, migrations.RunPython.noop),
-        migrations.RunSQL(
-            "ALTER TABLE releases_releasepost ALTER COLUMN slug DROP DEFAULT",
-            migrations.RunSQL.noop,
-        ),
+        migrations.RunPython(drop_slug_default, migrations.RunPython.noop),
         migrations.RunSQL(
             "CREATE UNIQUE INDEX IF NOT EXISTS releases_releasepost_slug_key ON releases_releasepost (slug)",
             "DROP INDEX IF EXISTS releases_releasepost_slug_key",
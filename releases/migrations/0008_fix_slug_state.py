@@ -7,10 +7,16 @@ class Migration(migrations.Migration):
         ('releases', '0007_chatusername_email'),
     ]
 
+    # The column and its unique index were created by raw SQL in 0005; this
+    # only brings the migration state in line with the model.
     operations = [
-        migrations.AddField(
-            model_name='releasepost',
-            name='slug',
-            field=models.SlugField(blank=True, max_length=120, unique=True),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddField(
+                    model_name='releasepost',
+                    name='slug',
+                    field=models.SlugField(blank=True, max_length=120, unique=True),
+                ),
+            ],
         ),
     ]
\ No newline at end of file
@@ -0,0 +1,115 @@
+import json
+import re
+import zlib
+
+from django.db import migrations, models
+
+# Frozen copy of the tile codec in releases/canvas.py as of this migration, so
+# later changes to the live module can't change what it does.
+CANVAS_WIDTH = 640
+CANVAS_HEIGHT = 360
+TILE_SIZE = 64
+BYTES_PER_PIXEL = 4
+TILE_BYTES = TILE_SIZE * TILE_SIZE * BYTES_PER_PIXEL
+_HEX_COLOR = re.compile(r'^#[0-9a-fA-F]{6}$')
+
+
+def format_color(rgba):
+    return "#" + bytes(rgba[:3]).hex()
+
+
+def decode_tile(blob):
+    if not blob:
+        return bytearray(TILE_BYTES)
+    raw = zlib.decompress(bytes(blob))
+    if len(raw) != TILE_BYTES:
+        return bytearray(TILE_BYTES)
+    return bytearray(raw)
+
+
+def tile_pixels(tx, ty, buf):
+    """Yields (x, y, rgba) for every painted pixel in a decoded tile."""
+    for row in range(TILE_SIZE):
+        y = ty * TILE_SIZE + row
+        if y >= CANVAS_HEIGHT:
+            break
+        base = row * TILE_SIZE * BYTES_PER_PIXEL
+        for col in range(TILE_SIZE):
+            offset = base + col * BYTES_PER_PIXEL
+            if buf[offset + 3]:
+                x = tx * TILE_SIZE + col
+                if x < CANVAS_WIDTH:
+                    yield x, y, buf[offset:offset + BYTES_PER_PIXEL]
+
+
+def tiles_from_json_map(data):
+    """Converts the legacy {'x,y': '#rrggbb'} canvas blob into {(tx, ty): compressed bytes}."""
+    tiles = {}
+    for key, color in data.items():
+        try:
+            x, y = (int(v) for v in key.split(","))
+        except (AttributeError, ValueError):
+            continue
+        if not (0 <= x < CANVAS_WIDTH and 0 <= y < CANVAS_HEIGHT):
+            continue
+        # Erased pixels are just absent from the tile.
+        if not isinstance(color, str) or not _HEX_COLOR.match(color):
+            continue
+        offset = ((y % TILE_SIZE) * TILE_SIZE + (x % TILE_SIZE)) * BYTES_PER_PIXEL
+        buf = tiles.setdefault((x // TILE_SIZE, y // TILE_SIZE), bytearray(TILE_BYTES))
+        buf[offset:offset + BYTES_PER_PIXEL] = bytes.fromhex(color[1:]) + b"\xff"
+    return {key: zlib.compress(bytes(buf), 6) for key, buf in tiles.items()}
+
+
+def json_canvas_to_tiles(apps, schema_editor):
+    WallCanvas = apps.get_model('releases', 'WallCanvas')
+    CanvasTile = apps.get_model('releases', 'CanvasTile')
+    instance = WallCanvas.objects.filter(pk=1).first()
+    if instance is None:
+        return
+    try:
+        data = json.loads(instance.canvas_data)
+    except ValueError:
+        data = {}
+    CanvasTile.objects.bulk_create([
+        CanvasTile(tx=tx, ty=ty, data=blob)
+        for (tx, ty), blob in tiles_from_json_map(data).items()
+    ])
+
+
+def tiles_to_json_canvas(apps, schema_editor):
+    WallCanvas = apps.get_model('releases', 'WallCanvas')
+    CanvasTile = apps.get_model('releases', 'CanvasTile')
+    data = {}
+    for tile in CanvasTile.objects.all():
+        for x, y, rgba in tile_pixels(tile.tx, tile.ty, decode_tile(tile.data)):
+            data[f"{x},{y}"] = format_color(rgba)
+    WallCanvas.objects.update_or_create(pk=1, defaults={'canvas_data': json.dumps(data)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('releases', '0011_privatemessage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CanvasTile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tx', models.PositiveSmallIntegerField()),
+                ('ty', models.PositiveSmallIntegerField()),
+                ('data', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['ty', 'tx'],
+                'constraints': [models.UniqueConstraint(fields=('tx', 'ty'), name='unique_canvas_tile')],
+            },
+        ),
+        migrations.RunPython(json_canvas_to_tiles, tiles_to_json_canvas),
+        migrations.DeleteModel(
+            name='WallCanvas',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('releases', '0012_canvastile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='canvastile',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('releases', '0013_canvastile_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CanvasSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.BinaryField()),
+                ('reason', models.CharField(choices=[('interval', 'Interval'), ('clear', 'Before clear')], default='interval', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+import uuid
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def gen_uids(apps, schema_editor):
+    ChatMessage = apps.get_model('releases', 'ChatMessage')
+    for message in ChatMessage.objects.only('pk').iterator():
+        message.uid = uuid.uuid4()
+        message.save(update_fields=['uid'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('releases', '0014_canvassnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='uid',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, null=True),
+        ),
+        migrations.RunPython(gen_uids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='chatmessage',
+            name='uid',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='chatmessage',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('releases', '0015_chatmessage_uid'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['timestamp', 'uid'], name='chatmessage_history_idx'),
+        ),
+    ]
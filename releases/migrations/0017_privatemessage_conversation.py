@@ -0,0 +1,38 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:52
+
+from django.db import migrations, models
+
+
+def conversation_key(user1, user2):
+    # Frozen copy of PrivateMessage.conversation_key.
+    first, second = sorted([user1, user2])
+    return f"{len(first)}:{first}|{second}"
+
+
+def backfill_conversations(apps, schema_editor):
+    PrivateMessage = apps.get_model('releases', 'PrivateMessage')
+    pairs = PrivateMessage.objects.order_by().values_list('sender', 'recipient').distinct()
+    for sender, recipient in pairs.iterator():
+        PrivateMessage.objects.filter(sender=sender, recipient=recipient).update(
+            conversation=conversation_key(sender, recipient)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('releases', '0016_chatmessage_history_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='privatemessage',
+            name='conversation',
+            field=models.CharField(default='', editable=False, max_length=110),
+        ),
+        migrations.RunPython(backfill_conversations, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='privatemessage',
+            index=models.Index(fields=['conversation', '-timestamp'], name='pm_conversation_idx'),
+        ),
+    ]
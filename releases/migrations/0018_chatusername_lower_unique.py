@@ -0,0 +1,55 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:52
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import Lower
+
+
+def conversation_key(user1, user2):
+    # Frozen copy of PrivateMessage.conversation_key.
+    first, second = sorted([user1, user2])
+    return f"{len(first)}:{first}|{second}"
+
+
+def rename_case_duplicates(apps, schema_editor):
+    """
+    Keeps the oldest of each case-colliding group; the rest become
+    '<name>-<id>', and their private messages follow them. Inboxes are built
+    from those messages afterwards (0019).
+    """
+    ChatUsername = apps.get_model('releases', 'ChatUsername')
+    PrivateMessage = apps.get_model('releases', 'PrivateMessage')
+    lowered = ChatUsername.objects.annotate(lowered=Lower('username'))
+    groups = lowered.values('lowered').annotate(n=Count('id')).filter(n__gt=1)
+    renamed = {}
+    for group in groups:
+        for entry in lowered.filter(lowered=group['lowered']).order_by('pk')[1:]:
+            suffix = f"-{entry.pk}"
+            renamed[entry.username] = entry.username[:50 - len(suffix)] + suffix
+            entry.username = renamed[entry.username]
+            entry.save(update_fields=['username'])
+
+    for old, new in renamed.items():
+        PrivateMessage.objects.filter(sender=old).update(sender=new)
+        PrivateMessage.objects.filter(recipient=old).update(recipient=new)
+    touched = PrivateMessage.objects.filter(Q(sender__in=renamed.values()) | Q(recipient__in=renamed.values()))
+    pairs = touched.order_by().values_list('sender', 'recipient').distinct()
+    for sender, recipient in list(pairs):
+        PrivateMessage.objects.filter(sender=sender, recipient=recipient).update(
+            conversation=conversation_key(sender, recipient)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('releases', '0017_privatemessage_conversation'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_case_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='chatusername',
+            constraint=models.UniqueConstraint(Lower('username'), name='unique_chatusername_lower'),
+        ),
+    ]
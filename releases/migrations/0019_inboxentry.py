@@ -0,0 +1,49 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:55
+
+from django.db import migrations, models
+
+
+def backfill_inbox(apps, schema_editor):
+    # Read state wasn't tracked before, so existing conversations start with nothing unread.
+    PrivateMessage = apps.get_model('releases', 'PrivateMessage')
+    InboxEntry = apps.get_model('releases', 'InboxEntry')
+    entries = []
+    conversations = PrivateMessage.objects.order_by().values_list('conversation', flat=True).distinct()
+    for conversation in conversations.iterator():
+        last = PrivateMessage.objects.filter(conversation=conversation).order_by('-timestamp', '-pk').first()
+        for owner, other in {(last.sender, last.recipient), (last.recipient, last.sender)}:
+            entries.append(InboxEntry(
+                owner=owner,
+                other=other,
+                last_sender=last.sender,
+                last_message=last.message,
+                last_timestamp=last.timestamp,
+            ))
+    InboxEntry.objects.bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('releases', '0018_chatusername_lower_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InboxEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('owner', models.CharField(max_length=50)),
+                ('other', models.CharField(max_length=50)),
+                ('last_sender', models.CharField(max_length=50)),
+                ('last_message', models.TextField(max_length=500)),
+                ('last_timestamp', models.DateTimeField()),
+                ('unread', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', '-last_timestamp'], name='inbox_owner_recent_idx')],
+                'constraints': [models.UniqueConstraint(fields=('owner', 'other'), name='unique_inbox_entry')],
+            },
+        ),
+        migrations.RunPython(backfill_inbox, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('releases', '0019_inboxentry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chatusername',
+            name='password_hash',
+            field=models.CharField(help_text='Encoded password hash (releases/passwords.py)', max_length=255),
+        ),
+    ]
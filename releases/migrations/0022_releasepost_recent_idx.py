@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('releases', '0021_outboundemail'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='releasepost',
+            index=models.Index(fields=['release_datetime', 'id'], name='releasepost_recent_idx'),
+        ),
+    ]
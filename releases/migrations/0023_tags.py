@@ -0,0 +1,94 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def parse_tags(text):
+    # Frozen copy of releases.tags.parse_tags.
+    tags = {}
+    for part in (text or '').split(','):
+        name = ' '.join(part.split())[:100]
+        slug = slugify(name, allow_unicode=True)[:100]
+        if slug and slug not in tags:
+            tags[slug] = name
+    return tags
+
+
+def backfill_tags(apps, schema_editor):
+    Tag = apps.get_model('releases', 'Tag')
+    links = [
+        (apps.get_model('releases', 'ReleasePost'), apps.get_model('releases', 'ReleaseTag'), 'release', 'release_count'),
+        (apps.get_model('releases', 'Event'), apps.get_model('releases', 'EventTag'), 'event', 'event_count'),
+    ]
+    tags = {}
+    for Model, Through, field, count_field in links:
+        rows = []
+        for pk, text in Model.objects.exclude(tags__isnull=True).exclude(tags='').values_list('pk', 'tags').iterator():
+            for slug, name in parse_tags(text).items():
+                if slug not in tags:
+                    tags[slug] = Tag.objects.create(slug=slug, name=name)
+                tag = tags[slug]
+                setattr(tag, count_field, getattr(tag, count_field) + 1)
+                rows.append(Through(**{f'{field}_id': pk, 'tag_id': tag.pk}))
+        Through.objects.bulk_create(rows, batch_size=1000)
+    Tag.objects.bulk_update(tags.values(), ['release_count', 'event_count'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('releases', '0022_releasepost_recent_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('slug', models.SlugField(allow_unicode=True, max_length=100, unique=True)),
+                ('release_count', models.PositiveIntegerField(default=0)),
+                ('event_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ReleaseTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('release', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='releases.releasepost')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='releases.tag')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EventTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='releases.event')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='releases.tag')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='tag_set',
+            field=models.ManyToManyField(blank=True, related_name='events', through='releases.EventTag', to='releases.tag'),
+        ),
+        migrations.AddField(
+            model_name='releasepost',
+            name='tag_set',
+            field=models.ManyToManyField(blank=True, related_name='releases', through='releases.ReleaseTag', to='releases.tag'),
+        ),
+        migrations.AddConstraint(
+            model_name='releasetag',
+            constraint=models.UniqueConstraint(fields=('tag', 'release'), name='unique_release_tag'),
+        ),
+        migrations.AddConstraint(
+            model_name='eventtag',
+            constraint=models.UniqueConstraint(fields=('tag', 'event'), name='unique_event_tag'),
+        ),
+        migrations.RunPython(backfill_tags, migrations.RunPython.noop),
+    ]
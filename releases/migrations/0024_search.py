@@ -0,0 +1,107 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:09
+
+from django.db import migrations, models
+from django.urls import reverse
+
+
+# The full-text index lives beside releases_searchdocument and is kept in step
+# by the database: an external-content FTS5 table plus triggers on SQLite, a
+# generated tsvector column with a GIN index on Postgres. Other backends get
+# no index and search falls back to icontains (releases/search.py).
+
+SQLITE_INDEX = [
+    "CREATE VIRTUAL TABLE releases_search_fts USING fts5("
+    "title, body, content='releases_searchdocument', content_rowid='id', "
+    "tokenize='porter unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER releases_search_ai AFTER INSERT ON releases_searchdocument BEGIN "
+    "INSERT INTO releases_search_fts(rowid, title, body) VALUES (new.id, new.title, new.body); END",
+    "CREATE TRIGGER releases_search_ad AFTER DELETE ON releases_searchdocument BEGIN "
+    "INSERT INTO releases_search_fts(releases_search_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body); END",
+    "CREATE TRIGGER releases_search_au AFTER UPDATE ON releases_searchdocument BEGIN "
+    "INSERT INTO releases_search_fts(releases_search_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body); "
+    "INSERT INTO releases_search_fts(rowid, title, body) VALUES (new.id, new.title, new.body); END",
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS releases_search_au",
+    "DROP TRIGGER IF EXISTS releases_search_ad",
+    "DROP TRIGGER IF EXISTS releases_search_ai",
+    "DROP TABLE IF EXISTS releases_search_fts",
+]
+
+POSTGRES_INDEX = [
+    "ALTER TABLE releases_searchdocument ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', body), 'B')) STORED",
+    "CREATE INDEX releases_search_vector_idx ON releases_searchdocument USING gin (search_vector)",
+]
+
+POSTGRES_DROP = [
+    "DROP INDEX IF EXISTS releases_search_vector_idx",
+    "ALTER TABLE releases_searchdocument DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def create_index(apps, schema_editor):
+    statements = {'sqlite': SQLITE_INDEX, 'postgresql': POSTGRES_INDEX}
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    statements = {'sqlite': SQLITE_DROP, 'postgresql': POSTGRES_DROP}
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def join(*parts):
+    return '\n'.join(part for part in parts if part)
+
+
+def backfill_documents(apps, schema_editor):
+    # Frozen copy of the document builders in releases.search.
+    SearchDocument = apps.get_model('releases', 'SearchDocument')
+    documents = []
+    for post in apps.get_model('releases', 'ReleasePost').objects.iterator():
+        documents.append(SearchDocument(
+            kind='release', object_id=post.pk, title=post.title, body=join(post.body, post.tags),
+            url=reverse('release_detail', args=[post.slug]),
+        ))
+    for artist in apps.get_model('releases', 'Artist').objects.iterator():
+        documents.append(SearchDocument(
+            kind='artist', object_id=artist.pk, title=artist.name, body=join(artist.genre, artist.hometown, artist.bio),
+            url=f"{reverse('artists')}#artist-{artist.pk}",
+        ))
+    for event in apps.get_model('releases', 'Event').objects.iterator():
+        documents.append(SearchDocument(
+            kind='event', object_id=event.pk, title=event.title,
+            body=join(event.description, event.venue, event.location, event.tags),
+            url=f"{reverse('events')}#event-{event.pk}",
+        ))
+    SearchDocument.objects.bulk_create(documents, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('releases', '0023_tags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('release', 'Release'), ('artist', 'Artist'), ('event', 'Event')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('title', models.CharField(max_length=200)),
+                ('body', models.TextField(blank=True, default='')),
+                ('url', models.CharField(max_length=300)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='unique_search_document')],
+            },
+        ),
+        migrations.RunPython(create_index, drop_index),
+        migrations.RunPython(backfill_documents, migrations.RunPython.noop),
+    ]
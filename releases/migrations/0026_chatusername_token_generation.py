@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('releases', '0025_imagevariantset'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatusername',
+            name='token_generation',
+            field=models.PositiveIntegerField(default=0, help_text='Bumped to revoke every login token issued before (releases/tokens.py)'),
+        ),
+    ]
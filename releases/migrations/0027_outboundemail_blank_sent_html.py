@@ -0,0 +1,20 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:43
+
+from django.db import migrations
+
+
+def blank_sent_html(apps, schema_editor):
+    # Sent reset emails still held their reset links; the outbox now drops bodies once sent.
+    OutboundEmail = apps.get_model('releases', 'OutboundEmail')
+    OutboundEmail.objects.filter(status='sent').exclude(html='').update(html='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('releases', '0026_chatusername_token_generation'),
+    ]
+
+    operations = [
+        migrations.RunPython(blank_sent_html, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,7 @@
-from django.db import models
+import uuid
+from django.db import IntegrityError, models, transaction
+from django.db.models import Value
+from django.db.models.functions import Lower
 from django.utils import timezone
 from django.utils.text import slugify
 from fliphouserecords.storage_backends import MediaStorage
@@ -24,8 +27,16 @@ class ReleasePost(models.Model):
 
     youtube_url = models.URLField(max_length=500, blank=True, null=True, help_text="YouTube video URL (optional — used instead of or alongside audio file)")
     tags = models.CharField(max_length=200, blank=True, null=True, help_text="Comma-separated tags (e.g. boom bap, chill, 209)")
+    # Parsed from `tags` on every save (releases/tags.py).
+    tag_set = models.ManyToManyField('Tag', through='ReleaseTag', related_name='releases', blank=True)
     release_datetime = models.DateTimeField(default=timezone.now, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pages of the release list (releases/catalog.py).
+            models.Index(fields=['release_datetime', 'id'], name='releasepost_recent_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.slug:
             base = slugify(self.title)
@@ -81,6 +92,7 @@ class Event(models.Model):
         null=True
     )
     tags = models.CharField(max_length=300, blank=True, null=True)
+    tag_set = models.ManyToManyField('Tag', through='EventTag', related_name='events', blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -91,6 +103,110 @@ class Event(models.Model):
         return f"{self.title} - {self.event_date.strftime('%B %d, %Y')}"
 
 
+# ─── Tags ─────────────────────────────────────────────────────────────────────
+
+class Tag(models.Model):
+    """
+    One normalized tag shared by releases and events. The comma-separated
+    `tags` text on a ReleasePost or Event stays the editable source; saving
+    it rebuilds the links (see releases/tags.py), which also keep the
+    per-tag counts used for the tag clouds up to date.
+    """
+    name = models.CharField(max_length=100)
+    slug = models.SlugField(max_length=100, unique=True, allow_unicode=True)
+    release_count = models.PositiveIntegerField(default=0)
+    event_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class ReleaseTag(models.Model):
+    release = models.ForeignKey(ReleasePost, on_delete=models.CASCADE)
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            # Leads with the tag, so it also serves tag pages.
+            models.UniqueConstraint(fields=['tag', 'release'], name='unique_release_tag'),
+        ]
+
+
+class EventTag(models.Model):
+    event = models.ForeignKey(Event, on_delete=models.CASCADE)
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tag', 'event'], name='unique_event_tag'),
+        ]
+
+
+# ─── Search ───────────────────────────────────────────────────────────────────
+
+class SearchDocument(models.Model):
+    """
+    The searchable text of one release, artist or event, kept in step with
+    its source by releases/signals.py. The full-text index over these rows
+    is backend-specific and maintained by the database itself (see
+    releases/search.py and migration 0024).
+    """
+    RELEASE = 'release'
+    ARTIST = 'artist'
+    EVENT = 'event'
+    KIND_CHOICES = [
+        (RELEASE, 'Release'),
+        (ARTIST, 'Artist'),
+        (EVENT, 'Event'),
+    ]
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    title = models.CharField(max_length=200)
+    body = models.TextField(blank=True, default='')
+    url = models.CharField(max_length=300)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_search_document'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.title}"
+
+
+# ─── Image Derivatives ────────────────────────────────────────────────────────
+
+class ImageVariantSet(models.Model):
+    """
+    The resized copies made of one uploaded image (releases/images.py),
+    keyed by the original's storage name. `variants` maps a format to its
+    [width, storage name] pairs, narrowest first.
+    """
+    PENDING = 'pending'
+    READY = 'ready'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (READY, 'Ready'),
+        (FAILED, 'Failed'),
+    ]
+    original = models.CharField(max_length=300, unique=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    variants = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.original} ({self.get_status_display()})"
+
+
 # ─── Links Page ───────────────────────────────────────────────────────────────
 
 class AffiliateLink(models.Model):
@@ -128,7 +244,7 @@ class AffiliateLink(models.Model):
 class ChatUsername(models.Model):
     """Tracks reserved usernames and their password hashes."""
     username = models.CharField(max_length=50, unique=True)
-    password_hash = models.CharField(max_length=128, help_text="bcrypt hash of the password")
+    password_hash = models.CharField(max_length=255, help_text="Encoded password hash (releases/passwords.py)")
     email = models.EmailField(max_length=254, blank=True, null=True, help_text="Optional email for password reset and newsletter")
     
     # Profile Data
@@ -141,20 +257,41 @@ class ChatUsername(models.Model):
         null=True
     )
     last_login = models.DateTimeField(blank=True, null=True)
+    token_generation = models.PositiveIntegerField(default=0, help_text="Bumped to revoke every login token issued before (releases/tokens.py)")
     
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            # Names are reserved case-insensitively; this is also the index
+            # every login/profile lookup (ChatUsername.matching) seeks on.
+            models.UniqueConstraint(Lower('username'), name='unique_chatusername_lower'),
+        ]
+
+    @classmethod
+    def matching(cls, username):
+        """Case-insensitive lookup by name, served by the LOWER(username) index."""
+        # Lowered in SQL rather than Python so both sides fold case the same way.
+        return cls.objects.filter(username__lower=Lower(Value(username)))
+
     def __str__(self):
         return self.username
 
 
 class ChatMessage(models.Model):
+    # Assigned when the message is broadcast, before the journal writes it
+    # (releases/chat_journal.py), so the row and what clients saw share an ID.
+    uid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
     username = models.CharField(max_length=50)
     message = models.TextField(max_length=500)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # Keyset pages of history walk (timestamp, uid) backwards.
+            models.Index(fields=['timestamp', 'uid'], name='chatmessage_history_idx'),
+        ]
 
     def __str__(self):
         return f"[{self.timestamp.strftime('%H:%M')}] {self.username}: {self.message[:40]}"
@@ -162,15 +299,93 @@ class ChatMessage(models.Model):
 class PrivateMessage(models.Model):
     sender = models.CharField(max_length=50)
     recipient = models.CharField(max_length=50)
+    # The two usernames in canonical order (see conversation_key), so both
+    # directions of a thread are one indexed lookup instead of an OR.
+    conversation = models.CharField(max_length=110, editable=False, default='')
     message = models.TextField(max_length=500)
     timestamp = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            models.Index(fields=['conversation', '-timestamp'], name='pm_conversation_idx'),
+        ]
+
+    @staticmethod
+    def conversation_key(user1, user2):
+        first, second = sorted([user1, user2])
+        # Length-prefixed so no pair of usernames can produce another pair's key.
+        return f"{len(first)}:{first}|{second}"
+
+    @classmethod
+    def between(cls, user1, user2):
+        """Both directions of a thread, newest first."""
+        return cls.objects.filter(conversation=cls.conversation_key(user1, user2)).order_by('-timestamp')
+
+    def save(self, *args, **kwargs):
+        self.conversation = self.conversation_key(self.sender, self.recipient)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"[{self.timestamp.strftime('%H:%M')}] {self.sender} -> {self.recipient}: {self.message[:30]}"
 
+class InboxEntry(models.Model):
+    """
+    One row per (owner, other user) private conversation: its last message
+    and how many messages the owner hasn't read yet. Kept current as each
+    PrivateMessage is written (see record), so an inbox is a single query.
+    """
+    owner = models.CharField(max_length=50)
+    other = models.CharField(max_length=50)
+    last_sender = models.CharField(max_length=50)
+    last_message = models.TextField(max_length=500)
+    last_timestamp = models.DateTimeField()
+    unread = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'other'], name='unique_inbox_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', '-last_timestamp'], name='inbox_owner_recent_idx'),
+        ]
+
+    @classmethod
+    def record(cls, message):
+        """Updates both participants' entries for a newly saved PrivateMessage."""
+        cls._touch(message.recipient, message.sender, message, unread=message.sender != message.recipient)
+        if message.sender != message.recipient:
+            cls._touch(message.sender, message.recipient, message, unread=False)
+
+    @classmethod
+    def _touch(cls, owner, other, message, unread):
+        fields = {
+            'last_sender': message.sender,
+            'last_message': message.message,
+            'last_timestamp': message.timestamp,
+        }
+        increment = {'unread': models.F('unread') + 1} if unread else {}
+        for _ in range(2):
+            if cls.objects.filter(owner=owner, other=other).update(**fields, **increment):
+                return
+            try:
+                with transaction.atomic():
+                    cls.objects.create(owner=owner, other=other, unread=int(unread), **fields)
+                return
+            except IntegrityError:
+                # Created concurrently by the other participant's worker; update it instead.
+                continue
+
+    @classmethod
+    def inbox(cls, owner, limit=50):
+        """The owner's conversations, most recent first, and their total unread count."""
+        entries = list(cls.objects.filter(owner=owner).order_by('-last_timestamp')[:limit])
+        total = cls.objects.filter(owner=owner).aggregate(total=models.Sum('unread'))['total'] or 0
+        return entries, total
+
+    def __str__(self):
+        return f"{self.owner} <-> {self.other} ({self.unread} unread)"
+
 # ─── The Wall: Password Reset ─────────────────────────────────────────────
 
 class PasswordResetToken(models.Model):
@@ -193,20 +408,84 @@ class PasswordResetToken(models.Model):
         return f"Reset token for {self.username.username}"
 
 
+class OutboundEmail(models.Model):
+    """
+    A queued email, sent in the background by releases/outbox.py. A sender
+    claims a row by stamping `claim` and pushing `next_attempt_at` out by a
+    lease, so several workers can drain the queue without double-sending
+    and a crashed worker's rows are retried when the lease runs out.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+    to = models.EmailField()
+    subject = models.CharField(max_length=200)
+    html = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim = models.CharField(max_length=32, blank=True, default='')
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbound_email_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} → {self.to} ({self.get_status_display()})"
+
+
 # ─── The Wall: Canvas ─────────────────────────────────────────────────────────
 
-class WallCanvas(models.Model):
+class CanvasTile(models.Model):
     """
-    Stores the entire canvas as a JSON blob of pixel data.
-    Only one row ever exists (singleton pattern).
+    One TILE_SIZE×TILE_SIZE block of the shared Wall canvas, stored as
+    zlib-compressed RGBA bytes (see releases/canvas.py). Tiles with no
+    painted pixels have no row at all. `version` is bumped on every write
+    and used for compare-and-swap updates between workers.
     """
-    canvas_data = models.TextField(default='{}', help_text="JSON: { 'x,y': '#rrggbb', ... }")
+    tx = models.PositiveSmallIntegerField()
+    ty = models.PositiveSmallIntegerField()
+    data = models.BinaryField()
+    version = models.PositiveIntegerField(default=1)
     updated_at = models.DateTimeField(auto_now=True)
 
-    @classmethod
-    def get_instance(cls):
-        obj, _ = cls.objects.get_or_create(pk=1)
-        return obj
+    class Meta:
+        ordering = ['ty', 'tx']
+        constraints = [
+            models.UniqueConstraint(fields=['tx', 'ty'], name='unique_canvas_tile'),
+        ]
+
+    def __str__(self):
+        return f"Canvas tile ({self.tx}, {self.ty})"
+
+
+class CanvasSnapshot(models.Model):
+    """
+    A lossless WebP picture of the whole Wall canvas, taken periodically and
+    right before every clear (see releases/canvas_history.py).
+    """
+    INTERVAL = 'interval'
+    CLEAR = 'clear'
+    REASON_CHOICES = [
+        (INTERVAL, 'Interval'),
+        (CLEAR, 'Before clear'),
+    ]
+    image = models.BinaryField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES, default=INTERVAL)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['created_at']
 
     def __str__(self):
-        return f"Wall Canvas (last updated {self.updated_at})"
\ No newline at end of file
+        return f"Canvas snapshot {self.created_at:%Y-%m-%d %H:%M} ({self.get_reason_display()})"
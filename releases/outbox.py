@@ -0,0 +1,244 @@
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Min
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from releases import metrics
+
+
+# ─── Email Outbox ─────────────────────────────────────────────────────────────
+#
+# Outgoing email is written to the OutboundEmail table and sent by a
+# background thread. A slow or failing provider never holds up a request or
+# one of the database threads that socket consumers share. Due emails go out
+# WALL_EMAIL_BATCH per transport call. Failures are retried with exponential
+# backoff until WALL_EMAIL_MAX_ATTEMPTS, then marked failed. A sent email's
+# body is blanked, since password reset emails carry a live reset link.
+#
+# The sender thread starts with each server process (fliphouserecords/wsgi.py
+# and asgi.py), so emails left pending or with an expired lease by a previous
+# process go out without waiting for a new one to be queued. `manage.py
+# wall_send_email` sends them too.
+
+
+# ─── Transports ───────────────────────────────────────────────────────────────
+#
+# WALL_EMAIL_TRANSPORT names the class. send(messages) takes a list of
+# {"id", "from", "to", "subject", "html"} dicts. It raises SendError if only
+# some of them went out, and any other exception if none did.
+
+class SendError(Exception):
+    """Some messages of a call weren't sent; `failed` maps their ids to the reason. The rest were."""
+
+    def __init__(self, failed):
+        super().__init__(f"{len(failed)} messages not sent")
+        self.failed = failed
+
+
+class ResendTransport:
+    """
+    Sends through the Resend API with RESEND_API_KEY; several messages go as
+    one batch call. Batches are validated permissively, so one bad address
+    is reported on its own while the rest of the batch is delivered.
+    """
+
+    def send(self, messages):
+        import resend
+        resend.api_key = os.environ.get("RESEND_API_KEY", "")
+        payload = [
+            {"from": m["from"], "to": m["to"], "subject": m["subject"], "html": m["html"]}
+            for m in messages
+        ]
+        if len(payload) == 1:
+            resend.Emails.send(payload[0])
+            return
+        response = resend.Batch.send(payload, {"batch_validation": "permissive"})
+        failed = {messages[e["index"]]["id"]: e["message"] for e in response.get("errors") or []}
+        if failed:
+            raise SendError(failed)
+
+
+class MemoryTransport:
+    """Keeps sent messages in MemoryTransport.outbox, for tests and local development."""
+
+    outbox = []
+
+    def send(self, messages):
+        MemoryTransport.outbox.extend(messages)
+
+
+class FileTransport:
+    """Writes each message as a JSON file under WALL_EMAIL_FILE_PATH."""
+
+    def send(self, messages):
+        directory = Path(getattr(settings, "WALL_EMAIL_FILE_PATH", "sent_emails"))
+        directory.mkdir(parents=True, exist_ok=True)
+        stamp = timezone.now().strftime("%Y%m%d-%H%M%S")
+        for message in messages:
+            (directory / f"{stamp}-{message['id']}.json").write_text(json.dumps(message, indent=2))
+
+
+def get_transport():
+    return import_string(getattr(settings, "WALL_EMAIL_TRANSPORT", "releases.outbox.ResendTransport"))()
+
+
+# ─── Queue ────────────────────────────────────────────────────────────────────
+
+def enqueue(to, subject, html):
+    """Queues one email; the sender is woken once the surrounding transaction commits."""
+    from releases.models import OutboundEmail
+    email = OutboundEmail.objects.create(to=to, subject=subject, html=html)
+    metrics.increment("email.queued")
+    transaction.on_commit(email_sender.wake)
+    return email
+
+
+def retry_delay(attempts):
+    """Seconds before retry number `attempts`: WALL_EMAIL_RETRY_BASE doubling, capped at WALL_EMAIL_RETRY_MAX."""
+    base = getattr(settings, "WALL_EMAIL_RETRY_BASE", 30)
+    return min(base * 2 ** (attempts - 1), getattr(settings, "WALL_EMAIL_RETRY_MAX", 3600))
+
+
+def message_for(email):
+    return {
+        "id": email.pk,
+        "from": getattr(settings, "WALL_EMAIL_FROM", "Flip House Records <noreply@fliphouserecords.com>"),
+        "to": email.to,
+        "subject": email.subject,
+        "html": email.html,
+    }
+
+
+def send_due():
+    """Claims up to WALL_EMAIL_BATCH due emails and sends them. Returns how many were claimed."""
+    from releases.models import OutboundEmail
+    now = timezone.now()
+    due = OutboundEmail.objects.filter(status=OutboundEmail.PENDING, next_attempt_at__lte=now)
+    pks = list(due.order_by("next_attempt_at").values_list("pk", flat=True)[:getattr(settings, "WALL_EMAIL_BATCH", 50)])
+    if not pks:
+        return 0
+    # The lease keeps other senders off these rows; if this one dies they come due again.
+    claim = uuid.uuid4().hex
+    lease = timedelta(seconds=getattr(settings, "WALL_EMAIL_LEASE", 300))
+    due.filter(pk__in=pks).update(claim=claim, next_attempt_at=now + lease)
+    emails = list(OutboundEmail.objects.filter(claim=claim, status=OutboundEmail.PENDING))
+    if not emails:
+        return 0
+
+    transport = get_transport()
+    started = time.monotonic()
+    errors = dict.fromkeys((email.pk for email in emails), None)
+    try:
+        transport.send([message_for(email) for email in emails])
+    except SendError as e:
+        # The others went out; resending them would deliver them twice.
+        errors.update((pk, error) for pk, error in e.failed.items() if pk in errors)
+    except Exception as e:
+        for pk in errors:
+            errors[pk] = e
+    metrics.observe("email.send", time.monotonic() - started)
+
+    for email in emails:
+        record_attempt(email, claim, errors[email.pk])
+    return len(emails)
+
+
+def record_attempt(email, claim, error):
+    from releases.models import OutboundEmail
+    now = timezone.now()
+    mine = OutboundEmail.objects.filter(pk=email.pk, claim=claim)
+    attempts = email.attempts + 1
+    if error is None:
+        mine.update(status=OutboundEmail.SENT, attempts=attempts, sent_at=now, claim="", last_error="", html="")
+        metrics.increment("email.sent")
+        return
+    print(f"Error sending email {email.pk} to {email.to}: {error}")
+    if attempts >= getattr(settings, "WALL_EMAIL_MAX_ATTEMPTS", 6):
+        mine.update(status=OutboundEmail.FAILED, attempts=attempts, claim="", last_error=str(error)[:1000])
+        metrics.increment("email.failed")
+    else:
+        mine.update(
+            attempts=attempts,
+            claim="",
+            last_error=str(error)[:1000],
+            next_attempt_at=now + timedelta(seconds=retry_delay(attempts)),
+        )
+        metrics.increment("email.retried")
+
+
+def next_due_in():
+    """Seconds until the next pending email is due, or None if there are none."""
+    from releases.models import OutboundEmail
+    soonest = OutboundEmail.objects.filter(status=OutboundEmail.PENDING).aggregate(at=Min("next_attempt_at"))["at"]
+    if soonest is None:
+        return None
+    return max(0.0, (soonest - timezone.now()).total_seconds())
+
+
+# ─── Sender ───────────────────────────────────────────────────────────────────
+
+class OutboxSender:
+    """
+    Daemon thread that drains the outbox when woken, when a retry comes
+    due, and at least every WALL_EMAIL_POLL_INTERVAL seconds. It uses its
+    own database connection.
+    """
+
+    def __init__(self):
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def poll_interval(self):
+        return getattr(settings, "WALL_EMAIL_POLL_INTERVAL", 30)
+
+    def wake(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self.run, name="email-outbox", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def run(self):
+        while True:
+            self._wake.wait(self.wait_time())
+            self._wake.clear()
+            self.drain()
+
+    def drain(self):
+        close_old_connections()
+        try:
+            while send_due():
+                pass
+            metrics.set_gauge("email.pending", self.pending())
+        except Exception as e:
+            print(f"Error draining email outbox: {e}")
+        finally:
+            close_old_connections()
+
+    def pending(self):
+        from releases.models import OutboundEmail
+        return OutboundEmail.objects.filter(status=OutboundEmail.PENDING).count()
+
+    def wait_time(self):
+        close_old_connections()
+        try:
+            due = next_due_in()
+        except Exception:
+            due = None
+        finally:
+            close_old_connections()
+        return self.poll_interval if due is None else min(due, self.poll_interval)
+
+
+email_sender = OutboxSender()
@@ -0,0 +1,133 @@
+import asyncio
+import hashlib
+import hmac
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, ScryptPasswordHasher
+
+from releases import metrics
+
+
+# ─── Wall Passwords ───────────────────────────────────────────────────────────
+#
+# Wall usernames are protected by Django's scrypt or PBKDF2 hashers. Their
+# encoded form ("<algorithm>$<cost>$<salt>$...$<hash>") records how each hash
+# was made, so a hash made with another algorithm or cost still verifies and
+# is replaced on the owner's next successful login. The pre-hasher
+# "<salt>:<sha256 hex>" format is read the same way. WALL_PASSWORD_HASHER and
+# WALL_PASSWORD_COST choose what new hashes use.
+#
+# Hashing is deliberately slow, so socket code runs it on a small dedicated
+# pool (WALL_PASSWORD_WORKERS threads) rather than the event loop or the
+# database thread.
+
+class LegacySHA256Hasher:
+    """The original single salted SHA-256 round, kept only to verify old hashes."""
+
+    algorithm = "legacy_sha256"
+
+    def verify(self, password, encoded):
+        salt, _, hashed = encoded.partition(":")
+        digest = hashlib.sha256((salt + password).encode()).hexdigest()
+        return hmac.compare_digest(digest, hashed)
+
+    def must_update(self, encoded):
+        return True
+
+
+HASHERS = {
+    "scrypt": ScryptPasswordHasher,
+    "pbkdf2_sha256": PBKDF2PasswordHasher,
+}
+
+
+def get_hasher(algorithm=None):
+    """A hasher for `algorithm` (default WALL_PASSWORD_HASHER) at its WALL_PASSWORD_COST."""
+    algorithm = algorithm or getattr(settings, "WALL_PASSWORD_HASHER", "scrypt")
+    hasher = HASHERS[algorithm]()
+    for name, value in getattr(settings, "WALL_PASSWORD_COST", {}).get(algorithm, {}).items():
+        setattr(hasher, name, value)
+    if algorithm == "scrypt":
+        hasher.maxmem = scrypt_maxmem(hasher.work_factor, hasher.block_size, hasher.parallelism)
+    return hasher
+
+
+def scrypt_maxmem(work_factor, block_size, parallelism):
+    # OpenSSL refuses scrypt above 32 MiB unless maxmem is raised; allow twice what N, r, p need.
+    return 256 * work_factor * block_size * parallelism
+
+
+def identify(encoded):
+    """A hasher able to verify `encoded`, whatever cost it was made at, or None."""
+    if "$" not in encoded and ":" in encoded:
+        return LegacySHA256Hasher()
+    algorithm = encoded.split("$", 1)[0]
+    if algorithm not in HASHERS:
+        return None
+    hasher = get_hasher(algorithm)
+    if algorithm == "scrypt":
+        # Verifying recomputes the hash at its own N, r, p, not the configured ones.
+        try:
+            decoded = hasher.decode(encoded)
+        except (ValueError, TypeError):
+            return None
+        hasher.maxmem = max(hasher.maxmem, scrypt_maxmem(
+            decoded["work_factor"], decoded["block_size"], decoded["parallelism"],
+        ))
+    return hasher
+
+
+def hash_password(password):
+    hasher = get_hasher()
+    return hasher.encode(password, hasher.salt())
+
+
+def verify_password(password, encoded):
+    hasher = identify(encoded or "")
+    if hasher is None:
+        return False
+    try:
+        return hasher.verify(password, encoded)
+    except (ValueError, AssertionError):
+        return False
+
+
+def needs_rehash(encoded):
+    """True if `encoded` wasn't made with the current WALL_PASSWORD_HASHER and cost."""
+    hasher = identify(encoded or "")
+    if hasher is None or hasher.algorithm != getattr(settings, "WALL_PASSWORD_HASHER", "scrypt"):
+        return True
+    try:
+        return hasher.must_update(encoded)
+    except (ValueError, AssertionError):
+        return True
+
+
+_executor = None
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "WALL_PASSWORD_WORKERS", 4),
+            thread_name_prefix="wall-password",
+        )
+    return _executor
+
+
+async def _run(name, func, *args):
+    started = time.monotonic()
+    result = await asyncio.get_running_loop().run_in_executor(executor(), func, *args)
+    metrics.observe(f"password.{name}", time.monotonic() - started)
+    return result
+
+
+async def hash_password_async(password):
+    return await _run("hash", hash_password, password)
+
+
+async def verify_password_async(password, encoded):
+    return await _run("verify", verify_password, password, encoded)
@@ -0,0 +1,210 @@
+import asyncio
+import math
+import time
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+
+# ─── Presence Registry ────────────────────────────────────────────────────────
+#
+# Who is visible in the Wall chat, shared by every worker. A user is online
+# while at least one of their sockets has a live entry; each entry expires
+# WALL_PRESENCE_TTL seconds after its worker last heartbeated it, so sockets
+# of a crashed worker drop out on their own. Changes go out to the chat group
+# as {"joined": [...], "left": [...]} diffs.
+
+PREFIX = "wall:presence"
+
+# KEYS: users zset, this user's sockets zset. ARGV: user, channel, expires, now, key ttl.
+# Returns 1 if the user was not online before.
+_ADD_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[4])
+local prev = redis.call('ZSCORE', KEYS[1], ARGV[1])
+redis.call('ZADD', KEYS[2], ARGV[3], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+redis.call('ZADD', KEYS[1], ARGV[3], ARGV[1])
+if (not prev) or tonumber(prev) <= tonumber(ARGV[4]) then return 1 end
+return 0
+"""
+
+# KEYS: users zset, this user's sockets zset. ARGV: user, channel, now.
+# Returns 1 if that was the user's last live socket.
+_REMOVE_SCRIPT = """
+redis.call('ZREM', KEYS[2], ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[3])
+local newest = redis.call('ZRANGE', KEYS[2], -1, -1, 'WITHSCORES')
+if #newest == 0 then
+  redis.call('DEL', KEYS[2])
+  return redis.call('ZREM', KEYS[1], ARGV[1])
+end
+redis.call('ZADD', KEYS[1], newest[2], ARGV[1])
+return 0
+"""
+
+# KEYS: users zset. ARGV: now, sockets key prefix. Pops and returns expired users.
+_REAP_SCRIPT = """
+local gone = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+for _, user in ipairs(gone) do
+  redis.call('ZREM', KEYS[1], user)
+  redis.call('DEL', ARGV[2] .. user)
+end
+return gone
+"""
+
+
+class RedisPresenceStore:
+    """Sorted sets in the channel layer's Redis: users and, per user, sockets, scored by expiry."""
+
+    def __init__(self, url):
+        import redis.asyncio as redis
+        self.client = redis.from_url(url, decode_responses=True)
+        self.users_key = f"{PREFIX}:users"
+        self.sockets_prefix = f"{PREFIX}:sockets:"
+        self._add = self.client.register_script(_ADD_SCRIPT)
+        self._remove = self.client.register_script(_REMOVE_SCRIPT)
+        self._reap = self.client.register_script(_REAP_SCRIPT)
+
+    async def add(self, user, channel, expires, now):
+        keys = [self.users_key, self.sockets_prefix + user]
+        return bool(await self._add(keys=keys, args=[user, channel, expires, now, max(1, math.ceil(expires - now) * 2)]))
+
+    async def remove(self, user, channel, now):
+        keys = [self.users_key, self.sockets_prefix + user]
+        return bool(await self._remove(keys=keys, args=[user, channel, now]))
+
+    async def members(self, now):
+        return await self.client.zrangebyscore(self.users_key, f"({now}", "+inf")
+
+    async def reap(self, now):
+        return await self._reap(keys=[self.users_key], args=[now, self.sockets_prefix])
+
+
+class MemoryPresenceStore:
+    """Single-process stand-in for RedisPresenceStore, used with the in-memory channel layer."""
+
+    def __init__(self):
+        self.sockets = {}
+
+    async def add(self, user, channel, expires, now):
+        entries = self.sockets.setdefault(user, {})
+        joined = not any(exp > now for exp in entries.values())
+        entries[channel] = expires
+        return joined
+
+    async def remove(self, user, channel, now):
+        entries = self.sockets.get(user)
+        if entries is None:
+            return False
+        entries.pop(channel, None)
+        if any(exp > now for exp in entries.values()):
+            return False
+        del self.sockets[user]
+        return True
+
+    async def members(self, now):
+        return [user for user, entries in self.sockets.items() if any(exp > now for exp in entries.values())]
+
+    async def reap(self, now):
+        gone = [user for user, entries in self.sockets.items() if not any(exp > now for exp in entries.values())]
+        for user in gone:
+            del self.sockets[user]
+        return gone
+
+
+def make_store():
+    layer = settings.CHANNEL_LAYERS["default"]
+    if not layer["BACKEND"].startswith("channels_redis."):
+        return MemoryPresenceStore()
+    host = layer.get("CONFIG", {}).get("hosts", ["redis://localhost:6379"])[0]
+    if isinstance(host, (list, tuple)):
+        host = f"redis://{host[0]}:{host[1]}"
+    elif isinstance(host, dict):
+        host = host["address"]
+    return RedisPresenceStore(host)
+
+
+class PresenceRegistry:
+    """
+    This worker's visible chat sockets ({channel_name: username}) and the
+    shared store behind them. Methods return (joined, left) username lists
+    for the caller to broadcast; expiries noticed by the heartbeat are
+    broadcast from here.
+    """
+
+    def __init__(self, group):
+        self.group = group
+        self.local = {}
+        self._store = None
+        self._heartbeat = None
+
+    @property
+    def ttl(self):
+        return getattr(settings, "WALL_PRESENCE_TTL", 60)
+
+    @property
+    def heartbeat_interval(self):
+        return getattr(settings, "WALL_PRESENCE_HEARTBEAT", 20)
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = make_store()
+        return self._store
+
+    async def members(self):
+        return sorted(set(await self.store.members(time.time())), key=str.lower)
+
+    async def update(self, channel, username, visible):
+        """Binds a socket to `username`, shown or hidden."""
+        now = time.time()
+        joined, left = [], []
+        previous = self.local.get(channel)
+        if previous is not None and (previous != username or not visible):
+            del self.local[channel]
+            if await self.store.remove(previous, channel, now):
+                left.append(previous)
+        if visible:
+            self.local[channel] = username
+            if await self.store.add(username, channel, now + self.ttl, now):
+                joined.append(username)
+            self._start_heartbeat()
+        return joined, left
+
+    async def discard(self, channel):
+        username = self.local.pop(channel, None)
+        if username is None:
+            return [], []
+        left = [username] if await self.store.remove(username, channel, time.time()) else []
+        return [], left
+
+    def _start_heartbeat(self):
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.get_running_loop().create_task(self._beat())
+
+    async def _beat(self):
+        while self.local:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                now = time.time()
+                joined = []
+                for channel, username in list(self.local.items()):
+                    if await self.store.add(username, channel, now + self.ttl, now):
+                        joined.append(username)
+                left = await self.store.reap(now)
+                if joined or left:
+                    await self.broadcast(sorted(set(joined)), left)
+            except Exception as e:
+                print(f"Error refreshing chat presence: {e}")
+
+    async def broadcast(self, joined, left):
+        if not joined and not left:
+            return
+        await get_channel_layer().group_send(self.group, {
+            "type": "presence_diff",
+            "joined": joined,
+            "left": left,
+        })
+
+
+presence = PresenceRegistry("wall_chat")
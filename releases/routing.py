@@ -4,4 +4,5 @@ from releases import consumers
 websocket_urlpatterns = [
     re_path(r'^ws/canvas/$', consumers.CanvasConsumer.as_asgi()),
     re_path(r'^ws/chat/$', consumers.ChatConsumer.as_asgi()),
+    re_path(r'^ws/wall/$', consumers.WallConsumer.as_asgi()),
 ]
\ No newline at end of file
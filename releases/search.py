@@ -0,0 +1,207 @@
+import re
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.urls import reverse
+from django.utils.html import escape
+
+from releases import metrics
+
+
+# ─── Site Search ──────────────────────────────────────────────────────────────
+#
+# Releases, artists and events are each copied into one SearchDocument row
+# (title, body, url). releases/signals.py rewrites a row whenever its source
+# is saved and removes it on delete. `manage.py search_rebuild` rebuilds
+# them all, e.g. after bulk edits, which skip signals.
+#
+# The database maintains the full-text index over those rows (migration
+# 0024): an FTS5 table on SQLite, ranked with bm25(), and a weighted tsvector
+# column on Postgres, ranked with ts_rank_cd(). Titles weigh more than
+# bodies on both. Other backends fall back to unranked icontains matching.
+#
+# Every query term must match, and the last one also matches as a prefix, so
+# results narrow as someone types. Matches come back marked with
+# MARK_START/MARK_END; highlight() turns them into <mark> tags after escaping.
+
+MARK_START = "\x02"
+MARK_END = "\x03"
+MAX_TERMS = 8
+SNIPPET_WORDS = 32
+
+
+def page_size():
+    return getattr(settings, "SEARCH_PAGE_SIZE", 20)
+
+
+def max_page():
+    return getattr(settings, "SEARCH_MAX_PAGE", 50)
+
+
+# ─── Documents ────────────────────────────────────────────────────────────────
+
+def _join(*parts):
+    return "\n".join(part for part in parts if part)
+
+
+def release_document(post):
+    return {
+        "title": post.title,
+        "body": _join(post.body, post.tags),
+        "url": reverse("release_detail", args=[post.slug]),
+    }
+
+
+def artist_document(artist):
+    return {
+        "title": artist.name,
+        "body": _join(artist.genre, artist.hometown, artist.bio),
+        "url": f"{reverse('artists')}#artist-{artist.pk}",
+    }
+
+
+def event_document(event):
+    return {
+        "title": event.title,
+        "body": _join(event.description, event.venue, event.location, event.tags),
+        "url": f"{reverse('events')}#event-{event.pk}",
+    }
+
+
+# kind → (source model name, document builder)
+SOURCES = {
+    "release": ("ReleasePost", release_document),
+    "artist": ("Artist", artist_document),
+    "event": ("Event", event_document),
+}
+
+
+def _source_for(instance):
+    name = type(instance).__name__
+    return next((kind, build) for kind, (model, build) in SOURCES.items() if model == name)
+
+
+def index(instance):
+    """Writes the search document for a saved release, artist or event."""
+    from releases.models import SearchDocument
+    kind, build = _source_for(instance)
+    SearchDocument.objects.update_or_create(kind=kind, object_id=instance.pk, defaults=build(instance))
+
+
+def remove(instance):
+    from releases.models import SearchDocument
+    kind, _ = _source_for(instance)
+    SearchDocument.objects.filter(kind=kind, object_id=instance.pk).delete()
+
+
+def rebuild(batch_size=1000):
+    """Replaces every search document from its source. Returns how many were written."""
+    from django.apps import apps
+    from releases.models import SearchDocument
+    SearchDocument.objects.all().delete()
+    written = 0
+    for kind, (model, build) in SOURCES.items():
+        batch = []
+        for instance in apps.get_model("releases", model).objects.order_by("pk").iterator(chunk_size=batch_size):
+            batch.append(SearchDocument(kind=kind, object_id=instance.pk, **build(instance)))
+            if len(batch) >= batch_size:
+                SearchDocument.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        SearchDocument.objects.bulk_create(batch)
+        written += len(batch)
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            # Merges the index segments the bulk insert left behind.
+            cursor.execute("INSERT INTO releases_search_fts(releases_search_fts) VALUES ('optimize')")
+    return written
+
+
+# ─── Queries ──────────────────────────────────────────────────────────────────
+
+def parse_terms(query):
+    return re.findall(r"\w+", query or "")[:MAX_TERMS]
+
+
+def highlight(text):
+    return escape(text or "").replace(MARK_START, "<mark>").replace(MARK_END, "</mark>")
+
+
+def _sqlite_rows(terms, limit, offset):
+    # Quoting makes every term a plain string, whatever FTS5 syntax it resembles.
+    match = " ".join(f'"{term}"' for term in terms) + "*"
+    sql = f"""
+        SELECT d.kind, d.object_id, d.url,
+               highlight(releases_search_fts, 0, %s, %s),
+               snippet(releases_search_fts, 1, %s, %s, '…', {SNIPPET_WORDS})
+        FROM releases_search_fts
+        JOIN releases_searchdocument d ON d.id = releases_search_fts.rowid
+        WHERE releases_search_fts MATCH %s
+        ORDER BY bm25(releases_search_fts, 4.0, 1.0), d.id
+        LIMIT %s OFFSET %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [MARK_START, MARK_END, MARK_START, MARK_END, match, limit, offset])
+        return cursor.fetchall()
+
+
+def _postgres_rows(terms, limit, offset):
+    tsquery = " & ".join(terms) + ":*"
+    marks = f"StartSel={MARK_START}, StopSel={MARK_END}"
+    sql = """
+        SELECT d.kind, d.object_id, d.url,
+               ts_headline('english', d.title, q, %s),
+               ts_headline('english', d.body, q, %s)
+        FROM releases_searchdocument d, to_tsquery('english', %s) q
+        WHERE d.search_vector @@ q
+        ORDER BY ts_rank_cd(d.search_vector, q) DESC, d.id
+        LIMIT %s OFFSET %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [
+            f"{marks}, HighlightAll=true",
+            f"{marks}, MaxWords={SNIPPET_WORDS}, MinWords={SNIPPET_WORDS // 2}, MaxFragments=1",
+            tsquery, limit, offset,
+        ])
+        return cursor.fetchall()
+
+
+def _fallback_rows(terms, limit, offset):
+    from releases.models import SearchDocument
+    documents = SearchDocument.objects.order_by("title", "id")
+    for term in terms:
+        documents = documents.filter(Q(title__icontains=term) | Q(body__icontains=term))
+    return [
+        (kind, object_id, url, title, " ".join(body.split()[:SNIPPET_WORDS]))
+        for kind, object_id, url, title, body in
+        documents.values_list("kind", "object_id", "url", "title", "body")[offset:offset + limit]
+    ]
+
+
+BACKENDS = {
+    "sqlite": _sqlite_rows,
+    "postgresql": _postgres_rows,
+}
+
+
+def search(query, page=1):
+    """
+    One page of results for `query`, best first, and whether another page
+    follows. Each result is {"kind", "id", "url", "title", "snippet"}, with
+    the title and snippet as escaped HTML.
+    """
+    terms = parse_terms(query)
+    page = min(max(page, 1), max_page())
+    if not terms:
+        return [], False
+    limit = page_size()
+    started = time.monotonic()
+    rows = BACKENDS.get(connection.vendor, _fallback_rows)(terms, limit + 1, (page - 1) * limit)
+    metrics.observe("search.query", time.monotonic() - started)
+    results = [
+        {"kind": kind, "id": object_id, "url": url, "title": highlight(title), "snippet": highlight(snippet)}
+        for kind, object_id, url, title, snippet in rows[:limit]
+    ]
+    return results, len(rows) > limit and page < max_page()
@@ -0,0 +1,73 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from releases import catalog, images, search, tags
+from releases.models import AffiliateLink, Artist, Event, ReleasePost
+
+
+def _tags_may_have_changed(kwargs):
+    update_fields = kwargs.get("update_fields")
+    return not kwargs.get("raw") and (update_fields is None or "tags" in update_fields)
+
+
+# ─── Release Catalog ──────────────────────────────────────────────────────────
+
+@receiver(post_save, sender=ReleasePost)
+def release_saved(sender, instance, **kwargs):
+    """Relinks the post's tags, then retires every cached catalog page."""
+    if _tags_may_have_changed(kwargs):
+        tags.sync_tags(instance)
+    catalog.invalidate()
+
+
+@receiver(post_delete, sender=ReleasePost)
+def release_deleted(sender, instance, **kwargs):
+    tags.refresh_counts(getattr(instance, "_deleted_tag_ids", ()))
+    catalog.invalidate()
+
+
+# ─── Tags ─────────────────────────────────────────────────────────────────────
+
+@receiver(post_save, sender=Event)
+def event_saved(sender, instance, **kwargs):
+    if _tags_may_have_changed(kwargs):
+        tags.sync_tags(instance)
+
+
+@receiver(post_delete, sender=Event)
+def event_deleted(sender, instance, **kwargs):
+    tags.refresh_counts(getattr(instance, "_deleted_tag_ids", ()))
+
+
+@receiver(pre_delete, sender=ReleasePost)
+@receiver(pre_delete, sender=Event)
+def remember_tags(sender, instance, **kwargs):
+    # The links are gone by post_delete; note whose counts will need refreshing.
+    instance._deleted_tag_ids = set(instance.tag_set.values_list("pk", flat=True))
+
+
+# ─── Search ───────────────────────────────────────────────────────────────────
+
+@receiver(post_save, sender=ReleasePost)
+@receiver(post_save, sender=Artist)
+@receiver(post_save, sender=Event)
+def reindex(sender, instance, **kwargs):
+    search.index(instance)
+
+
+@receiver(post_delete, sender=ReleasePost)
+@receiver(post_delete, sender=Artist)
+@receiver(post_delete, sender=Event)
+def unindex(sender, instance, **kwargs):
+    search.remove(instance)
+
+
+# ─── Image Derivatives ────────────────────────────────────────────────────────
+
+@receiver(post_save, sender=ReleasePost)
+@receiver(post_save, sender=Event)
+@receiver(post_save, sender=Artist)
+@receiver(post_save, sender=AffiliateLink)
+def image_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        images.schedule(instance)
@@ -0,0 +1,77 @@
+from django.db.models import Count
+from django.utils.text import slugify
+
+
+# ─── Tags ─────────────────────────────────────────────────────────────────────
+#
+# Releases and events keep their tags as comma-separated text, which is what
+# editors type. Every save parses it into Tag rows linked through ReleaseTag
+# or EventTag, so tag pages are an indexed join rather than a substring scan,
+# and "chill" no longer matches "chillwave". Each Tag carries its release and
+# event counts, refreshed whenever its links change, so a tag cloud is one
+# query.
+
+
+def normalize(text):
+    """The slug a tag's text is stored and looked up under ("Boom  Bap" → "boom-bap")."""
+    return slugify(text, allow_unicode=True)
+
+
+def parse_tags(text):
+    """Unique {slug: display name} pairs from comma-separated text, in order of first use."""
+    tags = {}
+    for part in (text or "").split(","):
+        name = " ".join(part.split())[:100]
+        slug = normalize(name)[:100]
+        if slug and slug not in tags:
+            tags[slug] = name
+    return tags
+
+
+def sync_tags(obj):
+    """Links a ReleasePost or Event to the tags in its `tags` text and refreshes the affected counts."""
+    from releases.models import Tag
+    wanted = parse_tags(obj.tags)
+    existing = {tag.slug: tag for tag in Tag.objects.filter(slug__in=wanted)}
+    missing = [Tag(slug=slug, name=name) for slug, name in wanted.items() if slug not in existing]
+    if missing:
+        Tag.objects.bulk_create(missing, ignore_conflicts=True)
+        existing = {tag.slug: tag for tag in Tag.objects.filter(slug__in=wanted)}
+    before = set(obj.tag_set.values_list("pk", flat=True))
+    after = {tag.pk for tag in existing.values()}
+    if before != after:
+        obj.tag_set.set(after)
+        refresh_counts(before ^ after)
+
+
+def refresh_counts(tag_ids):
+    from releases.models import Tag
+    if not tag_ids:
+        return
+    tags = list(
+        Tag.objects.filter(pk__in=tag_ids).annotate(
+            releases_linked=Count("releases", distinct=True),
+            events_linked=Count("events", distinct=True),
+        )
+    )
+    for tag in tags:
+        tag.release_count = tag.releases_linked
+        tag.event_count = tag.events_linked
+    Tag.objects.bulk_update(tags, ["release_count", "event_count"])
+
+
+def tag_cloud(kind, limit=40):
+    """
+    The `limit` most used release or event tags, alphabetical, each with
+    `count` and a `weight` from 1 to 5 for sizing.
+    """
+    from releases.models import Tag
+    field = {"release": "release_count", "event": "event_count"}[kind]
+    tags = list(Tag.objects.filter(**{f"{field}__gt": 0}).order_by(f"-{field}", "name")[:limit])
+    if not tags:
+        return []
+    most = max(getattr(tag, field) for tag in tags)
+    for tag in tags:
+        tag.count = getattr(tag, field)
+        tag.weight = 1 + round(4 * (tag.count - 1) / max(most - 1, 1))
+    return sorted(tags, key=lambda tag: tag.name.lower())
@@ -0,0 +1,36 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from releases import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def picture(file, alt="", sizes="100vw", **attrs):
+    """
+    A <picture> for an uploaded image: a srcset <source> per derivative
+    format, best first, and an <img> on the JPEG copies. Before the
+    derivatives exist it's a plain <img> of the original. Other keyword
+    arguments (class, loading, ...) become <img> attributes.
+    """
+    extra = format_html_join("", ' {}="{}"', attrs.items())
+    variants = images.variants_for(file.name)
+    if not variants:
+        return format_html('<img src="{}" alt="{}"{}>', file.url, alt, extra)
+
+    def srcset(fmt):
+        return ", ".join(f"{file.storage.url(name)} {width}w" for width, name in variants[fmt])
+
+    sources = format_html_join(
+        "", '<source type="{}" srcset="{}" sizes="{}">',
+        ((images.FORMATS[fmt][1], srcset(fmt), sizes) for fmt in images.FORMATS if fmt in variants and fmt != "jpeg"),
+    )
+    if "jpeg" in variants:
+        img = format_html(
+            '<img src="{}" srcset="{}" sizes="{}" alt="{}"{}>',
+            file.storage.url(variants["jpeg"][-1][1]), srcset("jpeg"), sizes, alt, extra,
+        )
+    else:
+        img = format_html('<img src="{}" alt="{}"{}>', file.url, alt, extra)
+    return format_html("<picture>{}{}</picture>", sources, img)
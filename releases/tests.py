@@ -1,3 +1,940 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import io
+import json
+import math
+import tempfile
+import threading
+import unittest
+import uuid
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.core import signing
+from django.core.cache import cache as default_cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.template import Context, Template
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from releases import (
+    avatars, canvas, canvas_history, catalog, chat_journal, images, metrics, outbox, passwords, presence, search,
+    tags, throttle,
+)
+from releases.chat_journal import history_queryset
+from releases.chat_recent import RecentChat, recent_entry
+from releases.consumers import CanvasConsumer, WallConsumer, canvas_painter
+from releases.models import (
+    Artist, CanvasSnapshot, CanvasTile, ChatMessage, ChatUsername, Event, ImageVariantSet, OutboundEmail,
+    PasswordResetToken, PrivateMessage, ReleasePost, SearchDocument, Tag,
+)
+from releases.tokens import TokenCache, make_token, read_token, token_cache
+
+
+IN_MEMORY_CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+def color_for(worker, i):
+    return f"#{worker:02x}{i % 256:02x}ff"
+
+
+# ─── Canvas ───────────────────────────────────────────────────────────────────
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, WALL_CANVAS_FLUSH_INTERVAL=0.05)
+class CanvasConcurrencyTests(TransactionTestCase):
+    WORKERS = 8
+    BATCHES = 25
+
+    def setUp(self):
+        canvas.canvas_buffer.__init__()
+
+    def worker_pixels(self, worker, batch):
+        # Every worker paints its own columns, but all of them land in the
+        # same few tiles so the writes race on the same rows.
+        return [
+            {"x": worker * 3 + dx, "y": batch * 2 + dy, "color": color_for(worker, batch)}
+            for dx in range(3) for dy in range(2)
+        ]
+
+    def assert_all_painted(self, workers, batches):
+        painted = canvas.canvas_to_json_map(canvas.load_canvas_pixels())
+        for worker in range(workers):
+            for batch in range(batches):
+                for p in self.worker_pixels(worker, batch):
+                    self.assertEqual(painted.get(f"{p['x']},{p['y']}"), p["color"])
+
+    @override_settings(WALL_CANVAS_CAS_RETRIES=2)
+    def test_concurrent_tile_writers_lose_no_pixels(self):
+        # Two lost races are common with every worker on the same tiles, so
+        # both the optimistic and the locked path take part.
+        start = threading.Barrier(self.WORKERS)
+        errors = []
+
+        def paint(worker):
+            from django.db import connection
+            try:
+                start.wait()
+                for batch in range(self.BATCHES):
+                    canvas.write_pixels(canvas.pixel_ops(self.worker_pixels(worker, batch)))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=paint, args=(w,)) for w in range(self.WORKERS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        self.assert_all_painted(self.WORKERS, self.BATCHES)
+        self.assertGreater(max(CanvasTile.objects.values_list("version", flat=True)), 1)
+
+    def test_tile_that_keeps_losing_races_is_written_under_a_lock(self):
+        locked = metrics.snapshot()["counters"].get("canvas.cas.locked", 0)
+        with (
+            mock.patch.object(canvas, "_write_tile", return_value=False) as attempt,
+            mock.patch.object(canvas, "_cas_backoff") as backoff,
+        ):
+            canvas.write_pixels(canvas.pixel_ops(self.worker_pixels(0, 0)))
+        self.assertEqual((attempt.call_count, backoff.call_count), (6, 5))
+        self.assertEqual(metrics.snapshot()["counters"]["canvas.cas.locked"], locked + 1)
+        self.assert_all_painted(1, 1)
+
+    def test_simultaneous_consumers_lose_no_pixels(self):
+        async def session(worker):
+            communicator = WebsocketCommunicator(CanvasConsumer.as_asgi(), "/ws/canvas/")
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            await communicator.receive_from()
+            for batch in range(self.BATCHES):
+                await communicator.send_to(text_data=json.dumps({
+                    "type": "draw",
+                    "pixels": self.worker_pixels(worker, batch),
+                }))
+                await asyncio.sleep(0)
+            return communicator
+
+        async def run():
+            communicators = await asyncio.gather(*(session(w) for w in range(self.WORKERS * 2)))
+            # Let the draw queue drain before the last disconnect flushes.
+            await asyncio.sleep(0.3)
+            for communicator in communicators:
+                await communicator.disconnect()
+
+        async_to_sync(run)()
+
+        self.assertEqual(canvas.canvas_buffer.pending, {})
+        self.assert_all_painted(self.WORKERS * 2, self.BATCHES)
+
+
+class RecordingSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def deliver(self, frame):
+        self.frames.append(frame["rev"])
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, WALL_CANVAS_HISTORY_FRAMES=3)
+class CanvasResumeTests(SimpleTestCase):
+
+    def draw(self, broadcaster, n=1):
+        for i in range(n):
+            async_to_sync(broadcaster._deliver)({
+                "type": "canvas.draw", "records": b"", "pixels": json.dumps([[i, 0, "#ffffff"]]),
+            })
+
+    def test_resume_within_history(self):
+        broadcaster = canvas.CanvasBroadcaster()
+        socket = RecordingSocket()
+        broadcaster.sockets.add(socket)
+        self.draw(broadcaster, 3)
+        self.assertEqual(socket.frames, [1, 2, 3])
+        self.assertEqual([f["rev"] for f in broadcaster.frames_since(broadcaster.epoch, 1)], [2, 3])
+        self.assertEqual([f["rev"] for f in broadcaster.frames_since(broadcaster.epoch, 0)], [1, 2, 3])
+        self.assertEqual(broadcaster.frames_since(broadcaster.epoch, 3), [])
+        # A revision this process never reached means the client saw another epoch.
+        self.assertIsNone(broadcaster.frames_since(broadcaster.epoch, 4))
+
+    def test_resume_after_eviction_needs_a_snapshot(self):
+        broadcaster = canvas.CanvasBroadcaster()
+        self.draw(broadcaster, 5)
+        self.assertEqual([f["rev"] for f in broadcaster.history], [3, 4, 5])
+        self.assertEqual([f["rev"] for f in broadcaster.frames_since(broadcaster.epoch, 2)], [3, 4, 5])
+        self.assertIsNone(broadcaster.frames_since(broadcaster.epoch, 1))
+        self.assertIsNone(broadcaster.frames_since(broadcaster.epoch, 0))
+
+    def test_resume_across_an_epoch_change(self):
+        broadcaster = canvas.CanvasBroadcaster()
+        socket = RecordingSocket()
+
+        async def reconnect():
+            # The first socket after nobody was listening starts a new epoch.
+            broadcaster.add(socket)
+            await broadcaster.remove(socket)
+
+        async_to_sync(reconnect)()
+        old_epoch = broadcaster.epoch
+        self.draw(broadcaster, 2)
+        async_to_sync(reconnect)()
+        self.assertNotEqual(broadcaster.epoch, old_epoch)
+        self.assertEqual((broadcaster.revision, len(broadcaster.history)), (0, 0))
+        self.assertIsNone(broadcaster.frames_since(old_epoch, 2))
+        self.assertIsNone(broadcaster.frames_since(old_epoch, 0))
+        self.assertEqual(broadcaster.frames_since(broadcaster.epoch, 0), [])
+
+
+class CanvasHistoryTests(TransactionTestCase):
+
+    def test_wait_drains_queued_snapshots(self):
+        pixels = bytearray(canvas.CANVAS_WIDTH * canvas.CANVAS_HEIGHT * canvas.BYTES_PER_PIXEL)
+        for _ in range(3):
+            canvas_history.schedule_snapshot(pixels, CanvasSnapshot.CLEAR)
+        canvas_history.wait()
+        self.assertEqual(CanvasSnapshot.objects.filter(reason=CanvasSnapshot.CLEAR).count(), 3)
+        self.assertEqual(canvas_history._pending, set())
+
+
+# ─── Multiplexed Wall Socket ──────────────────────────────────────────────────
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class WallSocketTests(TransactionTestCase):
+
+    def setUp(self):
+        canvas.canvas_buffer.__init__()
+
+    def tearDown(self):
+        # The clear queues a before-clear snapshot; let it land before the database is flushed.
+        canvas_history.wait()
+
+    def test_streams_share_one_socket(self):
+        async def run():
+            communicator = WebsocketCommunicator(WallConsumer.as_asgi(), "/ws/wall/")
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+
+            await communicator.send_to(text_data="open:canvas?format=binary")
+            init = await communicator.receive_output()
+            self.assertEqual(init["bytes"][:2], bytes([1, canvas.FRAME_INIT]))
+            await communicator.send_to(text_data="open:chat?")
+            self.assertEqual(await communicator.receive_from(), 'chat:{"type": "presence_list", "users": []}')
+
+            await communicator.send_to(bytes_data=bytes([1, canvas.FRAME_DRAW, 0, 1, 0, 2, 255, 0, 0]))
+            draw = await communicator.receive_output()
+            self.assertEqual(draw["bytes"][:2], bytes([1, canvas.FRAME_DRAW]))
+
+            # An oversized chat frame closes that stream, not the socket.
+            await communicator.send_to(text_data="chat:" + "x" * 10000)
+            self.assertEqual(await communicator.receive_from(), "closed:chat:1009")
+            await communicator.send_to(text_data="canvas:" + json.dumps({"type": "clear"}))
+            clear = await communicator.receive_output()
+            self.assertEqual(clear["bytes"][:2], bytes([1, canvas.FRAME_CLEAR]))
+            await communicator.disconnect()
+
+        async_to_sync(run)()
+        self.assertEqual(canvas.canvas_buffer.connections, 0)
+        canvas_history.wait()
+        self.assertEqual(CanvasSnapshot.objects.filter(reason=CanvasSnapshot.CLEAR).count(), 1)
+
+
+# ─── Socket Throttling ────────────────────────────────────────────────────────
+
+@override_settings(WALL_SOCKET_LIMITS={
+    "chat": {"max_message_bytes": 100, "connection_rate": (2, 4), "user_rate": (3, 6)},
+    "canvas": {
+        "max_message_bytes": 100, "max_pixels": 10,
+        "connection_rate": (2, 4), "user_rate": (3, 6), "address_rate": (4, 8),
+    },
+})
+class SocketThrottleTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(throttle, "time", SimpleNamespace(monotonic=lambda: self.now))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        throttle._user_buckets.clear()
+        self.addCleanup(throttle._user_buckets.clear)
+
+    def rejected(self, kind, reason):
+        return metrics.snapshot()["counters"].get(f"{kind}.rejected.{reason}", 0)
+
+    def test_bucket_refills_at_its_rate_up_to_the_burst(self):
+        bucket = throttle.TokenBucket(2, 4)
+        bucket.tokens = 0
+        self.assertEqual(bucket.wait_for(3), 1.5)
+        bucket.refill(self.now + 1)
+        self.assertEqual((bucket.tokens, bucket.wait_for(3)), (2, 0.5))
+        self.assertFalse(bucket.full(self.now + 1.5))
+        self.assertTrue(bucket.full(self.now + 2))
+        bucket.refill(self.now + 100)
+        self.assertEqual(bucket.tokens, 4)
+        self.assertEqual(bucket.wait_for(5), math.inf)
+
+    def test_burst_runs_out_and_comes_back(self):
+        chat = throttle.SocketThrottle("chat")
+        rejected = self.rejected("chat", "rate")
+        self.assertEqual([chat.take() for _ in range(4)], [0, 0, 0, 0])
+        self.assertEqual(chat.take(), 0.5)
+        self.assertEqual(chat.take(cost=5), math.inf)
+        self.now += 0.5
+        self.assertEqual(chat.take(), 0)
+        self.assertEqual(self.rejected("chat", "rate"), rejected + 2)
+
+    def test_user_bucket_is_shared_across_connections(self):
+        first, second, other = (throttle.SocketThrottle("chat") for _ in range(3))
+        self.assertEqual([first.take(user="alice") for _ in range(4)], [0, 0, 0, 0])
+        # alice's second socket has a full connection bucket but her shared one is down to 2.
+        self.assertEqual([second.take(user="alice") for _ in range(2)], [0, 0])
+        self.assertEqual(second.take(user="alice"), 1 / 3)
+        self.assertEqual(second.bucket.tokens, 2)  # a refused take costs neither bucket
+        self.assertEqual(other.take(user="bob"), 0)
+        self.now += 1
+        self.assertEqual(second.take(user="alice"), 0)
+
+    def test_painters_behind_one_address_have_their_own_buckets_under_a_looser_shared_one(self):
+        first, second, third = (throttle.SocketThrottle("canvas") for _ in range(3))
+        # Two logged-out painters behind one proxy address each get a full user bucket...
+        self.assertEqual(first.take(4, user="session:a", address="10.0.0.1"), 0)
+        self.assertEqual(second.take(4, user="session:b", address="10.0.0.1"), 0)
+        # ...until the address bucket (burst 8) is spent.
+        self.assertEqual(third.take(1, user="session:c", address="10.0.0.1"), 0.25)
+        self.assertEqual(third.take(1, user="session:c", address="10.0.0.2"), 0)
+
+    def test_client_address_trusts_only_the_configured_proxies(self):
+        scope = {"client": ("10.0.0.1", 4000), "headers": [(b"x-forwarded-for", b"6.6.6.6, 203.0.113.7")]}
+        self.assertEqual(throttle.client_address(scope), "10.0.0.1")
+        with self.settings(WALL_TRUSTED_PROXY_COUNT=1):
+            self.assertEqual(throttle.client_address(scope), "203.0.113.7")
+            self.assertEqual(throttle.client_address({"client": ("10.0.0.1", 4000), "headers": []}), "10.0.0.1")
+        with self.settings(WALL_TRUSTED_PROXY_COUNT=2):
+            self.assertEqual(throttle.client_address(scope), "6.6.6.6")
+
+    def test_canvas_painter_is_the_user_or_session_never_the_address(self):
+        user = SimpleNamespace(is_authenticated=True, get_username=lambda: "alice")
+        session = SimpleNamespace(session_key="abc")
+        self.assertEqual(canvas_painter({"user": user, "session": session}), "user:alice")
+        self.assertEqual(canvas_painter({"user": AnonymousUser(), "session": session}), "session:abc")
+        self.assertIsNone(canvas_painter({"client": ("10.0.0.1", 4000)}))
+
+    def test_oversized_messages_are_counted_by_reason(self):
+        draw = throttle.SocketThrottle("canvas")
+        before = (self.rejected("canvas", "bytes"), self.rejected("canvas", "pixels"))
+        self.assertTrue(draw.fits(100))
+        self.assertFalse(draw.fits(101))
+        self.assertTrue(draw.fits_pixels(10))
+        self.assertFalse(draw.fits_pixels(11))
+        self.assertEqual((self.rejected("canvas", "bytes"), self.rejected("canvas", "pixels")), (before[0] + 1, before[1] + 1))
+
+
+# ─── Wall Passwords ───────────────────────────────────────────────────────────
+
+CHEAP_PASSWORD_COST = {
+    "scrypt": {"work_factor": 2 ** 4, "block_size": 8, "parallelism": 1},
+    "pbkdf2_sha256": {"iterations": 10},
+}
+
+
+@override_settings(WALL_PASSWORD_HASHER="scrypt", WALL_PASSWORD_COST=CHEAP_PASSWORD_COST)
+class PasswordHashTests(SimpleTestCase):
+
+    def test_legacy_hash_verifies_and_needs_rehash(self):
+        legacy = "0123456789abcdef:" + hashlib.sha256(b"0123456789abcdefhunter2").hexdigest()
+        self.assertTrue(passwords.verify_password("hunter2", legacy))
+        self.assertFalse(passwords.verify_password("hunter3", legacy))
+        self.assertTrue(passwords.needs_rehash(legacy))
+
+    def test_rehash_follows_hasher_and_cost(self):
+        encoded = passwords.hash_password("hunter2")
+        self.assertTrue(encoded.startswith("scrypt$16$"))
+        self.assertTrue(passwords.verify_password("hunter2", encoded))
+        self.assertFalse(passwords.needs_rehash(encoded))
+        with self.settings(WALL_PASSWORD_HASHER="pbkdf2_sha256"):
+            self.assertTrue(passwords.needs_rehash(encoded))
+            self.assertTrue(passwords.verify_password("hunter2", encoded))
+        cost = {**CHEAP_PASSWORD_COST, "scrypt": {**CHEAP_PASSWORD_COST["scrypt"], "work_factor": 2 ** 5}}
+        with self.settings(WALL_PASSWORD_COST=cost):
+            self.assertTrue(passwords.needs_rehash(encoded))
+        self.assertFalse(passwords.verify_password("hunter2", "garbage"))
+        self.assertFalse(passwords.verify_password("hunter2", "scrypt$truncated"))
+
+    def test_hashes_verify_across_cost_changes(self):
+        # 2^15 needs more than the 32 MiB a 2^14 hasher allows OpenSSL; 2^14 more than a 2^12 one.
+        for made_at, verified_at in ((2 ** 15, 2 ** 14), (2 ** 14, 2 ** 12)):
+            with self.settings(WALL_PASSWORD_COST={"scrypt": {"work_factor": made_at, "block_size": 8, "parallelism": 1}}):
+                encoded = passwords.hash_password("hunter2")
+            with self.settings(WALL_PASSWORD_COST={"scrypt": {"work_factor": verified_at, "block_size": 8, "parallelism": 1}}):
+                self.assertTrue(passwords.verify_password("hunter2", encoded))
+                self.assertFalse(passwords.verify_password("hunter3", encoded))
+                self.assertTrue(passwords.needs_rehash(encoded))
+
+
+@override_settings(WALL_TOKEN_CACHE_TTL=300, WALL_TOKEN_CACHE_SIZE=2)
+class TokenCacheTests(SimpleTestCase):
+
+    def test_cache_expires_evicts_and_invalidates(self):
+        cache = TokenCache()
+        username, generation, expires = read_token(make_token("alice", 3))
+        self.assertEqual((username, generation), ("alice", 3))
+        self.assertIsNone(read_token(make_token("alice", 3) + "x"))
+        self.assertIsNone(read_token(signing.dumps("alice")))
+
+        cache.put("a", 1, "alice", 3, expires)
+        cache.put("stale", 1, "alice", 3, 0)
+        self.assertEqual(cache.get("a"), (1, "alice", 3))
+        self.assertIsNone(cache.get("stale"))  # never outlives the token itself
+
+        cache.put("b", 2, "bob", 0, expires)
+        cache.put("a2", 1, "alice", 3, expires)
+        self.assertIsNone(cache.get("a"))  # least recently used
+        cache.invalidate(1)
+        self.assertIsNone(cache.get("a2"))
+        self.assertEqual(cache.get("b"), (2, "bob", 0))
+        self.assertEqual((cache.hits, cache.misses), (2, 3))
+
+
+class TokenRevocationTests(TestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+        self.addCleanup(default_cache.clear)
+
+    def test_password_reset_revokes_earlier_tokens(self):
+        entry = ChatUsername.objects.create(username="Alice", password_hash=passwords.hash_password("old1"))
+        token = make_token("Alice", entry.token_generation)
+
+        def update():
+            return self.client.post("/api/profile/update/", {"token": token, "bio": "hi"}, secure=True)
+
+        self.assertEqual(update().status_code, 200)
+        self.assertEqual(update().status_code, 200)  # served from token_cache
+        self.assertEqual(token_cache.hits, 1)
+        PasswordResetToken.objects.create(username=entry, token="reset")
+        # As on the web process: its invalidate() never reaches the socket workers' caches.
+        with mock.patch.object(token_cache, "invalidate"):
+            self.client.post("/wall/reset-password/reset/", {"password": "new1", "confirm": "new1"}, secure=True)
+        self.assertTrue(passwords.verify_password("new1", ChatUsername.objects.get(pk=entry.pk).password_hash))
+        self.assertIsNotNone(token_cache.get(token))
+        # The cached entry is checked against the shared generation and refused.
+        self.assertEqual(update().status_code, 401)
+        self.assertIsNone(token_cache.get(token))
+
+        fresh = make_token("Alice", ChatUsername.objects.get(pk=entry.pk).token_generation)
+        self.assertEqual(self.client.post("/api/profile/update/", {"token": fresh}, secure=True).status_code, 200)
+
+
+# ─── Wall Avatars ─────────────────────────────────────────────────────────────
+
+def image_bytes(fmt, size, mode="RGB"):
+    out = io.BytesIO()
+    Image.new(mode, size).save(out, fmt)
+    return out.getvalue()
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, WALL_AVATAR_MAX_PIXELS=16_000_000)
+class AvatarTests(TestCase):
+
+    def test_uploads_are_checked_before_decoding_and_processed_off_request(self):
+        entry = ChatUsername.objects.create(username="Alice", password_hash="x")
+
+        def upload(data):
+            return self.client.post("/api/profile/update/", {
+                "token": make_token("Alice", entry.token_generation),
+                "avatar": SimpleUploadedFile("a.png", data),
+            }, secure=True)
+
+        # 25 million 1-bit pixels compress to a few KB; the header alone rejects them.
+        bomb = image_bytes("PNG", (5000, 5000), mode="1")
+        self.assertLess(len(bomb), 50_000)
+        self.assertEqual(upload(bomb).json()["error"], "Image dimensions are too large.")
+        self.assertEqual(upload(b"<svg></svg>").json()["error"], "Invalid image file.")
+        # The same pixel count as a JPEG is decoded at 1/8 scale, so it's accepted.
+        self.assertEqual(avatars.open_avatar(image_bytes("JPEG", (5000, 5000))).size, (625, 625))
+
+        storage = FileSystemStorage(tempfile.mkdtemp(), base_url="/media/")
+        field = ChatUsername._meta.get_field("avatar")
+        self.addCleanup(setattr, field, "storage", field.storage)
+        field.storage = storage
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)("private_Alice", channel)
+
+        avatars.process(entry.pk, image_bytes("JPEG", (4000, 3000)))
+        entry.refresh_from_db()
+        with storage.open(entry.avatar.name) as f:
+            self.assertEqual(Image.open(f).size, (120, 90))
+        message = async_to_sync(layer.receive)(channel)
+        self.assertEqual((message["type"], message["avatar_url"], message["error"]), ("avatar_ready", entry.avatar.url, None))
+
+    def test_failed_submit_gives_its_queue_slot_back(self):
+        entry = ChatUsername.objects.create(username="Alice", password_hash="x")
+        pool = avatars.executor()
+        free = avatars._slots._value
+        with mock.patch.object(pool, "submit", side_effect=RuntimeError("cannot schedule new futures after shutdown")):
+            with self.assertRaises(RuntimeError):
+                avatars.submit(entry, SimpleUploadedFile("a.png", image_bytes("PNG", (10, 10))))
+        self.assertEqual(avatars._slots._value, free)
+
+
+# ─── Release Catalog ──────────────────────────────────────────────────────────
+
+@override_settings(RELEASES_PAGE_SIZE=4)
+class ReleaseCatalogTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        for i in range(13):
+            # Pairs share a release time, and a few posts have none.
+            when = None if i % 5 == 4 else now - timedelta(days=i // 2)
+            ReleasePost.objects.create(title=f"Release {i}", tags="boom bap" if i % 2 else "chill", release_datetime=when)
+
+    def walk(self, tag=None):
+        seen, after = [], None
+        while True:
+            page, cursor = catalog.catalog_page(tag, after)
+            seen += [post.pk for post in page]
+            if cursor is None:
+                return seen
+            after = catalog.decode_cursor(cursor)
+
+    def test_keyset_pages_cover_the_list_in_order(self):
+        expected = list(catalog.catalog_queryset().values_list("pk", flat=True))
+        self.assertEqual(len(expected), 13)
+        self.assertEqual(self.walk(), expected)
+        self.assertEqual(self.walk("boom bap"), list(catalog.catalog_queryset("boom bap").values_list("pk", flat=True)))
+
+    def test_cached_pages_are_retired_when_a_post_changes(self):
+        first = self.client.get("/releases/page.json", secure=True).json()
+        self.assertEqual(len(first["posts"]), 4)
+        second = self.client.get("/releases/page.json", {"after": first["next"]}, secure=True).json()
+        self.assertNotEqual(second["posts"][0]["url"], first["posts"][0]["url"])
+
+        newest = ReleasePost.objects.create(title="Brand New", release_datetime=timezone.now() + timedelta(days=1))
+        refreshed = self.client.get("/releases/page.json", secure=True).json()
+        self.assertEqual(refreshed["posts"][0]["title"], "Brand New")
+        newest.delete()
+        self.assertEqual(self.client.get("/releases/page.json", secure=True).json(), first)
+
+
+class TagTests(TestCase):
+
+    def test_tags_are_parsed_linked_and_counted(self):
+        self.assertEqual(tags.parse_tags(" Boom  Bap, chill,,boom bap , 209"), {"boom-bap": "Boom Bap", "chill": "chill", "209": "209"})
+        chill = ReleasePost.objects.create(title="A", tags="chill, boom bap")
+        ReleasePost.objects.create(title="B", tags="chillwave")
+        Event.objects.create(title="Show", tags="Chill")
+
+        self.assertEqual([p.title for p in catalog.catalog_queryset("chill")], ["A"])
+        self.assertEqual(Tag.objects.get(slug="chill").release_count, 1)
+        self.assertEqual(Tag.objects.get(slug="chill").event_count, 1)
+
+        chill.tags = "boom bap"
+        chill.save()
+        self.assertEqual(Tag.objects.get(slug="chill").release_count, 0)
+        self.assertEqual([t.slug for t in tags.tag_cloud("release")], ["boom-bap", "chillwave"])
+
+        chill.delete()
+        self.assertEqual(Tag.objects.get(slug="boom-bap").release_count, 0)
+        self.assertEqual([t.slug for t in tags.tag_cloud("event")], ["chill"])
+
+
+
+# ─── Search ───────────────────────────────────────────────────────────────────
+
+@override_settings(SEARCH_PAGE_SIZE=2)
+class SearchTests(TestCase):
+
+    def test_ranked_highlighted_pages_follow_saves_and_deletes(self):
+        ReleasePost.objects.create(title="Night Drive", body="late <b>night</b> boom bap")
+        Artist.objects.create(name="Lena", bio="Plays night markets and drives a van.")
+        gig = Event.objects.create(title="Warehouse Party", description="All night long.")
+
+        results, has_next = search.search("night")
+        self.assertTrue(has_next)
+        # The title match ranks first; matches are marked, the stored markup is escaped.
+        self.assertEqual((results[0]["kind"], results[0]["title"]), ("release", "<mark>Night</mark> Drive"))
+        self.assertIn("&lt;b&gt;<mark>night</mark>&lt;/b&gt;", results[0]["snippet"])
+        page2 = self.client.get("/search.json", {"q": "night", "page": 2}, secure=True).json()
+        self.assertEqual(len(page2["results"]), 1)
+        self.assertIsNone(page2["next_page"])
+
+        # Every term must match; the last may be a prefix ("driv" finds "drives" and "drive").
+        self.assertEqual([r["kind"] for r in search.search("night driv")[0]], ["release", "artist"])
+        self.assertEqual(search.search('"quoted" OR NEAR(')[0], [])
+
+        gig.description = "Daytime only."
+        gig.save()
+        self.assertEqual(len(search.search("night")[0]) + len(search.search("night", 2)[0]), 2)
+        Artist.objects.get(name="Lena").delete()
+        self.assertEqual([r["kind"] for r in search.search("night")[0]], ["release"])
+
+        search.rebuild()
+        self.assertEqual(SearchDocument.objects.count(), 2)
+        self.assertContains(self.client.get("/search/", {"q": "warehouse"}, secure=True), "<mark>Warehouse</mark> Party")
+
+
+# ─── Image Derivatives ────────────────────────────────────────────────────────
+
+@override_settings(IMAGE_DERIVATIVE_WIDTHS=[320, 640, 1280], IMAGE_DERIVATIVE_FORMATS=["webp", "jpeg"])
+class ImageDerivativeTests(TestCase):
+
+    def test_derivatives_are_written_beside_the_original_and_served_by_srcset(self):
+        storage = FileSystemStorage(tempfile.mkdtemp(), base_url="/media/")
+        upload = io.BytesIO()
+        Image.new("RGBA", (900, 600), (255, 0, 0, 128)).save(upload, "PNG")
+        original = storage.save("album_art/cover.png", ContentFile(upload.getvalue()))
+
+        width, height, variants = images.generate(original, storage)
+        self.assertEqual((width, height), (900, 600))
+        # Never upscaled: 1280 is dropped and the original width stands in for it.
+        self.assertEqual(variants["webp"], [[w, f"album_art/cover.w{w}.webp"] for w in (320, 640, 900)])
+        with storage.open("album_art/cover.w320.jpg") as f:
+            self.assertEqual(Image.open(f).size, (320, 213))
+
+        file = type("File", (), {"name": original, "url": storage.url(original), "storage": storage})()
+        tag = Template('{% load images %}{% picture file alt=title class="art" %}')
+        self.assertEqual(tag.render(Context({"file": file, "title": "A & B"})), '<img src="/media/album_art/cover.png" alt="A &amp; B" class="art">')
+
+        ImageVariantSet.objects.create(original=original, status=ImageVariantSet.READY, variants=variants)
+        images.cache.delete(images.cache_key(original))
+        html = tag.render(Context({"file": file, "title": "A & B"}))
+        self.assertIn('<source type="image/webp" srcset="/media/album_art/cover.w320.webp 320w, '
+                      '/media/album_art/cover.w640.webp 640w, /media/album_art/cover.w900.webp 900w"', html)
+        self.assertIn('<img src="/media/album_art/cover.w900.jpg" srcset="/media/album_art/cover.w320.jpg 320w', html)
+
+# ─── Email Outbox ─────────────────────────────────────────────────────────────
+
+class RejectingTransport:
+    """Delivers every message of a call except those to bad.example, which it reports."""
+
+    calls = []
+
+    def send(self, messages):
+        RejectingTransport.calls.append([m["to"] for m in messages])
+        outbox.MemoryTransport.outbox.extend(m for m in messages if not m["to"].endswith("@bad.example"))
+        failed = {m["id"]: "rejected" for m in messages if m["to"].endswith("@bad.example")}
+        if failed:
+            raise outbox.SendError(failed)
+
+
+@override_settings(
+    WALL_EMAIL_TRANSPORT="releases.tests.RejectingTransport",
+    WALL_EMAIL_BATCH=10, WALL_EMAIL_MAX_ATTEMPTS=2, WALL_EMAIL_RETRY_BASE=60,
+)
+class OutboxTests(TestCase):
+
+    def setUp(self):
+        outbox.MemoryTransport.outbox = []
+        RejectingTransport.calls = []
+        patcher = mock.patch("builtins.print")
+        self.printed = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_batches_retries_and_gives_up(self):
+        for to in ["a@ok.example", "b@bad.example", "c@ok.example"]:
+            outbox.enqueue(to, "Reset your Wall password", "<p>hi</p>")
+
+        self.assertEqual(outbox.send_due(), 3)
+        # One batch call; only the message it reported as failed is retried.
+        self.assertEqual(len(RejectingTransport.calls), 1)
+        self.assertEqual(sorted(m["to"] for m in outbox.MemoryTransport.outbox), ["a@ok.example", "c@ok.example"])
+        bad = OutboundEmail.objects.get(to="b@bad.example")
+        self.assertEqual((bad.status, bad.attempts, bad.claim), (OutboundEmail.PENDING, 1, ""))
+        self.assertGreater(bad.next_attempt_at, timezone.now() + timedelta(seconds=50))
+        self.assertEqual(outbox.send_due(), 0)  # backing off
+
+        OutboundEmail.objects.filter(pk=bad.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(outbox.send_due(), 1)
+        bad.refresh_from_db()
+        self.assertEqual((bad.status, bad.attempts), (OutboundEmail.FAILED, 2))
+        self.assertEqual(bad.html, "<p>hi</p>")
+        # Sent bodies (and the reset links in them) aren't kept.
+        self.assertEqual(list(OutboundEmail.objects.filter(status=OutboundEmail.SENT).values_list("html", flat=True)), ["", ""])
+        self.assertEqual(len(outbox.MemoryTransport.outbox), 2)
+        self.assertEqual(self.printed.call_count, 2)  # each failed send is logged
+
+    def test_failed_batch_call_is_retried_later_not_resent_one_by_one(self):
+        for to in ["a@ok.example", "c@ok.example"]:
+            outbox.enqueue(to, "Reset your Wall password", "<p>hi</p>")
+        with mock.patch.object(RejectingTransport, "send", side_effect=RuntimeError("provider down")) as send:
+            self.assertEqual(outbox.send_due(), 2)
+        self.assertEqual(send.call_count, 1)
+        self.assertEqual(
+            list(OutboundEmail.objects.values_list("status", "attempts", "last_error")),
+            [(OutboundEmail.PENDING, 1, "provider down")] * 2,
+        )
+
+
+# ─── Chat Journal ─────────────────────────────────────────────────────────────
+
+@override_settings(WALL_CHAT_FLUSH_INTERVAL=0.05, WALL_CHAT_FLUSH_BATCH=3)
+class ChatJournalTests(TransactionTestCase):
+
+    def setUp(self):
+        self.batches = []
+        write = chat_journal.write_messages
+
+        def recording_write(entries):
+            self.batches.append([entry["message"] for entry in entries])
+            write(entries)
+
+        patcher = mock.patch.object(chat_journal, "write_messages", side_effect=recording_write)
+        self.write = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def counter(self, name):
+        return metrics.snapshot()["counters"].get(name, 0)
+
+    def test_full_batch_flushes_without_waiting_for_the_interval(self):
+        journal = chat_journal.ChatJournal()
+
+        async def run():
+            for i in range(4):
+                journal.append("alice", f"line {i}")
+            await asyncio.sleep(0.02)  # well inside the interval
+            self.assertEqual(self.batches, [["line 0", "line 1", "line 2"], ["line 3"]])
+            journal.append("alice", "line 4")
+            await asyncio.sleep(0.02)
+            self.assertEqual(len(self.batches), 2)
+            await asyncio.sleep(0.1)
+
+        async_to_sync(run)()
+        self.assertEqual(self.batches[-1], ["line 4"])
+        self.assertEqual(journal.pending, [])
+        self.assertEqual(ChatMessage.objects.count(), 5)
+
+    @override_settings(WALL_CHAT_JOURNAL_MAX=5)
+    def test_oldest_lines_are_dropped_past_max_pending(self):
+        journal = chat_journal.ChatJournal()
+        dropped = self.counter("chat.journal.dropped")
+
+        async def run():
+            # Nothing gets written while the database is down.
+            self.write.side_effect = RuntimeError("database is down")
+            with mock.patch("builtins.print"):
+                for i in range(8):
+                    journal.append("alice", f"line {i}")
+                    await journal.flush()
+            journal._flush_handle.cancel()
+
+        async_to_sync(run)()
+        self.assertEqual([entry["message"] for entry in journal.pending], [f"line {i}" for i in range(3, 8)])
+        self.assertEqual(self.counter("chat.journal.dropped"), dropped + 3)
+
+    def test_failed_flush_keeps_its_lines_and_retries(self):
+        journal = chat_journal.ChatJournal()
+        errors = self.counter("chat.journal.flush_errors")
+        write = self.write.side_effect
+
+        def fail_once(entries):
+            self.write.side_effect = write
+            raise RuntimeError("database is down")
+
+        self.write.side_effect = fail_once
+
+        async def run():
+            entry = journal.append("alice", "hello")
+            with mock.patch("builtins.print"):
+                await journal.flush()
+            self.assertEqual(journal.pending, [entry])
+            await asyncio.sleep(0.15)
+            return entry
+
+        entry = async_to_sync(run)()
+        self.assertEqual(self.counter("chat.journal.flush_errors"), errors + 1)
+        self.assertEqual(journal.pending, [])
+        self.assertEqual(list(ChatMessage.objects.values_list("uid", flat=True)), [entry["uid"]])
+
+    def test_newest_history_page_merges_unsaved_lines(self):
+        now = timezone.now()
+        saved = [
+            ChatMessage.objects.create(username="alice", message=f"saved {i}", timestamp=now - timedelta(minutes=10 - i))
+            for i in range(3)
+        ]
+        written = {"uid": saved[-1].uid, "username": "alice", "message": "saved 2", "timestamp": saved[-1].timestamp}
+        unsaved = [
+            {"uid": uuid.uuid4(), "username": "bob", "message": f"unsaved {i}", "timestamp": now - timedelta(minutes=5 - i)}
+            for i in range(2)
+        ]
+        # The first line was written but the journal hadn't dropped it yet.
+        self.addCleanup(chat_journal.chat_journal.pending.clear)
+        chat_journal.chat_journal.pending.extend([written, *unsaved])
+
+        page, cursor = chat_journal.history_page(limit=4)
+        self.assertEqual([entry["message"] for entry in page], ["saved 1", "saved 2", "unsaved 0", "unsaved 1"])
+        older, cursor = chat_journal.history_page(chat_journal.decode_cursor(cursor), limit=4)
+        self.assertEqual(([entry["message"] for entry in older], cursor), (["saved 0"], None))
+
+
+# ─── Recent Chat ──────────────────────────────────────────────────────────────
+
+@override_settings(WALL_CHAT_RECENT_SIZE=3)
+class RecentChatTests(TestCase):
+
+    def test_lines_relayed_before_the_load_are_kept_once(self):
+        recent = RecentChat()
+        recent.attach()
+        lines = [
+            recent_entry({"uid": uuid.uuid4(), "username": "alice", "message": f"line {i}", "timestamp": timezone.now()})
+            for i in range(3)
+        ]
+        for line in lines:
+            # Every local socket relays each broadcast line.
+            for _ in range(4):
+                recent.add(line)
+        self.assertEqual([entry["message"] for entry in recent.early], ["line 0", "line 1", "line 2"])
+        messages, _ = recent.latest(3)
+        self.assertEqual([m["message"] for m in messages], ["line 0", "line 1", "line 2"])
+
+
+# ─── Chat Presence ────────────────────────────────────────────────────────────
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, WALL_PRESENCE_TTL=60, WALL_PRESENCE_HEARTBEAT=3600)
+class PresenceTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(presence, "time", SimpleNamespace(time=lambda: self.now))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.registry = presence.PresenceRegistry("presence_test")
+
+    def run_async(self, coroutine_function):
+        async def run():
+            try:
+                return await coroutine_function()
+            finally:
+                if self.registry._heartbeat is not None:
+                    self.registry._heartbeat.cancel()
+        return async_to_sync(run)()
+
+    def test_join_and_leave_diffs_follow_a_users_last_socket(self):
+        registry = self.registry
+
+        async def run():
+            diffs = [
+                await registry.update("a", "alice", True),
+                await registry.update("b", "alice", True),   # a second tab
+                await registry.update("a", "alice", False),  # one tab hides
+                await registry.update("c", "Bob", True),
+                await registry.update("c", "carol", True),   # the socket signs in as someone else
+            ]
+            members = await registry.members()
+            diffs += [await registry.discard("b"), await registry.discard("b"), await registry.discard("c")]
+            return diffs, members
+
+        diffs, members = self.run_async(run)
+        self.assertEqual(diffs, [
+            (["alice"], []), ([], []), ([], []), (["Bob"], []), (["carol"], ["Bob"]),
+            ([], ["alice"]), ([], []), ([], ["carol"]),
+        ])
+        self.assertEqual(members, ["alice", "carol"])
+        self.assertEqual(registry.local, {})
+
+    def test_memory_store_is_used_without_redis(self):
+        self.assertIsInstance(self.registry.store, presence.MemoryPresenceStore)
+        redis_layer = {"default": {"BACKEND": "channels_redis.core.RedisChannelLayer", "CONFIG": {"hosts": [("cache", 6380)]}}}
+        with self.settings(CHANNEL_LAYERS=redis_layer):
+            store = presence.make_store()
+        self.assertIsInstance(store, presence.RedisPresenceStore)
+        self.assertEqual(store.client.connection_pool.connection_kwargs["host"], "cache")
+
+    def test_expired_sockets_are_reaped_and_broadcast(self):
+        registry = self.registry
+
+        async def run():
+            layer = get_channel_layer()
+            channel = await layer.new_channel()
+            await layer.group_add("presence_test", channel)
+            await registry.update("a", "alice", True)
+            # A socket whose worker died: nothing heartbeats it again.
+            await registry.store.add("dave", "crashed", self.now + 60, self.now)
+            self.assertEqual(await registry.members(), ["alice", "dave"])
+
+            self.now += 61
+            self.assertEqual(await registry.members(), [])
+            # Restart the heartbeat so its next beat comes right away.
+            registry._heartbeat.cancel()
+            await asyncio.gather(registry._heartbeat, return_exceptions=True)
+            with self.settings(WALL_PRESENCE_HEARTBEAT=0):
+                registry._start_heartbeat()
+                message = await asyncio.wait_for(layer.receive(channel), 1)
+            return message, await registry.members()
+
+        message, members = self.run_async(run)
+        # alice's own socket came back with the heartbeat; dave's never will.
+        self.assertEqual((message["joined"], message["left"]), (["alice"], ["dave"]))
+        self.assertEqual(members, ["alice"])
+        self.assertEqual(set(self.registry.store.sockets), {"alice"})
+
+
+# ─── Chat Query Plans ─────────────────────────────────────────────────────────
+
+class ChatQueryPlanTests(TestCase):
+    """Wall, PM and username lookups must be served by their indexes, not a scan and sort."""
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        ChatMessage.objects.bulk_create([
+            ChatMessage(username=f"user{i % 7}", message=f"line {i}", timestamp=now - timedelta(minutes=i))
+            for i in range(200)
+        ])
+        for i in range(200):
+            sender, recipient = [("alice", "bob"), ("bob", "alice"), ("carol", "dave")][i % 3]
+            PrivateMessage.objects.create(sender=sender, recipient=recipient, message=f"pm {i}")
+
+    def plan(self, queryset):
+        if connection.vendor == "postgresql":
+            # Tiny test tables are cheaper to scan; ask whether the index can serve the query at all.
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        return queryset.explain()
+
+    def assert_uses_index(self, queryset, index):
+        if connection.vendor not in ("sqlite", "postgresql"):
+            raise unittest.SkipTest(f"no plan expectations for {connection.vendor}")
+        plan = self.plan(queryset)
+        self.assertIn(index, plan)
+        if connection.vendor == "sqlite":
+            self.assertNotIn("TEMP B-TREE", plan)
+        else:
+            self.assertNotIn("Sort", plan)
+
+    def test_wall_history_uses_index(self):
+        self.assert_uses_index(history_queryset()[:31], "chatmessage_history_idx")
+
+    def test_wall_history_page_uses_index(self):
+        oldest_seen = ChatMessage.objects.order_by("-timestamp")[50]
+        before = (oldest_seen.timestamp, oldest_seen.uid)
+        self.assert_uses_index(history_queryset(before)[:31], "chatmessage_history_idx")
+
+    def test_private_history_uses_conversation_index(self):
+        self.assert_uses_index(PrivateMessage.between("bob", "alice")[:50], "pm_conversation_idx")
+
+    def test_username_lookup_uses_lower_index(self):
+        ChatUsername.objects.create(username="Alice", password_hash="x")
+        self.assertEqual(ChatUsername.matching("aLICE").get().username, "Alice")
+        self.assert_uses_index(ChatUsername.matching("aLICE"), "unique_chatusername_lower")
+
+    def test_conversation_covers_both_directions(self):
+        thread = PrivateMessage.between("bob", "alice")
+        self.assertEqual(thread.count(), 134)
+        self.assertEqual(thread.filter(sender="alice").count(), 67)
+        self.assertNotEqual(
+            PrivateMessage.conversation_key("a|b", "c"),
+            PrivateMessage.conversation_key("a", "b|c"),
+        )
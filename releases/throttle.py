@@ -0,0 +1,144 @@
+import math
+import threading
+import time
+
+from django.conf import settings
+
+from releases import metrics
+
+
+# ─── Socket Throttling ────────────────────────────────────────────────────────
+#
+# Every socket message is checked here before it is parsed into DB writes or
+# channel-layer sends. A message must fit under the byte cap (and, for draws,
+# the pixel cap) and take tokens from the connection's bucket, one shared by
+# everything the same user has open in this process and, for kinds with an
+# "address_rate", a looser one shared by every socket from the same client
+# address (see client_address for proxies). Rejections
+# are counted in releases.metrics as "<kind>.rejected.<reason>". Limits live
+# in settings.WALL_SOCKET_LIMITS.
+
+# Idle per-user buckets are dropped once this many are tracked.
+MAX_USER_BUCKETS = 10000
+
+
+def limits_for(kind):
+    return settings.WALL_SOCKET_LIMITS[kind]
+
+
+class TokenBucket:
+    """Holds up to `burst` tokens, refilled at `rate` tokens per second."""
+
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait_for(self, cost):
+        """Seconds until `cost` tokens are available (0 if they are now)."""
+        if cost > self.burst:
+            return math.inf
+        return max(0.0, (cost - self.tokens) / self.rate)
+
+    def full(self, now):
+        return self.tokens + (now - self.stamp) * self.rate >= self.burst
+
+
+_user_buckets = {}
+_user_lock = threading.Lock()
+
+
+def _user_bucket(kind, user, rate):
+    key = (kind, user)
+    with _user_lock:
+        bucket = _user_buckets.get(key)
+        if bucket is None:
+            if len(_user_buckets) >= MAX_USER_BUCKETS:
+                now = time.monotonic()
+                for stale in [k for k, b in _user_buckets.items() if b.full(now)]:
+                    del _user_buckets[stale]
+            bucket = _user_buckets[key] = TokenBucket(*rate)
+        return bucket
+
+
+class SocketThrottle:
+    """Per-connection limits for one consumer; `kind` selects a WALL_SOCKET_LIMITS entry."""
+
+    NOTICE_INTERVAL = 1.0
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.limits = limits_for(kind)
+        self.bucket = TokenBucket(*self.limits["connection_rate"])
+        self.last_notice = 0.0
+
+    def reject(self, reason):
+        metrics.increment(f"{self.kind}.rejected.{reason}")
+
+    def fits(self, size):
+        """False (and counted) if a raw message of `size` bytes is over the cap."""
+        if size > self.limits["max_message_bytes"]:
+            self.reject("bytes")
+            return False
+        return True
+
+    def fits_pixels(self, count):
+        if count > self.limits["max_pixels"]:
+            self.reject("pixels")
+            return False
+        return True
+
+    def take(self, cost=1, user=None, address=None):
+        """
+        Takes `cost` tokens from the connection bucket and, if `user` or
+        `address` is given, from that user's or address's bucket. Takes nothing
+        unless all of them can pay. Returns 0 on success, otherwise the seconds
+        to wait before retrying.
+        """
+        now = time.monotonic()
+        buckets = [self.bucket]
+        if user:
+            buckets.append(_user_bucket(self.kind, user, self.limits["user_rate"]))
+        if address and "address_rate" in self.limits:
+            buckets.append(_user_bucket(f"{self.kind}.address", address, self.limits["address_rate"]))
+        with _user_lock:
+            for bucket in buckets:
+                bucket.refill(now)
+            wait = max(bucket.wait_for(cost) for bucket in buckets)
+            if not wait:
+                for bucket in buckets:
+                    bucket.tokens -= cost
+        if wait:
+            self.reject("rate")
+        return wait
+
+    def should_notify(self):
+        """Rate-limits the "slow down" replies themselves."""
+        now = time.monotonic()
+        if now - self.last_notice < self.NOTICE_INTERVAL:
+            return False
+        self.last_notice = now
+        return True
+
+
+def client_address(scope):
+    """
+    The socket's client IP. Behind WALL_TRUSTED_PROXY_COUNT proxies it is the
+    entry that many from the end of X-Forwarded-For: the address the outermost
+    trusted proxy saw, which the client cannot forge.
+    """
+    proxies = getattr(settings, "WALL_TRUSTED_PROXY_COUNT", 0)
+    if proxies:
+        forwarded = dict(scope.get("headers", [])).get(b"x-forwarded-for", b"")
+        hops = [hop.strip() for hop in forwarded.decode("latin-1").split(",") if hop.strip()]
+        if len(hops) >= proxies:
+            return hops[-proxies]
+    client = scope.get("client")
+    return client[0] if client else None
@@ -0,0 +1,154 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+from releases import metrics
+
+
+# ─── Login Token Cache ────────────────────────────────────────────────────────
+#
+# Wall login tokens are signing.dumps([username, token_generation]), valid
+# for TOKEN_MAX_AGE. A password reset bumps the account's token_generation in
+# the database, so every token issued before it stops verifying.
+#
+# Checking one costs an HMAC and a ChatUsername lookup, and reconnecting
+# clients present the same token over and over. This cache remembers each
+# verified token's account and generation for up to WALL_TOKEN_CACHE_TTL
+# seconds, and never past the token's own expiry. The least recently used
+# entries are evicted beyond WALL_TOKEN_CACHE_SIZE.
+#
+# Every hit is checked against the account's current generation, which is
+# kept in the default cache (Redis, shared by all workers) and read from the
+# database when it isn't there. A reset (revoke) writes the new generation
+# to that cache, so the web process doing the reset revokes the tokens held
+# by every socket worker at once.
+
+TOKEN_MAX_AGE = 60 * 60 * 24 * 30
+
+
+def make_token(username, generation):
+    """A login token for `username`, good while its token_generation is still `generation`."""
+    return signing.dumps([username, generation])
+
+
+def read_token(token):
+    """(username, generation, expires_at) for a validly signed, unexpired token, else None."""
+    try:
+        username, generation = signing.loads(token, max_age=TOKEN_MAX_AGE)
+        signed_at = signing.b62_decode(token.rsplit(":", 2)[1])
+    except (signing.BadSignature, ValueError, TypeError, AttributeError, IndexError):
+        return None
+    if not isinstance(username, str) or not isinstance(generation, int):
+        return None
+    return username, generation, signed_at + TOKEN_MAX_AGE
+
+
+def generation_key(pk):
+    return f"tokens:generation:{pk}"
+
+
+def current_generation(pk):
+    """The account's token_generation, through the shared cache; None if the account is gone."""
+    from releases.models import ChatUsername
+    generation = cache.get(generation_key(pk))
+    if generation is None:
+        generation = ChatUsername.objects.filter(pk=pk).values_list("token_generation", flat=True).first()
+        if generation is not None:
+            # add(), not set(): a revoke() that wrote a newer generation meanwhile wins.
+            cache.add(generation_key(pk), generation, None)
+    return generation
+
+
+def revoke(pk):
+    """Publishes the account's new token_generation after a reset bumped it, so every worker stops honouring older tokens."""
+    from releases.models import ChatUsername
+    generation = ChatUsername.objects.filter(pk=pk).values_list("token_generation", flat=True).first()
+    cache.set(generation_key(pk), generation, None)
+    token_cache.invalidate(pk)
+
+
+def cached_account(token):
+    """(pk, username) for a cached token whose account hasn't been revoked since, else None."""
+    entry = token_cache.get(token)
+    if entry is None:
+        return None
+    pk, username, generation = entry
+    if current_generation(pk) != generation:
+        token_cache.discard(token)
+        metrics.increment("tokens.cache.revoked")
+        return None
+    return pk, username
+
+
+class TokenCache:
+    """token → (account pk, username, token generation, expires_at), least recently used first."""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self):
+        return getattr(settings, "WALL_TOKEN_CACHE_TTL", 300)
+
+    @property
+    def size(self):
+        return getattr(settings, "WALL_TOKEN_CACHE_SIZE", 10000)
+
+    def get(self, token):
+        """(pk, username, generation) for a cached token, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self.entries.get(token)
+            if entry is not None and entry[3] <= now:
+                del self.entries[token]
+                entry = None
+            if entry is None:
+                self.misses += 1
+            else:
+                self.entries.move_to_end(token)
+                self.hits += 1
+            self._record()
+        metrics.increment("tokens.cache.miss" if entry is None else "tokens.cache.hit")
+        return None if entry is None else entry[:3]
+
+    def put(self, token, pk, username, generation, token_expires):
+        with self._lock:
+            self.entries[token] = (pk, username, generation, min(time.time() + self.ttl, token_expires))
+            self.entries.move_to_end(token)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+            self._record()
+
+    def invalidate(self, pk):
+        """Forgets every token of the account `pk`, e.g. after its password changed."""
+        with self._lock:
+            stale = [token for token, entry in self.entries.items() if entry[0] == pk]
+            for token in stale:
+                del self.entries[token]
+            self._record()
+        metrics.increment("tokens.cache.invalidated", len(stale))
+
+    def discard(self, token):
+        with self._lock:
+            self.entries.pop(token, None)
+            self._record()
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+    def _record(self):
+        metrics.set_gauge("tokens.cache.size", len(self.entries))
+        metrics.set_gauge("tokens.cache.hit_rate", round(self.hits / ((self.hits + self.misses) or 1), 3))
+
+
+token_cache = TokenCache()
+
@@ -4,6 +4,8 @@ from . import views
 urlpatterns = [
     path('', views.release_list, name='release_list'),
     path('tag/<str:tag>/', views.release_list, name='release_list_by_tag'),
+    path('page.json', views.release_list_json, name='release_list_json'),
+    path('tag/<str:tag>/page.json', views.release_list_json, name='release_list_json_by_tag'),
     
     # Wall API Endpoints
     path('api/profile/update/', views.update_profile, name='update_profile'),
@@ -1,27 +1,58 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from .models import ReleasePost, Artist, Event, AffiliateLink, ChatMessage, ChatUsername
 from .forms import ReleaseUploadForm
-from django.http import JsonResponse
-from django.core import signing
+from . import avatars, canvas, catalog, metrics, search as site_search, tags
+from .chat_journal import decode_cursor, history_page, serialize_message
+from .chat_recent import recent_chat
+from .tokens import cached_account, read_token, revoke, token_cache
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import cache
+from django.db.models import F
+from django.http import HttpResponse, JsonResponse
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from django.views.decorators.csrf import csrf_exempt
-from django.core.files.base import ContentFile
-from PIL import Image
-import io
 import json
 
 
+def release_page(tag, after):
+    """One catalog page as cached by catalog.cached_page: card HTML, post data and the next cursor."""
+    posts, next_cursor = catalog.catalog_page(tag, after)
+    return {
+        'html': render_to_string('releases/release_cards.html', {'posts': posts}),
+        'posts': [
+            {
+                'title': post.title,
+                'url': reverse('release_detail', args=[post.slug]),
+                'tags': [tag.name for tag in post.tag_set.all()],
+                'album_art': post.album_art.url if post.album_art else None,
+                'track_preview': post.track_preview.url if post.track_preview else None,
+                'release_datetime': post.release_datetime.isoformat() if post.release_datetime else None,
+            }
+            for post in posts
+        ],
+        'next': next_cursor,
+    }
+
+
 def release_list(request, tag=None):
-    if tag:
-        posts = ReleasePost.objects.filter(tags__icontains=tag).order_by('-release_datetime')
-    else:
-        posts = ReleasePost.objects.order_by('-release_datetime')
-    
+    page = catalog.cached_page(tag, request.GET.get('after'), release_page)
     return render(request, 'releases/release_list.html', {
-        'posts': posts,
-        'active_tag': tag,
+        'cards_html': page['html'],
+        'next_cursor': page['next'],
+        'active_tag': tags.normalize(tag) if tag else None,
+        'tag_cloud': tags.tag_cloud('release'),
     })
 
 
+def release_list_json(request, tag=None):
+    """The same pages for infinite scroll: {"html", "posts", "next"}; pass ?after=<next> for the one after."""
+    return JsonResponse(catalog.cached_page(tag, request.GET.get('after'), release_page))
+
+
 def release_detail(request, slug):
     post = get_object_or_404(ReleasePost, slug=slug)
     return render(request, 'releases/release_detail.html', {'post': post})
@@ -56,16 +87,43 @@ def merch(request):
 
 
 def events(request, tag=None):
+    event_list = Event.objects.order_by('-event_date').prefetch_related('tag_set')
     if tag:
-        event_list = Event.objects.filter(tags__icontains=tag).order_by('-event_date')
-    else:
-        event_list = Event.objects.order_by('-event_date')
+        tag = tags.normalize(tag)
+        event_list = event_list.filter(tag_set__slug=tag)
     return render(request, 'events.html', {
         'events': event_list,
         'active_tag': tag,
+        'tag_cloud': tags.tag_cloud('event'),
     })
 
 
+def _search_page(request):
+    query = request.GET.get('q', '').strip()
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        page = 1
+    results, has_next = site_search.search(query, page)
+    return query, page, results, (page + 1 if has_next else None)
+
+
+def search(request):
+    query, page, results, next_page = _search_page(request)
+    return render(request, 'search.html', {
+        'query': query,
+        'results': results,
+        'page': page,
+        'next_page': next_page,
+    })
+
+
+def search_json(request):
+    """{"results", "next_page"} for ?q=<query>&page=<n>; next_page is null on the last page."""
+    query, page, results, next_page = _search_page(request)
+    return JsonResponse({'results': results, 'next_page': next_page})
+
+
 def links(request):
     all_links = AffiliateLink.objects.filter(is_active=True)
     categories = {}
@@ -79,25 +137,62 @@ def links(request):
 
 def wall(request):
     # Renamed from 'messages' to avoid conflict with Django's messages framework
-    chat_history = list(ChatMessage.objects.order_by('-timestamp')[:100])
-    chat_history.reverse()  # oldest first
-
-    chat_history_json = json.dumps([
-        {
-            "username": m.username,
-            "message": m.message,
-            "timestamp": m.timestamp.strftime("%H:%M"),
-        }
-        for m in chat_history
-    ])
+    chat_history, history_next = recent_chat.latest(settings.WALL_CHAT_INITIAL_MESSAGES)
 
     return render(request, 'releases/wall.html', {
-        'messages_json': chat_history_json,
+        'messages_json': json.dumps(chat_history),
+        'history_next_json': json.dumps(history_next),
+        'canvas_max_pixels': settings.WALL_SOCKET_LIMITS['canvas']['max_pixels'],
+        'socket_multiplex': getattr(settings, 'WALL_SOCKET_MULTIPLEX', False),
     })
 
+def _canvas_image_etag(request, fmt):
+    return f"{fmt}-{canvas.stored_canvas_fingerprint()}"
+
+
+@cache_control(public=True, max_age=settings.WALL_CANVAS_IMAGE_MAX_AGE)
+@condition(etag_func=_canvas_image_etag)
+def wall_canvas_image(request, fmt):
+    """
+    The Wall canvas as a PNG/WebP, rendered from the stored tiles (so it can
+    trail the live canvas by one write-behind flush). Renders are cached per
+    tile-store revision; clients revalidate with If-None-Match.
+    """
+    etag = _canvas_image_etag(request, fmt)
+    key = f"wall-canvas-image:{etag}"
+    data = cache.get(key)
+    if data is None:
+        data = canvas.render_canvas_image(canvas.load_canvas_pixels(), fmt)
+        cache.set(key, data, 60 * 60)
+    return HttpResponse(data, content_type=canvas.IMAGE_FORMATS[fmt][1])
+
+
+def wall_chat_history(request):
+    """GET ?before=<cursor>&limit=N — a page of older Wall chat, oldest first."""
+    before = None
+    if request.GET.get('before'):
+        before = decode_cursor(request.GET['before'])
+        if before is None:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    try:
+        limit = int(request.GET.get('limit', 0)) or None
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit'}, status=400)
+    messages, next_cursor = history_page(before, limit)
+    return JsonResponse({
+        'messages': [serialize_message(m) for m in messages],
+        'next': next_cursor,
+    })
+
+
+@staff_member_required
+def wall_metrics(request):
+    """Counters for the worker process that served this request."""
+    return JsonResponse({"process": canvas.PROCESS_ID, **metrics.snapshot()})
+
+
 def password_reset_confirm(request, token):
     from .models import PasswordResetToken
-    import hashlib
 
     try:
         reset = PasswordResetToken.objects.select_related('username').get(token=token)
@@ -119,12 +214,13 @@ def password_reset_confirm(request, token):
                 'token': token, 'error': 'Passwords do not match.'
             })
         # Hash and save new password
-        import secrets, hashlib
-        salt = secrets.token_hex(16)
-        hashed = hashlib.sha256((salt + password).encode()).hexdigest()
+        from .passwords import hash_password
         entry = reset.username
-        entry.password_hash = f"{salt}:{hashed}"
-        entry.save(update_fields=['password_hash'])
+        # A new token generation logs out every session signed in with the old password.
+        ChatUsername.objects.filter(pk=entry.pk).update(
+            password_hash=hash_password(password), token_generation=F('token_generation') + 1,
+        )
+        revoke(entry.pk)
         reset.used = True
         reset.save(update_fields=['used'])
         return render(request, 'releases/password_reset_confirm.html', {'success': True, 'username': entry.username})
@@ -137,7 +233,7 @@ def password_reset_confirm(request, token):
 def get_profile(request, username):
     """Read-only endpoint to fetch a user's profile data for the Wall."""
     try:
-        entry = ChatUsername.objects.get(username__iexact=username)
+        entry = ChatUsername.matching(username).get()
         return JsonResponse({
             'success': True,
             'username': entry.username,
@@ -161,10 +257,18 @@ def update_profile(request):
     if not token:
         return JsonResponse({'error': 'Not authenticated'}, status=401)
 
-    try:
-        username = signing.loads(token, max_age=60*60*24*30)
-        entry = ChatUsername.objects.get(username__iexact=username)
-    except Exception:
+    entry = None
+    account = cached_account(token)
+    if account is not None:
+        entry = ChatUsername.objects.filter(pk=account[0]).first()
+    else:
+        signed = read_token(token)
+        if signed is not None:
+            username, generation, expires = signed
+            entry = ChatUsername.matching(username).filter(token_generation=generation).first()
+            if entry is not None:
+                token_cache.put(token, entry.pk, username, generation, expires)
+    if entry is None:
         return JsonResponse({'error': 'Invalid or expired token'}, status=401)
 
     # Update text fields
@@ -176,25 +280,23 @@ def update_profile(request):
     if bio is not None:
         entry.bio = bio[:500]
 
-    # Handle Avatar Image Resizing
+    # Avatars are only checked here; releases/avatars.py resizes and stores
+    # them off the request and pushes "avatar_ready" to the owner's sockets.
+    avatar_pending = False
     if 'avatar' in request.FILES:
-        avatar_file = request.FILES['avatar']
         try:
-            img = Image.open(avatar_file)
-            img = img.convert('RGBA')  # Preserve transparency
-            img.thumbnail((120, 120))  # Crush to a small square
-            
-            thumb_io = io.BytesIO()
-            img.save(thumb_io, format='PNG')
-            
-            filename = f"{entry.username}_avatar.png"
-            entry.avatar.save(filename, ContentFile(thumb_io.getvalue()), save=False)
-        except Exception as e:
-            return JsonResponse({'error': 'Invalid image file.'}, status=400)
-
-    entry.save()
-    
+            avatars.submit(entry, request.FILES['avatar'])
+        except avatars.AvatarBusy as e:
+            return JsonResponse({'error': str(e)}, status=503)
+        except avatars.AvatarError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        avatar_pending = True
+
+    # Only the text fields, so a finished avatar job is never overwritten.
+    entry.save(update_fields=['location', 'bio'])
+
     return JsonResponse({
-        'success': True, 
-        'avatar_url': entry.avatar.url if entry.avatar else None
-    })
\ No newline at end of file
+        'success': True,
+        'avatar_url': entry.avatar.url if entry.avatar else None,
+        'avatar_pending': avatar_pending,
+    })